@@ -0,0 +1,647 @@
+"""
+人員配對系統效能基準測試
+
+用法：
+    python benchmark.py                          # 執行所有情境
+    python benchmark.py startup workbook         # 只執行指定情境
+    python benchmark.py service                  # 本機配對服務的測試客戶端
+    python benchmark.py dispatch                 # 校準自動選擇求解器的成本模型
+    python benchmark.py --output bench_output.txt
+    python benchmark.py --update-baseline        # 以本次結果更新基準耗時
+    python benchmark.py --check                  # 求解器等價性檢查 + 與基準耗時比較，失敗時返回非零退出碼
+"""
+import argparse
+import datetime
+import functools
+import itertools
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent
+
+# 導入時間統計中需要特別關注的重量級模組
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'tkinter')
+
+# 基準耗時文件（由 --update-baseline 產生，--check 時比較）
+BASELINE_PATH = REPO_DIR / 'benchmark_baseline.json'
+
+# 耗時超過基準的 (1 + 容許比例) 倍，且差距超過 MIN_REGRESSION_S 秒時視為效能回歸
+DEFAULT_TOLERANCE = 0.5
+MIN_REGRESSION_S = 0.01
+
+# 等價性檢查：隨機產生的案例數量，以及必須與窮舉法得到相同最少重複配對數的精確策略
+EQUIVALENCE_CASES = 40
+EXACT_STRATEGIES = ('auto', 'dp', 'exhaustive')
+
+# dispatch 情境中 MRV 回溯的時間上限（秒）
+DISPATCH_BACKTRACK_S = 1.0
+
+def make_workbook(path, people: int, rounds: int, seed: int = 0, participants: int = None):
+    """產生測試用工作簿：每輪隨機兩兩配對，寫入與正式文件相同的欄位格式"""
+    import openpyxl
+
+    rng = random.Random(seed)
+    names = [f"人員{i:03d}" for i in range(people)]
+    start = datetime.date(2024, 1, 1)
+
+    # 新的配對欄位在最左側，與 save_matching_result 的寫入順序一致
+    columns = []
+    for r in range(rounds):
+        date = (start + datetime.timedelta(days=7 * r)).isoformat()
+        order = names[:]
+        rng.shuffle(order)
+        partner_of = {}
+        for a, b in zip(order[::2], order[1::2]):
+            partner_of[a] = b
+            partner_of[b] = a
+        columns.insert(0, (f"配對者 {date}", partner_of))
+
+    workbook = openpyxl.Workbook()
+    people_sheet = workbook.active
+    people_sheet.title = '人員名單'
+    people_sheet.append(['姓名'] + [title for title, _ in columns])
+    for name in names:
+        row = [f"@{name}"]
+        for _, partner_of in columns:
+            row.append(f"@{partner_of[name]}" if name in partner_of else None)
+        people_sheet.append(row)
+
+    participants_sheet = workbook.create_sheet('參與配對人員')
+    participants_sheet.append(['姓名'])
+    for name in names[:participants if participants is not None else people]:
+        participants_sheet.append([name])
+
+    workbook.save(path)
+
+def measure_import_time(module: str = 'match', runs: int = 5) -> dict:
+    """以 python -X importtime 測量導入模組的累計時間"""
+    cumulative = []
+    heavy = set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True,
+        )
+        for line in result.stderr.splitlines():
+            match = re.match(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)', line)
+            if not match:
+                continue
+            name = match.group(4)
+            if name == module and not match.group(3).strip(' '):
+                cumulative.append(int(match.group(2)) / 1000)
+            if name.split('.')[0] in HEAVY_MODULES:
+                heavy.add(name.split('.')[0])
+
+    return {
+        'module': module,
+        'runs': runs,
+        'import_ms_median': round(statistics.median(cumulative), 2) if cumulative else None,
+        'import_ms_min': round(min(cumulative), 2) if cumulative else None,
+        'heavy_modules_loaded': sorted(heavy),
+    }
+
+def random_met_masks(people: int, density: float, seed: int = 0) -> list:
+    """產生隨機的「曾經配對」位元遮罩，density 為任兩人曾配對的機率"""
+    rng = random.Random(seed)
+    met = [0] * people
+    for i in range(people):
+        for j in range(i + 1, people):
+            if rng.random() < density:
+                met[i] |= 1 << j
+                met[j] |= 1 << i
+    return met
+
+def scenario_startup() -> dict:
+    """導入 match 模組的啟動成本（不應載入 pandas / tkinter）"""
+    return measure_import_time('match')
+
+def scenario_workbook() -> dict:
+    """命令列完整流程：讀取、配對、保存"""
+    sys.path.insert(0, str(REPO_DIR))
+    import match
+
+    results = {}
+    for people in (12, 40, 120):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, f'bench_{people}.xlsx')
+            make_workbook(path, people=people, rounds=8, seed=people)
+
+            timings = {}
+            start = time.perf_counter()
+            matcher = match.MatchingSystem(path, metrics=match.MatchingMetrics(trace_memory=False))
+            timings['load'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            matches, repeated_pairs = matcher.match_people(seed=1, time_budget=30)
+            timings['match'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            matcher.save_matching_result(matches, repeated_pairs)
+            timings['save'] = time.perf_counter() - start
+
+            results[f'people_{people}'] = {
+                'repeats': len(repeated_pairs),
+                'timings': {stage: round(seconds, 4) for stage, seconds in timings.items()},
+                'stages': matcher.metrics.stage_seconds(),
+                'counters': matcher.metrics.counters,
+            }
+    return results
+
+def scenario_logging() -> dict:
+    """開啟 DEBUG 文件日誌（與圖形界面相同的配置）時，配對計算的額外成本"""
+    import logging
+
+    sys.path.insert(0, str(REPO_DIR))
+    import match
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'bench_logging.xlsx')
+        make_workbook(path, people=60, rounds=40, seed=7)
+
+        def run_once() -> float:
+            matcher = match.MatchingSystem(path, metrics=match.MatchingMetrics(trace_memory=False))
+            start = time.perf_counter()
+            matcher.match_people(strategy='heuristic', seed=3, time_budget=10)
+            return time.perf_counter() - start
+
+        logging.disable(logging.CRITICAL)
+        silent = min(run_once() for _ in range(3))
+        logging.disable(logging.NOTSET)
+
+        file_handler = logging.FileHandler(os.path.join(tmp_dir, 'bench.log'), encoding='utf-8')
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        match.start_queue_logging([file_handler], logging.DEBUG)
+        try:
+            logged = min(run_once() for _ in range(3))
+        finally:
+            match.stop_queue_logging()
+            logging.getLogger().handlers.clear()
+            log_size = os.path.getsize(os.path.join(tmp_dir, 'bench.log'))
+
+    return {
+        'match_s_logging_disabled': round(silent, 4),
+        'match_s_debug_file_logging': round(logged, 4),
+        'overhead_ratio': round(logged / silent, 3) if silent else None,
+        'log_bytes': log_size,
+    }
+
+def scenario_dp() -> dict:
+    """精確動態規劃求解器在不同人數與歷史密度下的耗時"""
+    sys.path.insert(0, str(REPO_DIR))
+    import match
+
+    results = {}
+    for people in (16, 20, 24, 26):
+        for density in (0.5, 0.8, 0.95):
+            met = random_met_masks(people, density, seed=people)
+            metrics = match.MatchingMetrics(trace_memory=False)
+            start = time.perf_counter()
+            try:
+                repeats, _ = match.solve_min_repeat_dp(met, rng=random.Random(1), metrics=metrics)
+            except match.SolverStateLimit:
+                repeats = None
+            results[f'n{people}_d{density}'] = {
+                'repeats': repeats,
+                'seconds': round(time.perf_counter() - start, 4),
+                'states': metrics.counters.get('dp_states'),
+            }
+    return results
+
+def legacy_is_valid_pair(canonical, pair, history) -> bool:
+    """改寫前 MatchingSystem.is_valid_pair 的名稱比對：組內任兩人或整個三人組出現在歷史記錄中即無效"""
+    normalized_pair = [canonical(name) for name in pair]
+    for combo in itertools.combinations(normalized_pair, 2):
+        if tuple(sorted(combo)) in history:
+            return False
+    if len(normalized_pair) == 3 and tuple(sorted(normalized_pair)) in history:
+        return False
+    return True
+
+def legacy_try_no_repeats(remaining, current_matches, history, is_valid_pair, rng, deadline, nodes):
+    """改寫前的遞迴回溯：每個節點複製列表、建立元組並以名稱檢查歷史記錄，作為效能比較的基準"""
+    if time.perf_counter() >= deadline:
+        raise TimeoutError()
+    nodes[0] += 1
+
+    if not remaining:
+        return True, current_matches
+    if len(remaining) in (2, 3):
+        group = tuple(sorted(remaining))
+        if is_valid_pair(group, history):
+            return True, current_matches + [group]
+        return False, current_matches
+
+    first_person = remaining[0]
+    new_remaining = remaining[1:]
+    rng.shuffle(new_remaining)
+    for i in range(len(new_remaining)):
+        pair = tuple(sorted([first_person, new_remaining[i]]))
+        if is_valid_pair(pair, history):
+            next_remaining = new_remaining.copy()
+            next_remaining.pop(i)
+            success, matches = legacy_try_no_repeats(next_remaining, current_matches + [pair], history,
+                                                     is_valid_pair, rng, deadline, nodes)
+            if success:
+                return True, matches
+    return False, current_matches
+
+def scenario_backtrack() -> dict:
+    """無重複方案的回溯搜尋：舊版遞迴實作與迭代式就地回溯每秒搜尋的節點數"""
+    sys.path.insert(0, str(REPO_DIR))
+    import match
+
+    results = {}
+    for people, density in ((18, 0.3), (26, 0.3)):
+        # 兩個奇數人數的部門，跨部門的人都已見過：不存在無重複方案，回溯必須搜尋完整棵樹
+        met = random_met_masks(people, density, seed=people)
+        half = people // 2
+        for i in range(people):
+            for j in range(people):
+                if i != j and (i < half) != (j < half):
+                    met[i] |= 1 << j
+        names = [f"人員{i:03d}" for i in range(people)]
+        history = {
+            tuple(sorted((names[i], names[j])))
+            for i in range(people) for j in match.iter_bits(met[i]) if i < j
+        }
+        is_valid_pair = functools.partial(legacy_is_valid_pair, match.canonical_name)
+
+        nodes = [0]
+        start = time.perf_counter()
+        try:
+            legacy_try_no_repeats(names, [], history, is_valid_pair, random.Random(1), start + 3, nodes)
+        except TimeoutError:
+            pass
+        legacy_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, groups, new_nodes, completed = match.backtrack_min_repeats(
+            met, list(range(people)), best_cost=1, deadline=start + 3, mrv=False)
+        new_seconds = time.perf_counter() - start
+
+        legacy_rate = nodes[0] / legacy_seconds
+        new_rate = new_nodes / new_seconds
+        results[f'n{people}_d{density}'] = {
+            'legacy_nodes': nodes[0],
+            'legacy_nodes_per_s': round(legacy_rate),
+            'nodes': new_nodes,
+            'nodes_per_s': round(new_rate),
+            'completed': completed,
+            'found': groups is not None,
+            'speedup': round(new_rate / legacy_rate, 1),
+        }
+    return results
+
+def trio_free_met_masks(people: int, density: float, seed: int = 0) -> list:
+    """
+    產生從未配對圖沒有三角形的「曾經配對」位元遮罩：人員分為兩半，同一半的人都曾配對，
+    跨兩半的兩人以 density 的機率曾配對；人數為奇數時無法組成無重複的三人組
+    """
+    rng = random.Random(seed)
+    half = people // 2
+    met = [0] * people
+    for i in range(people):
+        for j in range(i + 1, people):
+            if (i < half) == (j < half) or rng.random() < density:
+                met[i] |= 1 << j
+                met[j] |= 1 << i
+    return met
+
+def scenario_dispatch() -> dict:
+    """
+    校準 choose_solver 的成本模型：在不存在無重複方案的歷史上，比較各求解器的耗時與重複數
+    - 隨機密度的見面圖，以及人數為奇數、從未配對圖沒有三角形的見面圖（狀態數貼近包絡）
+    - 動態規劃的實際狀態數應不超過 estimate_dp_states 的預估（within_estimate）
+    - MRV 回溯與局部搜尋都在達到重複數下限時停止，回溯最多搜尋 DISPATCH_BACKTRACK_S 秒
+    """
+    sys.path.insert(0, str(REPO_DIR))
+    import match
+
+    def run_case(met: list) -> dict:
+        people = len(met)
+        feasible, lower_bound, _ = match.check_zero_repeat_feasibility(met)
+        if feasible:
+            return None
+        components = match.split_components(match.allowed_masks(met))
+        estimated = match.estimate_dp_states(components)
+        solver, _ = match.choose_solver('auto', feasible, people, max(map(len, components)), estimated)
+        case = {
+            'lower_bound': lower_bound,
+            'largest_component': max(map(len, components)),
+            'chosen': solver,
+            'dp_estimated_states': estimated,
+        }
+
+        if estimated <= match.DP_MAX_STATES:
+            metrics = match.MatchingMetrics(trace_memory=False)
+            start = time.perf_counter()
+            cost, _ = match.solve_components_dp(met, components, rng=random.Random(1), metrics=metrics)
+            case['dp_s'] = round(time.perf_counter() - start, 4)
+            case['dp_repeats'] = cost
+            case['dp_states'] = metrics.counters.get('dp_states', 0)
+            case['within_estimate'] = case['dp_states'] <= estimated
+
+        start = time.perf_counter()
+        cost, _, nodes, completed = match.backtrack_min_repeats(
+            met, list(range(people)), deadline=start + DISPATCH_BACKTRACK_S, stop_at=lower_bound)
+        case['backtrack_s'] = round(time.perf_counter() - start, 4)
+        case['backtrack_repeats'] = cost
+        case['backtrack_completed'] = completed
+
+        start = time.perf_counter()
+        cost, _ = match.solve_k_groups(met, 2, rng=random.Random(1))
+        case['local_s'] = round(time.perf_counter() - start, 4)
+        case['local_repeats'] = cost
+        return case
+
+    results = {}
+    for people in (16, 20, 24, 28, 32):
+        for density in (0.8, 0.85, 0.9, 0.95):
+            case = run_case(random_met_masks(people, density, seed=people))
+            if case is not None:
+                results[f'n{people}_d{density}'] = case
+    for people in (15, 19):
+        for density in (0.3, 0.7):
+            case = run_case(trio_free_met_masks(people, density, seed=people))
+            if case is not None:
+                results[f'trio_free_n{people}_d{density}'] = case
+    return results
+
+def post_json(url: str, payload: dict) -> dict:
+    """以 POST 送出 JSON 請求並解析回應（本機服務的測試客戶端）"""
+    import urllib.request
+
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+def scenario_service() -> dict:
+    """本機配對服務：註冊、預覽（冷/熱）、並行預覽與寫回後重新解析的延遲"""
+    import logging
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    sys.path.insert(0, str(REPO_DIR))
+    import match
+
+    logging.disable(logging.CRITICAL)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'bench_service.xlsx')
+            make_workbook(path, people=40, rounds=20, seed=11)
+
+            service = match.MatchingService(workers=4)
+            server = match.build_service_server(service, port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base = f"http://{server.server_address[0]}:{server.server_address[1]}"
+            try:
+                def timed(endpoint: str, payload: dict) -> tuple:
+                    start = time.perf_counter()
+                    result = post_json(base + endpoint, payload)
+                    return (time.perf_counter() - start) * 1000, result
+
+                register_ms, _ = timed('/workbooks', {'workbook': path})
+                warm = [timed('/preview', {'workbook': path, 'seed': i, 'time_budget': 5})[0] for i in range(20)]
+                with ThreadPoolExecutor(max_workers=8) as pool:
+                    concurrent = list(pool.map(
+                        lambda i: timed('/preview', {'workbook': path, 'seed': i, 'time_budget': 5})[0], range(32)))
+                save_ms, saved = timed('/match', {'workbook': path, 'seed': 1, 'time_budget': 5})
+                reload_ms, _ = timed('/preview', {'workbook': path, 'seed': 2, 'time_budget': 5})
+                rewarm_ms, _ = timed('/preview', {'workbook': path, 'seed': 3, 'time_budget': 5})
+                state = service.describe()
+            finally:
+                server.shutdown()
+                server.server_close()
+                service.shutdown()
+    finally:
+        logging.disable(logging.NOTSET)
+
+    return {
+        'register_ms': round(register_ms, 2),
+        'warm_preview_ms_median': round(statistics.median(warm), 2),
+        'warm_preview_ms_max': round(max(warm), 2),
+        'concurrent_preview_ms_median': round(statistics.median(concurrent), 2),
+        'match_and_save_ms': round(save_ms, 2),
+        'saved_repeats': saved['repeat_count'],
+        'preview_after_save_ms': round(reload_ms, 2),
+        'preview_rewarmed_ms': round(rewarm_ms, 2),
+        'workbook_loads': state['workbooks'][0]['loads'],
+        'requests': state['requests'],
+    }
+
+def check_partition(matches: list, participants: list) -> str:
+    """檢查配對結果是否為參與人員的合法分組，合法時返回 None，否則返回原因"""
+    names = sorted(name for match in matches for name in match)
+    if names != sorted(participants):
+        return f"分組人員與參與人員不一致：{names}"
+    sizes = sorted(len(match) for match in matches)
+    trios = sizes.count(3)
+    if any(size not in (2, 3) for size in sizes) or trios != len(participants) % 2:
+        return f"分組人數不正確：{sizes}"
+    return None
+
+def check_equivalence(cases: int = EQUIVALENCE_CASES, seed: int = 0) -> dict:
+    """
+    以固定種子產生隨機名單與歷史，檢查每個策略在小人數下的結果
+    - 每個策略：分組合法，repeated_pairs 與歷史索引重新計算的重複配對一致
+    - 精確策略：重複配對數與窮舉法相同；其他策略不得比窮舉法更好（否則窮舉法有誤）
+    - 加權代價的次要部分（見面次數與距今輪數）不要求一致：分量分解求解時可能略高於整體最佳解，
+      只統計高於窮舉法的案例數
+    """
+    import logging
+
+    sys.path.insert(0, str(REPO_DIR))
+    import match
+
+    rng = random.Random(seed)
+    failures = []
+    gaps = {strategy: 0 for strategy in match.SOLVER_STRATEGIES}
+    weight_gaps = {strategy: 0 for strategy in match.SOLVER_STRATEGIES}
+    runs = 0
+    logging.disable(logging.CRITICAL)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for case in range(cases):
+                people = rng.randint(5, 12)
+                participants = rng.randint(4, min(people, match.EXHAUSTIVE_MAX_PEOPLE))
+                rounds = rng.randint(0, people)
+                path = os.path.join(tmp_dir, f'case_{case}.xlsx')
+                make_workbook(path, people=people, rounds=rounds, seed=case + seed * 1000, participants=participants)
+                label = f"case {case}（{participants}/{people} 人，{rounds} 輪）"
+
+                base = match.MatchingSystem(path, metrics=match.MatchingMetrics(trace_memory=False))
+                index = base.get_history_index()
+                roster = base.get_participants()
+
+                results = {}
+                for strategy in match.SOLVER_STRATEGIES:
+                    matcher = match.MatchingSystem(path, snapshot=base.snapshot, history_index=index,
+                                                   metrics=match.MatchingMetrics(trace_memory=False))
+                    matches, repeated_pairs = matcher.match_people(strategy=strategy, seed=case, time_budget=30)
+                    runs += 1
+                    problem = check_partition(matches, roster)
+                    expected = sorted(matcher.find_history_repeats(matches, index))
+                    if problem is None and sorted(repeated_pairs) != expected:
+                        problem = f"repeated_pairs 不正確：{sorted(repeated_pairs)}，應為 {expected}"
+                    if problem is not None:
+                        failures.append(f"{label} {strategy}：{problem}")
+                        continue
+                    results[strategy] = (len(repeated_pairs), matcher.metrics.values.get('repeat_weight', 0))
+
+                optimum = results.get('exhaustive')
+                if optimum is None:
+                    continue
+                for strategy, (repeats, weight) in results.items():
+                    if strategy in EXACT_STRATEGIES and repeats != optimum[0]:
+                        failures.append(f"{label} {strategy}：重複 {repeats} 組，窮舉法為 {optimum[0]} 組")
+                    elif repeats < optimum[0]:
+                        failures.append(f"{label} {strategy}：重複 {repeats} 組少於窮舉法的 {optimum[0]} 組")
+                    elif repeats > optimum[0]:
+                        gaps[strategy] += 1
+                    elif weight > optimum[1]:
+                        weight_gaps[strategy] += 1
+    finally:
+        logging.disable(logging.NOTSET)
+
+    return {
+        'cases': cases,
+        'runs': runs,
+        'failures': failures,
+        # 非精確策略（例如隨機啟發式、公平模式）重複配對數高於最小值的案例數
+        'cases_above_minimum': {strategy: count for strategy, count in gaps.items() if count},
+        # 重複配對數相同、但加權代價高於窮舉法的案例數
+        'cases_above_minimum_weight': {strategy: count for strategy, count in weight_gaps.items() if count},
+    }
+
+def timing_metrics(result: dict, path: tuple = ()):
+    """攤平情境結果中的耗時欄位（秒或毫秒），產生 (路徑, 秒數)；速率與總耗時不列入"""
+    for key, value in result.items():
+        if isinstance(value, dict):
+            yield from timing_metrics(value, path + (key,))
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or key == 'elapsed_s' or 'per_s' in key:
+            continue
+        if path and path[-1] in ('timings', 'stages'):
+            yield '.'.join(path + (key,)), float(value)
+        elif key == 'seconds' or re.search(r'(^|_)s(_|$)', key):
+            yield '.'.join(path + (key,)), float(value)
+        elif re.search(r'(^|_)ms(_|$)', key):
+            yield '.'.join(path + (key,)), value / 1000
+
+def find_regressions(timings: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """比較各情境的耗時（{情境: {路徑: 秒數}}）與基準，返回超出容許範圍的項目"""
+    regressions = []
+    for name, metrics in timings.items():
+        expected = baseline.get(name, {})
+        for metric, seconds in metrics.items():
+            base = expected.get(metric)
+            if base is None:
+                continue
+            if seconds > base * (1 + tolerance) and seconds - base > MIN_REGRESSION_S:
+                regressions.append({
+                    'scenario': name,
+                    'metric': metric,
+                    'baseline_s': round(base, 4),
+                    'current_s': round(seconds, 4),
+                    'ratio': round(seconds / base, 2) if base else None,
+                })
+    return regressions
+
+SCENARIOS = {
+    'startup': scenario_startup,
+    'workbook': scenario_workbook,
+    'logging': scenario_logging,
+    'dp': scenario_dp,
+    'backtrack': scenario_backtrack,
+    'dispatch': scenario_dispatch,
+    'service': scenario_service,
+}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='人員配對系統效能基準測試')
+    parser.add_argument('scenarios', nargs='*', help=f"要執行的情境（預設全部）：{', '.join(SCENARIOS)}")
+    parser.add_argument('--output', default=None, help='同時把 JSON 結果寫入此文件')
+    parser.add_argument('--check', action='store_true', help='執行求解器等價性檢查，並與基準耗時比較')
+    parser.add_argument('--update-baseline', action='store_true', help='以本次結果覆寫基準耗時文件')
+    parser.add_argument('--baseline', default=str(BASELINE_PATH), help='基準耗時文件路徑')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='容許的耗時增加比例（0.5 表示慢 50%% 以內不算回歸）')
+    parser.add_argument('--cases', type=int, default=EQUIVALENCE_CASES, help='等價性檢查的隨機案例數量')
+    parser.add_argument('--repeat', type=int, default=None,
+                        help='每個情境執行的次數，耗時取最小值（--check 與 --update-baseline 預設 3 次，否則 1 次）')
+    args = parser.parse_args(argv)
+
+    selected = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in selected if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知的情境：{', '.join(unknown)}")
+
+    report = {
+        'python': sys.version.split()[0],
+        'platform': sys.platform,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'scenarios': {},
+    }
+    # 單次量測的雜訊可達 50% 以上，比較基準時每個耗時欄位取多次執行的最小值
+    repeat = args.repeat or (3 if args.check or args.update_baseline else 1)
+    best_timings = {}
+    for name in selected:
+        start = time.perf_counter()
+        best = {}
+        for _ in range(repeat):
+            result = SCENARIOS[name]()
+            for metric, seconds in timing_metrics(result):
+                best[metric] = min(seconds, best.get(metric, seconds))
+        report['scenarios'][name] = result
+        report['scenarios'][name]['elapsed_s'] = round(time.perf_counter() - start, 3)
+        best_timings[name] = best
+
+    exit_code = 0
+    baseline_path = Path(args.baseline)
+    if args.check:
+        baseline = {}
+        if baseline_path.exists():
+            baseline = json.loads(baseline_path.read_text(encoding='utf-8'))['timings']
+        equivalence = check_equivalence(args.cases)
+        regressions = find_regressions(best_timings, baseline, args.tolerance)
+        report['check'] = {
+            'equivalence': equivalence,
+            'baseline': str(baseline_path) if baseline else None,
+            'repeat': repeat,
+            'tolerance': args.tolerance,
+            'regressions': regressions,
+        }
+        if equivalence['failures'] or regressions:
+            exit_code = 1
+        report['check']['status'] = 'ok' if exit_code == 0 else 'failed'
+
+    if args.update_baseline:
+        timings = {}
+        if baseline_path.exists():
+            # 只更新本次執行的情境，其他情境保留原有的基準
+            timings = json.loads(baseline_path.read_text(encoding='utf-8'))['timings']
+        timings.update({name: {metric: round(seconds, 5) for metric, seconds in best.items()}
+                        for name, best in best_timings.items()})
+        baseline = {key: report[key] for key in ('python', 'platform', 'timestamp')}
+        baseline['repeat'] = repeat
+        baseline['timings'] = timings
+        baseline_path.write_text(json.dumps(baseline, ensure_ascii=False, indent=2) + '\n', encoding='utf-8')
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + '\n', encoding='utf-8')
+    return exit_code
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,99 @@
 import random
-import pandas as pd
-from typing import List, Tuple, Set
+from typing import List, Tuple, Set, TYPE_CHECKING
 from itertools import combinations
 import os
-import tkinter as tk
-from tkinter import messagebox
 import sys
 import logging
 import traceback
 from pathlib import Path
-import random
 import datetime
-from tkinter import filedialog
+import time
+import json
+import threading
+import functools
+import tracemalloc
+from contextlib import contextmanager
+
+# pandas 與 openpyxl 載入較慢，只在實際讀寫 Excel 的函數內才導入，
+# 讓圖形界面先完成繪製，並讓其他工具可以低成本地導入 MatchingSystem
+if TYPE_CHECKING:
+    import argparse
+    import numpy as np
+    import pandas as pd
+
+# tkinter 僅在啟動圖形界面時才載入，命令列模式不依賴任何 GUI 套件
+tk = None
+ttk = None
+messagebox = None
+filedialog = None
+
+def load_tkinter():
+    """載入 tkinter 模組（只在圖形界面路徑上呼叫）"""
+    global tk, ttk, messagebox, filedialog
+    if tk is None:
+        import tkinter
+        from tkinter import ttk as tk_ttk
+        from tkinter import messagebox as tk_messagebox
+        from tkinter import filedialog as tk_filedialog
+        tk = tkinter
+        ttk = tk_ttk
+        messagebox = tk_messagebox
+        filedialog = tk_filedialog
+
+# 背景日誌監聽器（由 start_queue_logging 建立）
+log_listener = None
+
+def start_queue_logging(handlers: list, level: int = logging.DEBUG):
+    """
+    以 QueueHandler / QueueListener 配置根日誌器
+    - 呼叫端線程只把日誌記錄放入佇列，不寫文件；參數都是不可變的純量時也不做格式化
+    - 格式化與寫入由背景監聽線程完成，程式結束時自動清空佇列
+    """
+    global log_listener
+    import atexit
+    import queue
+    from logging.handlers import QueueHandler, QueueListener
+    
+    immutable_types = (str, int, float, bool, type(None))
+    
+    def is_immutable(value) -> bool:
+        if isinstance(value, tuple):
+            return all(is_immutable(item) for item in value)
+        return isinstance(value, immutable_types)
+    
+    class DeferredQueueHandler(QueueHandler):
+        """參數都是不可變的純量時保留原始的 msg 與 args，讓 %s 格式化延後到監聽線程"""
+        def prepare(self, record):
+            # 參數可能是列表、字典或其他物件時，呼叫端之後仍可能修改它們，
+            # 延後格式化會記錄到修改後的內容，甚至在監聽線程中出錯，因此與標準 QueueHandler 一樣先在原線程格式化
+            if record.args and not is_immutable(record.args):
+                record.msg = record.getMessage()
+                record.args = None
+            # 例外資訊需要在原線程轉為文字，其餘欄位原樣傳遞
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            return record
+    
+    log_queue = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(DeferredQueueHandler(log_queue))
+    
+    if log_listener is not None:
+        log_listener.stop()
+    log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    log_listener.start()
+    atexit.register(stop_queue_logging)
+
+def stop_queue_logging():
+    """停止背景日誌監聽器，並寫出佇列中剩餘的記錄"""
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
 
 # 配置日誌系統
 def setup_logging():
@@ -35,14 +117,10 @@ def setup_logging():
         console_handler.setLevel(logging.INFO)
         console_handler.setFormatter(logging.Formatter(log_format))
         
-        # 配置根日誌器
-        logging.basicConfig(
-            level=logging.DEBUG,
-            handlers=[file_handler, console_handler],
-            format=log_format
-        )
+        # 配置根日誌器：經由佇列在背景線程寫入，不阻塞界面與配對計算
+        start_queue_logging([file_handler, console_handler], logging.DEBUG)
         
-        logging.info(f"日誌系統已啟動，日誌文件：{log_file}")
+        logging.info("日誌系統已啟動，日誌文件：%s", log_file)
         return str(log_file)
     except Exception as e:
         # 如果日誌系統初始化失敗，使用標準輸出
@@ -69,18 +147,453 @@ class OutputRedirector:
         if self.debug:
             self.original_stdout.flush()
 
-# 初始化日誌系統
-log_file_path = setup_logging()
+# 日誌文件路徑，由 init_gui_environment() 在啟動圖形界面時設定
+log_file_path = None
+
+def init_gui_environment():
+    """初始化圖形界面模式的日誌系統，並重定向標準輸出"""
+    global log_file_path
+    
+    # 初始化日誌系統
+    log_file_path = setup_logging()
+    
+    # 將標準輸出重定向
+    sys.stdout = OutputRedirector(debug=True)
+    sys.stderr = OutputRedirector(debug=True)
+
+# 可用的配對策略（'fair' 先限制每個人累計重複的最大值，再最小化總代價）；
+# 'auto' 與 'fair' 由 choose_solver 依成本模型選擇求解器，其餘策略直接指定求解器
+SOLVER_STRATEGIES = ('auto', 'exhaustive', 'heuristic', 'dp', 'fair', 'local')
+
+# 窮舉法建議的人數上限，超過時列舉數量 (n-1)!! 增長過快
+EXHAUSTIVE_MAX_PEOPLE = 10
+
+# 指定動態規劃時建議的最大分量人數上限，超過時記錄警告（自動選擇時改看 estimate_dp_states 的預估）
+DP_MAX_PEOPLE = 26
+
+# 動態規劃記憶表的狀態數上限，超過時改用局部搜尋
+# 每個狀態（字典項目加上 (代價, 分組) tuple）實測約 200 bytes，上限約佔 200 MB 記憶體；
+# solve_components_dp 平行求解時每個工作進程各有一份記憶表，最壞情況為工作進程數 × 200 MB
+DP_MAX_STATES = 1_000_000
+
+# 自動選擇求解器的成本模型，以 benchmark.py 的 dispatch 情境校準（隨機密度與無三人組的見面圖，分量 8–28 人）：
+# 動態規劃的狀態數以最大分量人數 L 的上包絡 REFERENCE_STATES × GROWTH^(L - REFERENCE_PEOPLE) 預估
+# （實測約為 φ^(L+4)/√5，與見過的密度無關；密度高時通常遠低於包絡），每個狀態的耗時取實測的上限
+DP_COST_REFERENCE_PEOPLE = 20
+DP_COST_REFERENCE_STATES = 46_368
+DP_COST_GROWTH = 1.618
+DP_SECONDS_PER_STATE = 2.5e-5
+
+# 有時間預算時，動態規劃的預估耗時最多佔剩餘預算的比例；沒有時間預算時預估耗時的上限（秒），
+# 超過時改用局部搜尋（校準的案例中局部搜尋都能在數十毫秒內達到重複數下限）
+DP_BUDGET_SHARE = 0.5
+DP_UNBOUNDED_MAX_SECONDS = 10.0
+
+# 重複配對的加權代價：每組重複固定計 REPEAT_BASE_WEIGHT，再依見面次數與最近一次見面距今的輪數
+# 加上較小的懲罰（每組最多約 500），避免讓最近或多次見面的人再次配對；
+# 基數遠大於所有懲罰的總和，因此代價的比較仍然以重複組數為優先
+REPEAT_BASE_WEIGHT = 1 << 20
+REPEAT_COUNT_WEIGHT = 64
+REPEAT_RECENCY_ROUNDS = 52
+
+# 公平模式下違反門檻的配對代價，遠大於任何合法方案的代價
+FAIRNESS_PENALTY = REPEAT_BASE_WEIGHT << 12
+
+# 「不可同組」限制的配對代價，遠大於公平模式的懲罰，求解器只在無法避免時才會選用（此時配對失敗）
+FORBIDDEN_WEIGHT = FAIRNESS_PENALTY << 12
+
+# 配對限制工作表：每列兩個姓名與限制類型
+CONSTRAINTS_SHEET = '配對限制'
+CONSTRAINT_NEVER = ('不可同組', 'never')
+CONSTRAINT_MUST = ('必須同組', 'must')
+
+# 歷史記錄的時間窗口（天）：只有日期在窗口內的配對者欄位會限制配對；None 表示全部歷史都有效
+HISTORY_WINDOW_DAYS = None
+
+# 至少兩個連通分量達到此人數時，以進程池平行求解各分量
+COMPONENT_PARALLEL_MIN_PEOPLE = 18
+
+# 多輪排程：圓桌法建構時隨機重新編號的次數，以及預設的每輪間隔天數
+SCHEDULE_RELABEL_ATTEMPTS = 32
+SCHEDULE_INTERVAL_DAYS = 7
+
+# 每組人數：預設兩人一組（奇數人數時有一組三人），午餐等活動可設定為 4-6 人一組
+DEFAULT_GROUP_SIZE = 2
+
+# 多人一組的局部搜尋：隨機重啟的次數（代價為 0 時提早結束）
+GROUP_SEARCH_RESTARTS = 20
+
+# 配對後調整：受影響的人員加上鄰近組別的成員，一起重新分組的人數上限
+REPAIR_NEIGHBORHOOD_PEOPLE = 16
+
+# 配對結果快取：磁碟上的 JSON 文件與保留的筆數；
+# 參與人員增減不超過 RESULT_CACHE_WARM_CHANGES 人時，以快取的結果為起點只調整受影響的組別
+RESULT_CACHE_PATH = Path.home() / '.matchmember' / 'result_cache.json'
+RESULT_CACHE_SIZE = 32
+RESULT_CACHE_WARM_CHANGES = 4
+
+# 前瞻模式：比較的無重複候選方案數量；每個候選需要兩次花演算法（產生候選與評分各一次，O(V^3)），
+# 實測 4 個候選已取得 8 個候選的大部分改善，耗時約一半
+LOOKAHEAD_CANDIDATES = 4
+
+# 本機配對服務（serve 子命令）的預設位址、埠號與工作執行緒數量
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8765
+SERVICE_WORKERS = 4
+
+# 結果檢視視窗每次插入的列數，以及搜尋輸入停止多久後才重新篩選（毫秒）
+RESULT_VIEW_BATCH = 500
+RESULT_VIEW_SEARCH_DELAY_MS = 200
+
+# 標準名稱快取的容量：每種原始寫法（含 @、全形空白等變體）只正規化一次
+NAME_CACHE_SIZE = 65536
+
+class SearchTimeout(Exception):
+    """搜尋超出時間預算"""
+
+class SolverStateLimit(Exception):
+    """精確求解器的記憶表超出上限"""
+
+class MatchingMetrics:
+    """
+    配對流程的結構化效能指標
+    - stages: 各階段（讀取、歷史記錄、各求解階段、保存）的耗時；trace_memory 為 True 時另記錄峰值記憶體
+      （tracemalloc 會讓求解與 pandas 解析慢數倍，因此預設關閉，只在需要分析記憶體時開啟）
+    - counters: 重啟次數、回溯節點數、評分的候選方案數等計數器
+    - values: 其他結果資訊，例如使用的策略與重複配對數
+    """
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.counters = {}
+        self.values = {}
+        self._depth = 0
+    
+    @contextmanager
+    def stage(self, name: str):
+        """測量一個階段；同名階段多次執行時累加耗時，峰值記憶體取最大值"""
+        # 只在最外層階段追蹤記憶體，避免巢狀階段重設外層的峰值
+        measure_memory = self.trace_memory and self._depth == 0
+        started_tracing = False
+        if measure_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            base_memory = tracemalloc.get_traced_memory()[0]
+        
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._depth -= 1
+            
+            record = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            record['seconds'] += elapsed
+            record['calls'] += 1
+            
+            if measure_memory:
+                peak_kb = (tracemalloc.get_traced_memory()[1] - base_memory) / 1024
+                record['peak_memory_kb'] = round(max(record.get('peak_memory_kb', 0), peak_kb), 1)
+                if started_tracing:
+                    tracemalloc.stop()
+    
+    def increment(self, name: str, amount: int = 1):
+        """累加計數器"""
+        self.counters[name] = self.counters.get(name, 0) + amount
+    
+    def stage_seconds(self) -> dict:
+        """各階段耗時（秒）"""
+        return {name: round(record['seconds'], 4) for name, record in self.stages.items()}
+    
+    def to_dict(self) -> dict:
+        return {
+            'stages': {
+                name: dict(record, seconds=round(record['seconds'], 4))
+                for name, record in self.stages.items()
+            },
+            'counters': dict(self.counters),
+            'values': dict(self.values),
+        }
+    
+    def summary_lines(self) -> List[str]:
+        """產生顯示在狀態區域的簡短摘要"""
+        stage_labels = [
+            ('load', '讀取'), ('history', '歷史記錄'), ('solver.feasibility', '可行性檢查'),
+            ('solver.no_repeat', '無重複搜尋'),
+            ('solver.dp', '動態規劃'), ('solver.heuristic', '啟發式'), ('solver.exhaustive', '窮舉'),
+            ('save', '保存'),
+        ]
+        timing_parts = [
+            f"{label} {self.stages[name]['seconds']:.2f}s"
+            for name, label in stage_labels if name in self.stages
+        ]
+        lines = []
+        if timing_parts:
+            lines.append("⏱️ 耗時：" + "｜".join(timing_parts))
+        lines.append(
+            f"🔢 重啟 {self.counters.get('restarts', 0)} 次，"
+            f"回溯節點 {self.counters.get('backtrack_nodes', 0)}，"
+            f"評分方案 {self.counters.get('candidates_scored', 0)} 個"
+        )
+        return lines
+
+def timed_stage(name: str):
+    """將 MatchingSystem 方法的執行記錄為 metrics 中的一個階段"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def write_metrics_next_to_log(metrics_data: dict, log_path: str) -> str:
+    """將指標（MatchingMetrics.to_dict() 的結果）以 JSON 寫在日誌文件旁邊，返回寫出的路徑"""
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    metrics_path = Path(log_path).parent / f'match_metrics_{timestamp}.json'
+    metrics_path.write_text(json.dumps(metrics_data, ensure_ascii=False, indent=2), encoding='utf-8')
+    return str(metrics_path)
+
+class WorkbookSnapshot:
+    """
+    Excel 工作簿的解析快照
+    - 一次讀取「人員名單」與「參與配對人員」兩個工作表
+    - 以文件的修改時間與大小判斷快照是否仍然有效
+    """
+    CACHED_SHEETS = ('人員名單', '參與配對人員', CONSTRAINTS_SHEET)
+
+    def __init__(self, excel_path: str):
+        self.excel_path = str(excel_path)
+        stat = os.stat(self.excel_path)
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+
+        import pandas as pd
+        
+        # 只開啟一次文件，並在同一個 ExcelFile 上解析所需的工作表
+        with pd.ExcelFile(self.excel_path) as excel_file:
+            self.sheet_names = list(excel_file.sheet_names)
+            self.sheets = {}
+            for sheet_name in self.CACHED_SHEETS:
+                if sheet_name in self.sheet_names:
+                    self.sheets[sheet_name] = excel_file.parse(sheet_name)
+
+    def is_current(self) -> bool:
+        """檢查磁碟上的文件自快照建立後是否未被修改"""
+        try:
+            stat = os.stat(self.excel_path)
+        except OSError:
+            return False
+        return stat.st_mtime_ns == self.mtime_ns and stat.st_size == self.size
+
+    def read_sheet(self, sheet_name: str) -> 'pd.DataFrame':
+        """返回工作表內容的副本（行為與 pd.read_excel 一致）"""
+        if sheet_name not in self.sheets:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        return self.sheets[sheet_name].copy()
+
+class ResultCache:
+    """
+    配對結果的磁碟 LRU 快取（JSON 文件，最近使用的記錄在最前面）
+    - key: 完整輸入的指紋；context: 除參與人員以外的輸入（歷史索引摘要、配對限制、策略等）的指紋
+    - 每筆記錄保存參與人員（標準名稱）、分組與重複配對
+    - 讀寫失敗只記錄警告，不影響配對
+    """
+    def __init__(self, path: str = RESULT_CACHE_PATH, capacity: int = RESULT_CACHE_SIZE):
+        self.path = Path(path)
+        self.capacity = capacity
+        self.logger = logging.getLogger(__name__)
+    
+    def load(self) -> list:
+        try:
+            entries = json.loads(self.path.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"讀取配對結果快取失敗：{e}")
+            return []
+        return entries if isinstance(entries, list) else []
+    
+    def store(self, entries: list):
+        """寫入同目錄的唯一暫存文件再以 os.replace 取代，多個進程同時寫入時不會互相覆蓋暫存文件"""
+        import tempfile
+        
+        tmp_path = None
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=f"{self.path.name}.", suffix='.tmp', dir=self.path.parent)
+            with os.fdopen(fd, 'w', encoding='utf-8') as tmp_file:
+                tmp_file.write(json.dumps(entries[:self.capacity], ensure_ascii=False))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.logger.warning(f"寫入配對結果快取失敗：{e}")
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+    
+    def lookup(self, key: str, context: str, participants: List[str],
+               max_changes: int = RESULT_CACHE_WARM_CHANGES) -> Tuple[str, dict]:
+        """
+        返回 ('hit', 記錄)、('warm', 同一情境下參與人員最接近的記錄) 或 ('miss', None)
+        命中的記錄移到最前面
+        """
+        entries = self.load()
+        for idx, entry in enumerate(entries):
+            if entry.get('key') == key:
+                entries.insert(0, entries.pop(idx))
+                self.store(entries)
+                return 'hit', entry
+        
+        wanted = set(participants)
+        best = None
+        for entry in entries:
+            if entry.get('context') != context:
+                continue
+            changes = len(wanted ^ set(entry.get('participants', ())))
+            if changes <= max_changes and (best is None or changes < best[0]):
+                best = (changes, entry)
+        return ('warm', best[1]) if best else ('miss', None)
+    
+    def put(self, entry: dict):
+        """新增記錄到最前面；相同指紋已有記錄時只保留加權代價較低者"""
+        entries = self.load()
+        for idx, old in enumerate(entries):
+            if old.get('key') == entry['key']:
+                entries.pop(idx)
+                if old.get('repeat_weight', 0) <= entry.get('repeat_weight', 0):
+                    entry = old
+                break
+        entries.insert(0, entry)
+        self.store(entries)
+
+def result_rows(matches: List[Tuple[str, ...]], repeated_pairs: List[Tuple[str, ...]]) -> List[dict]:
+    """
+    把求解結果整理成結果檢視視窗的列：每組一列
+    - repeats: 組內曾經配對過的兩人（標準名稱）
+    - text: 供搜尋比對的小寫文字
+    """
+    repeated = {frozenset(canonical_name(name) for name in pair) for pair in repeated_pairs}
+    rows = []
+    for number, match in enumerate(matches, 1):
+        names = [canonical_name(name) for name in match]
+        repeats = [pair for pair in combinations(names, 2) if frozenset(pair) in repeated]
+        rows.append({
+            'number': number,
+            'names': names,
+            'repeats': repeats,
+            'text': ' '.join(names).lower(),
+        })
+    return rows
 
-# 將標準輸出重定向
-sys.stdout = OutputRedirector(debug=True)
-sys.stderr = OutputRedirector(debug=True)
+class ResultViewer:
+    """
+    配對結果檢視視窗（ttk.Treeview），取代把所有結果串成一個訊息框
+    - 列分批插入，每批之後交還事件迴圈，上萬組結果也不會阻塞視窗
+    - 可搜尋姓名、只顯示有重複配對的組別；重複的組別以黃底紅字標示
+    """
+    def __init__(self, parent, matches: List[Tuple[str, ...]], repeated_pairs: List[Tuple[str, ...]],
+                 title: str = "配對結果"):
+        self.rows = result_rows(matches, repeated_pairs)
+        self.repeat_count = sum(1 for row in self.rows if row['repeats'])
+        self.visible = []
+        self.insert_job = None
+        self.search_job = None
+        
+        self.window = tk.Toplevel(parent)
+        self.window.title(title)
+        self.window.geometry("560x480")
+        
+        # 搜尋與篩選
+        control_frame = tk.Frame(self.window)
+        control_frame.pack(fill=tk.X, padx=10, pady=(10, 5))
+        tk.Label(control_frame, text="搜尋：").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        search_entry = tk.Entry(control_frame, textvariable=self.search_var, width=24)
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.repeats_only_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(control_frame, text="只顯示重複配對", variable=self.repeats_only_var,
+                       command=self.refresh).pack(side=tk.LEFT, padx=(10, 0))
+        self.search_var.trace_add('write', lambda *_: self.schedule_refresh())
+        
+        # 結果表格
+        tree_frame = tk.Frame(self.window)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        self.tree = ttk.Treeview(tree_frame, columns=('number', 'names', 'repeats'), show='headings')
+        self.tree.heading('number', text="#")
+        self.tree.heading('names', text="組員")
+        self.tree.heading('repeats', text="重複配對")
+        self.tree.column('number', width=50, stretch=False, anchor=tk.E)
+        self.tree.column('names', width=300)
+        self.tree.column('repeats', width=160)
+        self.tree.tag_configure('repeat', background="#FFFF00", foreground="#FF0000")
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.count_label = tk.Label(self.window, anchor=tk.W)
+        self.count_label.pack(fill=tk.X, padx=10, pady=(5, 10))
+        
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        search_entry.focus_set()
+        self.refresh()
+    
+    def schedule_refresh(self):
+        """輸入搜尋文字時延遲篩選，連續輸入只重新篩選一次"""
+        if self.search_job is not None:
+            self.window.after_cancel(self.search_job)
+        self.search_job = self.window.after(RESULT_VIEW_SEARCH_DELAY_MS, self.refresh)
+    
+    def refresh(self):
+        """依搜尋文字與篩選條件重建表格內容"""
+        self.search_job = None
+        if self.insert_job is not None:
+            self.window.after_cancel(self.insert_job)
+            self.insert_job = None
+        
+        query = canonical_name(self.search_var.get()).lower()
+        repeats_only = self.repeats_only_var.get()
+        self.visible = [
+            row for row in self.rows
+            if (not repeats_only or row['repeats']) and (not query or query in row['text'])
+        ]
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self.insert_batch(0)
+    
+    def insert_batch(self, start: int):
+        """插入一批列，還有剩餘時排入下一次事件迴圈"""
+        end = min(start + RESULT_VIEW_BATCH, len(self.visible))
+        for row in self.visible[start:end]:
+            self.tree.insert('', tk.END, values=(
+                row['number'],
+                ' ↔ '.join(row['names']),
+                '、'.join(' ↔ '.join(pair) for pair in row['repeats']),
+            ), tags=('repeat',) if row['repeats'] else ())
+        
+        self.count_label.config(text=f"顯示 {end} / {len(self.visible)} 組（共 {len(self.rows)} 組，"
+                                     f"有重複配對 {self.repeat_count} 組）")
+        self.insert_job = self.window.after(1, self.insert_batch, end) if end < len(self.visible) else None
+    
+    def close(self):
+        for job in (self.insert_job, self.search_job):
+            if job is not None:
+                self.window.after_cancel(job)
+        self.window.destroy()
 
 class MatchingGUI:
     def __init__(self):
         self.logger = logging.getLogger('MatchingGUI')
         self.logger.info("初始化配對GUI")
         
+        load_tkinter()
+        
         # 創建主視窗
         self.window = tk.Tk()
         self.window.title("人員配對系統 v2.0")
@@ -98,6 +611,13 @@ class MatchingGUI:
         
         # 初始化變數
         self.current_excel_path = None
+        self.result_viewer = None
+        # 工作簿快照快取：{文件路徑: WorkbookSnapshot}，以修改時間判斷是否失效
+        self.snapshot_cache = {}
+        
+        # 視窗繪製完成後，再於背景載入 pandas 與 openpyxl
+        self.modules_ready = threading.Event()
+        self.window.after(100, self.preload_modules)
         
     def setup_ui(self):
         """設置用戶界面"""
@@ -160,8 +680,33 @@ class MatchingGUI:
             self.log_button = tk.Button(button_frame, text="查看日誌", command=self.open_log_file)
             self.log_button.pack(side=tk.LEFT, padx=5)
         
-        # 初始狀態訊息
-        self.update_status("系統已就緒，請檢查配置或開始配對")
+        # 初始狀態訊息（資料處理模組載入完成後更新為就緒）
+        self.update_status("正在載入資料處理模組...")
+        
+    def preload_modules(self):
+        """在背景線程載入 pandas 與 openpyxl，避免阻塞視窗繪製"""
+        def worker():
+            start = time.perf_counter()
+            try:
+                import pandas  # noqa: F401
+                import openpyxl  # noqa: F401
+                self.logger.info(f"資料處理模組載入完成，耗時 {time.perf_counter() - start:.2f} 秒")
+            except Exception as e:
+                self.logger.error(f"載入資料處理模組失敗：{e}")
+            finally:
+                self.modules_ready.set()
+        
+        threading.Thread(target=worker, name='module-preload', daemon=True).start()
+        self.window.after(100, self.poll_preload)
+        
+    def poll_preload(self):
+        """在主線程等待背景載入完成（tkinter 只能在主線程更新）"""
+        if self.modules_ready.is_set():
+            # 使用者已開始操作時不覆蓋其狀態訊息
+            if self.status_text.get('1.0', 'end-1c') == "正在載入資料處理模組...":
+                self.update_status("系統已就緒，請檢查配置或開始配對")
+        else:
+            self.window.after(100, self.poll_preload)
         
     def browse_file(self):
         """瀏覽並選擇Excel文件位置"""
@@ -183,6 +728,19 @@ class MatchingGUI:
             self.logger.error(f"文件瀏覽失敗：{e}")
             self.update_status(f"文件瀏覽失敗：{e}", True)
             
+    def get_workbook_snapshot(self, excel_path) -> WorkbookSnapshot:
+        """獲取工作簿快照，文件未變更時直接使用快取"""
+        key = str(excel_path)
+        snapshot = self.snapshot_cache.get(key)
+        if snapshot is not None and snapshot.is_current():
+            self.logger.info(f"使用快取的工作簿快照：{Path(key).name}")
+            return snapshot
+        
+        self.logger.info(f"讀取工作簿快照：{key}")
+        snapshot = WorkbookSnapshot(key)
+        self.snapshot_cache[key] = snapshot
+        return snapshot
+        
     def check_configuration(self):
         """檢查系統配置和文件狀態"""
         try:
@@ -213,14 +771,14 @@ class MatchingGUI:
                 
                 # 檢查工作表
                 try:
-                    excel_file = pd.ExcelFile(excel_path)
-                    sheets = excel_file.sheet_names
+                    snapshot = self.get_workbook_snapshot(excel_path)
+                    sheets = snapshot.sheet_names
                     
                     if '人員名單' in sheets:
                         config_messages.append("✅ 找到'人員名單'工作表")
                         
                         # 檢查人員名單內容
-                        df = pd.read_excel(excel_path, sheet_name='人員名單')
+                        df = snapshot.read_sheet('人員名單')
                         if '姓名' in df.columns:
                             people_count = len(df['姓名'].dropna())
                             config_messages.append(f"👥 人員名單中有 {people_count} 人")
@@ -233,7 +791,7 @@ class MatchingGUI:
                         config_messages.append("✅ 找到'參與配對人員'工作表")
                         
                         # 檢查參與配對人員內容
-                        df = pd.read_excel(excel_path, sheet_name='參與配對人員')
+                        df = snapshot.read_sheet('參與配對人員')
                         if '姓名' in df.columns:
                             participants_count = len(df['姓名'].dropna())
                             config_messages.append(f"🎯 參與配對人員有 {participants_count} 人")
@@ -298,7 +856,10 @@ class MatchingGUI:
         self.status_text.config(state='disabled')  # 恢復為不可編輯
         
     def execute_matching(self):
-        """執行配對並儲存結果"""
+        """執行配對，立即顯示結果並在背景儲存"""
+        import pandas as pd
+        
+        save_started = False
         try:
             self.logger.info("開始執行配對")
             self.update_status("正在準備配對...")
@@ -324,8 +885,12 @@ class MatchingGUI:
             self.logger.info(f"使用Excel文件路徑：{excel_path}")
             self.update_status(f"正在讀取文件：{Path(excel_path).name}...")
             
-            # 建立配對名單實例
-            matcher = MatchingSystem(str(excel_path))
+            # 建立配對名單實例（文件已存在時共用配置檢查留下的快照）
+            # 不使用結果快取：每次保存都會寫入新的歷史記錄，下一次的輸入指紋必定不同，快取只會增加讀寫成本
+            snapshot = None
+            if Path(excel_path).exists():
+                snapshot = self.get_workbook_snapshot(excel_path)
+            matcher = MatchingSystem(str(excel_path), snapshot=snapshot)
             
             self.update_status("正在執行配對算法...")
             
@@ -334,11 +899,6 @@ class MatchingGUI:
             
             self.logger.info(f"配對完成 - 總配對數: {len(matches)}, 重複配對數: {len(repeated_pairs)}")
             
-            self.update_status("正在保存配對結果...")
-            
-            # 儲存結果
-            matcher.save_matching_result(matches, repeated_pairs)
-            
             # 準備結果訊息
             result_messages = [
                 f"✅ 配對完成！",
@@ -348,29 +908,18 @@ class MatchingGUI:
             
             if repeated_pairs:
                 result_messages.append(f"⚠️ 重複配對：{len(repeated_pairs)} 組")
+                lower_bound = matcher.metrics.values.get('repeat_lower_bound')
+                if lower_bound:
+                    result_messages.append(f"📉 理論下限：至少 {lower_bound} 組重複")
                 result_messages.append("請檢查Excel文件中的黃色標記")
             else:
                 result_messages.append("🎉 無重複配對！")
             
-            result_messages.append(f"💾 結果已保存至：{Path(excel_path).name}")
-            
-            # 更新狀態
-            status_text = "\n".join(result_messages)
-            self.update_status(status_text)
-            
-            # 準備詳細結果顯示
-            detail_text = "配對結果詳情：\n\n"
-            for i, match in enumerate(matches, 1):
-                detail_text += f"{i}. {' ↔ '.join(match)}\n"
-            
-            if repeated_pairs:
-                detail_text += "\n重複配對警告：\n"
-                for i, pair in enumerate(repeated_pairs, 1):
-                    detail_text += f"{i}. {' ↔ '.join(pair)}\n"
-                detail_text += "\n這些配對在歷史記錄中已存在，已在Excel中標記為黃色。"
-            
-            # 顯示結果對話框
-            messagebox.showinfo("配對完成", detail_text)
+            # 結果立即顯示，保存在背景線程進行，完成或失敗時再更新狀態
+            self.update_status("\n".join(result_messages + [f"💾 正在背景保存至：{Path(excel_path).name}..."]))
+            self.show_results(matches, repeated_pairs)
+            self.start_background_save(matcher, matches, repeated_pairs, result_messages, excel_path)
+            save_started = True
             
             self.logger.info("配對流程完成")
             
@@ -402,1274 +951,2311 @@ class MatchingGUI:
             messagebox.showerror("系統錯誤", error_detail)
             
         finally:
-            # 重新啟用配對按鈕
-            self.match_button.config(state='normal')
+            # 重新啟用配對按鈕（背景保存進行中時，由 poll_save 在保存結束後啟用）
+            if not save_started:
+                self.match_button.config(state='normal')
+    
+    def start_background_save(self, matcher: 'MatchingSystem', matches: List[Tuple[str, ...]],
+                              repeated_pairs: List[Tuple[str, ...]], result_messages: List[str], excel_path):
+        """在背景線程保存配對結果（保存期間停用配對按鈕），避免保存時間阻塞視窗"""
+        outcome = {}
+        done = threading.Event()
+        
+        def worker():
+            try:
+                matcher.save_matching_result(matches, repeated_pairs)
+            except Exception as e:
+                self.logger.error(f"保存配對結果失敗：{e}\n{traceback.format_exc()}")
+                outcome['error'] = e
+            finally:
+                done.set()
+        
+        # 非守護線程：關閉視窗時仍會完成保存（保存本身是原子性的，不會留下寫入一半的文件）
+        threading.Thread(target=worker, name='workbook-save').start()
+        self.window.after(100, self.poll_save, done, outcome, matcher, result_messages, excel_path)
+    
+    def poll_save(self, done: threading.Event, outcome: dict, matcher: 'MatchingSystem',
+                  result_messages: List[str], excel_path):
+        """在主線程等待背景保存完成，並顯示完成或失敗的通知（tkinter 只能在主線程更新）"""
+        if not done.is_set():
+            self.window.after(100, self.poll_save, done, outcome, matcher, result_messages, excel_path)
+            return
+        
+        self.match_button.config(state='normal')
+        name = Path(excel_path).name
+        if 'error' in outcome:
+            error = outcome['error']
+            self.update_status("\n".join(result_messages + [f"❌ 保存失敗：{error}", "Excel文件保持原狀，可重新執行配對"]),
+                               True)
+            messagebox.showerror("保存失敗", f"配對結果未能保存至 {name}：\n{error}\n\nExcel文件保持原狀，"
+                                            "請確認文件未被其他程序開啟後重新執行配對。")
+            return
+        
+        # 將效能指標（包含保存階段）寫在日誌文件旁邊
+        if log_file_path:
+            try:
+                metrics_path = write_metrics_next_to_log(matcher.metrics.to_dict(), log_file_path)
+                self.logger.info(f"效能指標已寫入：{metrics_path}")
+            except Exception as e:
+                self.logger.warning(f"寫入效能指標失敗：{e}")
+        
+        self.update_status("\n".join(result_messages + [f"💾 結果已保存至：{name}"] + matcher.metrics.summary_lines()))
+        self.logger.info("配對結果已在背景保存完成")
+    
+    def show_results(self, matches: List[Tuple[str, ...]], repeated_pairs: List[Tuple[str, ...]]):
+        """開啟結果檢視視窗，已開啟的舊視窗先關閉"""
+        if self.result_viewer is not None and self.result_viewer.window.winfo_exists():
+            self.result_viewer.close()
+        self.result_viewer = ResultViewer(self.window, matches, repeated_pairs,
+                                          title=f"配對結果（{len(matches)} 組）")
     
     def run(self):
         self.window.mainloop()
 
-class MatchingSystem:
-    def __init__(self, excel_filename: str):
-        self.logger = logging.getLogger(__name__)
+@functools.lru_cache(maxsize=NAME_CACHE_SIZE)
+def canonical_text(text: str) -> str:
+    """字串姓名的標準寫法：NFKC 正規化（全形 @ 與全形空白轉為半形）、合併空白、去除開頭的 @"""
+    import unicodedata
+    
+    text = ' '.join(unicodedata.normalize('NFKC', text).split())
+    text = text.lstrip('@').lstrip()
+    # 相同的標準名稱共用同一個字串物件，字典與集合查詢可以先比較身分
+    return sys.intern(text)
+
+def canonical_name(value) -> str:
+    """
+    把工作表儲存格或配對結果中的姓名轉換為標準名稱，系統內所有的比較與查詢都使用標準名稱
+    - None、NaN 與空白返回空字串
+    - 整數值的數字去掉小數部分（例如以編號記錄的 1001.0 → '1001'），其他值轉為文字
+    """
+    if isinstance(value, str):
+        return canonical_text(value)
+    if value is None:
+        return ''
+    try:
+        if value != value:  # NaN
+            return ''
+    except TypeError:  # pandas.NA 無法比較
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return canonical_text(str(value))
+
+def parse_partner_header(column: str):
+    """從「配對者 YYYY-MM-DD [n]」欄位名稱取出日期，沒有日期時返回 None"""
+    import re
+    
+    match = re.search(r'(\d{4})-(\d{1,2})-(\d{1,2})', str(column))
+    if not match:
+        return None
+    try:
+        return datetime.date(*(int(part) for part in match.groups()))
+    except ValueError:
+        return None
+
+def partner_header_part(column: str) -> Tuple[str, int]:
+    """
+    「配對者 YYYY-MM-DD n」欄位名稱中的多人組序號 n（沒有時為 1），以及去掉序號後的欄位名稱
+    - 同一天重複的欄位名稱由 pandas 加上 .1、.2 等後綴，後綴保留在返回的名稱中以區分不同次的配對
+    """
+    import re
+    
+    match = re.match(r'^(.*\d{4}-\d{1,2}-\d{1,2}) (\d+)(\.\d+)?$', str(column))
+    if not match:
+        return str(column), 1
+    return match.group(1) + (match.group(3) or ''), int(match.group(2))
+
+class PairHistoryIndex:
+    """
+    歷史配對的緊湊索引，以整數編號存放每對人員的見面次數與最近一次見面
+    - ids: 標準名稱（canonical_name）到整數編號的對照
+    - counts: 見面次數，array('H')，以 i * size + j 索引並對稱存放
+    - last_round: 最近一次見面距今的輪數（0 為最近一輪），未見過為 NEVER
+    - last_date: 最近一次見面日期的序數（date.toordinal），欄位沒有日期時為 0
+    - person_repeats: 每個人累計被分到重複配對的輪數，array('H')，以人員編號索引
+    - forbidden: 「不可同組」的配對，array('B')，與 counts 相同的索引方式；代價為 FORBIDDEN_WEIGHT
+    - must_groups: 「必須同組」的人員組（名稱），由呼叫端在搜尋前合併為固定分組
+    同一次配對寫入的多個配對者欄位（三人組的「配對者 日期 1/2」）視為同一輪，只計一次；
+    同一天執行多次配對時每次各為一輪
+    """
+    NEVER = 0xFFFF
+    
+    def __init__(self, names: List[str], rounds: List[Tuple[datetime.date, List[Tuple[str, str]]]],
+                 never_pairs: List[Tuple[str, str]] = (), must_groups: List[Tuple[str, ...]] = ()):
+        """rounds 依新到舊排列，每輪為 (日期或 None, 名稱配對列表)"""
+        from array import array
         
-        # 處理文件路徑
-        if os.path.isabs(excel_filename):
-            self.excel_path = excel_filename
-        else:
-            # 獲取桌面路徑
-            self.desktop_path = os.path.join(os.path.expanduser('~'), 'Desktop')
-            # 完整的 Excel 檔案路徑
-            self.excel_path = os.path.join(self.desktop_path, excel_filename)
+        self.ids = {}
+        for name in names:
+            self.ids.setdefault(name, len(self.ids))
+        for _, pairs in rounds:
+            for a, b in pairs:
+                self.ids.setdefault(a, len(self.ids))
+                self.ids.setdefault(b, len(self.ids))
+        for a, b in never_pairs:
+            self.ids.setdefault(a, len(self.ids))
+            self.ids.setdefault(b, len(self.ids))
+        self.must_groups = list(must_groups)
         
-        self.logger.info(f"初始化配對系統，Excel路徑：{self.excel_path}")
+        size = self.size = len(self.ids)
+        self.counts = array('H', bytes(2 * size * size))
+        self.last_round = array('H', [self.NEVER]) * (size * size)
+        self.last_date = array('l', [0]) * (size * size)
+        self.round_count = len(rounds)
         
-        try:
-            # 檢查文件是否存在
-            if os.path.exists(self.excel_path):
-                file_size = os.path.getsize(self.excel_path)
-                self.logger.info(f"Excel文件存在，大小：{file_size} bytes")
-                # 嘗試讀取現有的 Excel 檔案
-                self.excel = pd.ExcelFile(self.excel_path)
+        self.forbidden = array('B', bytes(size * size))
+        for a, b in never_pairs:
+            i, j = self.ids[a], self.ids[b]
+            self.forbidden[i * size + j] = self.forbidden[j * size + i] = 1
+        
+        for age, (date, pairs) in enumerate(rounds):
+            ordinal = date.toordinal() if date is not None else 0
+            seen = set()
+            for a, b in pairs:
+                i, j = self.ids[a], self.ids[b]
+                if i == j or (i, j) in seen:
+                    continue
+                seen.add((i, j))
+                seen.add((j, i))
+                for slot in (i * size + j, j * size + i):
+                    self.counts[slot] = min(self.counts[slot] + 1, self.NEVER - 1)
+                    if self.last_round[slot] == self.NEVER:
+                        self.last_round[slot] = age
+                        self.last_date[slot] = ordinal
+        
+        # 由舊到新重播各輪：與之前見過的人同組即為該輪的一次重複
+        self.person_repeats = array('H', bytes(2 * size))
+        met_before = set()
+        for _, pairs in reversed(rounds):
+            repeated_people = set()
+            round_pairs = set()
+            for a, b in pairs:
+                i, j = self.ids[a], self.ids[b]
+                if i == j:
+                    continue
+                pair = (min(i, j), max(i, j))
+                round_pairs.add(pair)
+                if pair in met_before:
+                    repeated_people.update(pair)
+            for person in repeated_people:
+                self.person_repeats[person] = min(self.person_repeats[person] + 1, self.NEVER - 1)
+            met_before |= round_pairs
+    
+    def digest(self) -> str:
+        """索引內容（人員編號、見面次數、最近見面輪數、配對限制）的摘要，作為結果快取指紋的一部分"""
+        import hashlib
+        
+        digest = hashlib.sha256()
+        digest.update(json.dumps([list(self.ids), self.must_groups], ensure_ascii=False).encode('utf-8'))
+        for values in (self.counts, self.last_round, self.forbidden, self.person_repeats):
+            digest.update(values.tobytes())
+        return digest.hexdigest()
+    
+    def pair_set(self) -> Set[Tuple[str, ...]]:
+        """返回與舊版 get_matching_history 相同格式的配對集合"""
+        names = list(self.ids)
+        size = self.size
+        return {
+            tuple(sorted((names[i], names[j])))
+            for i in range(size) for j in range(i + 1, size)
+            if self.counts[i * size + j]
+        }
+    
+    def pair_weight(self, i: int, j: int) -> int:
+        """兩個人員編號的加權重複代價，未見過為 0，不可同組為 FORBIDDEN_WEIGHT"""
+        slot = i * self.size + j
+        if self.forbidden[slot]:
+            return FORBIDDEN_WEIGHT
+        count = self.counts[slot]
+        if not count:
+            return 0
+        recency = max(0, REPEAT_RECENCY_ROUNDS - self.last_round[slot])
+        return REPEAT_BASE_WEIGHT + min(count - 1, 7) * REPEAT_COUNT_WEIGHT + recency
+    
+    def meet_count(self, a: str, b: str) -> int:
+        """兩個名稱的見面次數，不在索引中的人員為 0"""
+        i, j = self.ids.get(a), self.ids.get(b)
+        return 0 if i is None or j is None or i == j else self.counts[i * self.size + j]
+    
+    def name_weight(self, a: str, b: str) -> int:
+        """兩個名稱的加權重複代價，不在索引中的人員為 0"""
+        i, j = self.ids.get(a), self.ids.get(b)
+        return 0 if i is None or j is None or i == j else self.pair_weight(i, j)
+    
+    def is_forbidden(self, a: str, b: str) -> bool:
+        """兩個名稱是否受「不可同組」限制"""
+        i, j = self.ids.get(a), self.ids.get(b)
+        return i is not None and j is not None and bool(self.forbidden[i * self.size + j])
+    
+    def count_matrix(self, names: List[str]) -> List[List[int]]:
+        """依名單順序建立見面次數矩陣"""
+        ids = [self.ids.get(name) for name in names]
+        size = self.size
+        return [
+            [0 if i is None or j is None else self.counts[i * size + j] for j in ids]
+            for i in ids
+        ]
+    
+    def person_repeat_counts(self, names: List[str]) -> List[int]:
+        """依名單順序返回每個人累計的重複配對輪數"""
+        return [self.person_repeats[self.ids[name]] if name in self.ids else 0 for name in names]
+    
+    def weight_matrix(self, names: List[str]) -> List[List[int]]:
+        """依名單順序建立加權代價矩陣，不在索引中的人員與所有人代價為 0"""
+        ids = [self.ids.get(name) for name in names]
+        matrix = []
+        for i in ids:
+            if i is None:
+                matrix.append([0] * len(ids))
             else:
-                self.logger.warning(f"Excel文件不存在，將創建新文件：{self.excel_path}")
-                raise FileNotFoundError("文件不存在")
-                
-        except FileNotFoundError:
-            # 如果檔案不存在，創建新的 Excel 檔案
-            self.logger.info("創建新的Excel文件")
-            people_df = pd.DataFrame(columns=['姓名'])
-            participants_df = pd.DataFrame(columns=['姓名'])
-            
-            # 確保目錄存在
-            os.makedirs(os.path.dirname(self.excel_path), exist_ok=True)
-            
-            with pd.ExcelWriter(self.excel_path, engine='openpyxl') as writer:
-                people_df.to_excel(writer, sheet_name='人員名單', index=False)
-                participants_df.to_excel(writer, sheet_name='參與配對人員', index=False)
-            
-            self.logger.info("新Excel文件創建完成")
-            self.excel = pd.ExcelFile(self.excel_path)
-            
-        except Exception as e:
-            error_msg = f"初始化Excel文件時發生錯誤：{e}"
-            self.logger.error(error_msg)
-            raise Exception(error_msg)
+                matrix.append([0 if j is None else self.pair_weight(i, j) for j in ids])
+        return matrix
+
+def met_weights(met: List[int]) -> List[List[int]]:
+    """由位元遮罩建立未加權的代價矩陣（曾經配對為 1）"""
+    n = len(met)
+    return [[(mask >> j) & 1 for j in range(n)] for mask in met]
+
+def masks_from_weights(weights: List[List[int]]) -> List[int]:
+    """由代價矩陣還原「曾經配對」的位元遮罩"""
+    met = []
+    for row in weights:
+        mask = 0
+        for j, weight in enumerate(row):
+            if weight:
+                mask |= 1 << j
+        met.append(mask)
+    return met
+
+def build_met_masks(names: List[str], history: Set[Tuple[str, ...]]) -> List[int]:
+    """
+    將歷史配對轉換為位元遮罩：met[i] 的第 j 位為 1 表示 names[i] 與 names[j] 曾經配對
+    - names 必須是標準名稱（canonical_name）
+    """
+    positions = {}
+    for i, name in enumerate(names):
+        positions.setdefault(name, []).append(i)
     
-    def get_all_people(self) -> List[str]:
-        """獲取所有待配對人員名單"""
-        try:
-            self.logger.info("正在讀取人員名單...")
-            
-            if not os.path.exists(self.excel_path):
-                raise FileNotFoundError(f"Excel文件不存在：{self.excel_path}")
-            
-            df = pd.read_excel(self.excel_path, sheet_name='人員名單')
-            
-            if '姓名' not in df.columns:
-                raise ValueError("人員名單工作表中找不到'姓名'欄位")
-            
-            people = [name for name in df['姓名'].dropna().tolist() if name and str(name).strip()]
-            self.logger.info(f"成功讀取 {len(people)} 位人員")
-            return people
-            
-        except FileNotFoundError:
-            raise
-        except ValueError:
-            raise
-        except Exception as e:
-            error_msg = f"讀取人員名單時發生錯誤: {e}"
-            self.logger.error(error_msg)
-            raise Exception(error_msg)
+    met = [0] * len(names)
+    for pair in history:
+        if len(pair) != 2:
+            continue
+        for i in positions.get(pair[0], ()):
+            for j in positions.get(pair[1], ()):
+                if i != j:
+                    met[i] |= 1 << j
+                    met[j] |= 1 << i
+    return met
+
+def iter_bits(mask: int):
+    """依序產生位元遮罩中為 1 的位置"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+def allowed_masks(met: List[int]) -> List[int]:
+    """從未配對過（允許配對）的位元遮罩，不包含自己"""
+    full = (1 << len(met)) - 1
+    return [full & ~met[i] & ~(1 << i) for i in range(len(met))]
+
+def max_cardinality_matching(allowed: List[int], excluded: int = 0) -> List[int]:
+    """
+    Edmonds 花演算法求一般圖的最大匹配，O(V^3)
+    - allowed[i] 為 i 可以配對的對象位元遮罩
+    - excluded 中的人員不參與匹配
+    返回: mate 陣列，mate[i] 為 i 的配對對象，未匹配為 -1
+    """
+    from collections import deque
+    
+    n = len(allowed)
+    mate = [-1] * n
+    active = [(excluded >> v) & 1 == 0 for v in range(n)]
+    adjacency = [[u for u in iter_bits(allowed[v] & ~excluded)] if active[v] else [] for v in range(n)]
+    
+    # 先以貪婪法建立初始匹配，減少需要增廣的次數
+    for v in range(n):
+        if active[v] and mate[v] == -1:
+            for u in adjacency[v]:
+                if mate[u] == -1:
+                    mate[v], mate[u] = u, v
+                    break
+    
+    def augment_from(root: int) -> bool:
+        used = [False] * n
+        parent = [-1] * n
+        base = list(range(n))
+        used[root] = True
+        queue = deque([root])
         
-    def get_matching_history(self) -> Set[Tuple[str, ...]]:
-        """從人員名單獲取歷史配對記錄"""
-        history_set = set()
+        def lowest_common_ancestor(a: int, b: int) -> int:
+            seen = [False] * n
+            while True:
+                a = base[a]
+                seen[a] = True
+                if mate[a] == -1:
+                    break
+                a = parent[mate[a]]
+            while True:
+                b = base[b]
+                if seen[b]:
+                    return b
+                b = parent[mate[b]]
         
-        try:
-            self.logger.info("正在讀取歷史配對記錄...")
-            
-            if not os.path.exists(self.excel_path):
-                self.logger.warning("Excel文件不存在，返回空的歷史記錄")
-                return history_set
-            
-            # 讀取人員名單
-            df = pd.read_excel(self.excel_path, sheet_name='人員名單')
-            
-            # 確保有「姓名」欄位
-            if '姓名' not in df.columns:
-                self.logger.warning("人員名單工作表中找不到'姓名'欄位")
-                return history_set
-            
-            self.logger.info(f"檢查 Excel 檔案中的所有欄位: {df.columns.tolist()}")
-            
-            # 獲取所有配對者欄位（除了「姓名」以外的所有欄位）
-            partner_columns = [col for col in df.columns if col != '姓名' and '配對者' in col]
-            
-            # 如果沒有配對者欄位，返回空集合
-            if not partner_columns:
-                self.logger.warning("Excel 檔案中未找到任何配對者欄位")
-                return history_set
-            
-            # 打印檢查欄位，用於偵錯
-            self.logger.info(f"找到 {len(partner_columns)} 個配對者欄位: {partner_columns}")
-            
-            # 遍歷每一行（每個人）
-            for idx, row in df.iterrows():
-                person = row['姓名']
-                if not isinstance(person, str) or not person.strip():
+        def mark_path(v: int, b: int, child: int, blossom: List[bool]):
+            while base[v] != b:
+                blossom[base[v]] = blossom[base[mate[v]]] = True
+                parent[v] = child
+                child = mate[v]
+                v = parent[mate[v]]
+        
+        while queue:
+            v = queue.popleft()
+            for to in adjacency[v]:
+                if base[v] == base[to] or mate[v] == to:
                     continue
-                    
-                # 移除人名前的 @ 符號進行比較
-                person_clean = person[1:].strip() if person.startswith('@') else person.strip()
-                self.logger.debug(f"檢查人員: {person} -> {person_clean}")
-                    
-                # 遍歷該人的所有配對者
-                for col in partner_columns:
-                    partner = row[col]
-                    if not pd.isna(partner) and isinstance(partner, str) and partner.strip():
-                        # 移除配對者名字前的 @ 符號進行比較
-                        partner_clean = partner[1:].strip() if partner.startswith('@') else partner.strip()
-                        self.logger.debug(f"檢查配對者: {partner} -> {partner_clean}")
-                        
-                        if partner_clean and person_clean and partner_clean != person_clean:
-                            # 將配對加入歷史記錄（使用不帶 @ 的名字）
-                            pair = tuple(sorted([person_clean, partner_clean]))
-                            history_set.add(pair)
-                            self.logger.debug(f"添加歷史配對: {pair}")
-            
-            self.logger.info(f"成功讀取 {len(history_set)} 組歷史配對記錄")
-            if self.logger.isEnabledFor(logging.DEBUG):
-                self.logger.debug(f"完整的歷史配對清單: {history_set}")
-            return history_set
-            
-        except Exception as e:
-            error_msg = f"讀取配對歷史時出錯: {str(e)}"
-            self.logger.error(f"{error_msg}\n{traceback.format_exc()}")
-            return history_set
+                if to == root or (mate[to] != -1 and parent[mate[to]] != -1):
+                    # 找到奇環（花），收縮到共同祖先
+                    current_base = lowest_common_ancestor(v, to)
+                    blossom = [False] * n
+                    mark_path(v, current_base, to, blossom)
+                    mark_path(to, current_base, v, blossom)
+                    for i in range(n):
+                        if blossom[base[i]]:
+                            base[i] = current_base
+                            if not used[i]:
+                                used[i] = True
+                                queue.append(i)
+                elif parent[to] == -1:
+                    parent[to] = v
+                    if mate[to] == -1:
+                        # 沿增廣路徑翻轉匹配邊
+                        while to != -1:
+                            previous = parent[to]
+                            next_to = mate[previous]
+                            mate[to], mate[previous] = previous, to
+                            to = next_to
+                        return True
+                    used[mate[to]] = True
+                    queue.append(mate[to])
+        return False
     
-    def save_matching_result(self, matches: List[Tuple[str, ...]], repeated_pairs: List[Tuple[str, ...]] = None):
-        """保存本次配對結果，並標記重複配對"""
-        try:
-            self.logger.info("=== 開始保存配對結果 ===")
-            self.logger.info(f"配對組數: {len(matches)}")
-            self.logger.info(f"重複配對組數: {len(repeated_pairs) if repeated_pairs else 0}")
-            
-            if not matches:
-                self.logger.warning("沒有配對結果需要保存")
-                return
-            self.logger.debug(f"repeated_pairs 參數: {repeated_pairs}")
-            self.logger.debug(f"matches 詳細內容: {matches}")
-            
-            import pandas as pd  # 確保 pd 在整個函數中可用
-            import openpyxl
-            from openpyxl.styles import PatternFill, Font
-            
-            if repeated_pairs is None:
-                repeated_pairs = []
-            
-            # 設定重複配對的樣式
-            yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-            red_font = Font(color="FF0000", bold=True)
-            
-            # 讀取現有的 Excel 檔案
-            workbook = openpyxl.load_workbook(self.excel_path)
-            
-            # 創建配對結果字典，方便查詢每個人的配對者
-            match_dict = {}
-            for match in matches:
-                if len(match) == 2:
-                    # 確保每個人的鍵存在
-                    if match[0] not in match_dict:
-                        match_dict[match[0]] = []
-                    if match[1] not in match_dict:
-                        match_dict[match[1]] = []
-                    
-                    # 添加配對關係（確保只有一個 @ 前綴）
-                    partner1 = match[1]
-                    if not isinstance(partner1, str):
-                        partner1_with_at = f"@{str(partner1)}"
-                    elif partner1.startswith('@'):
-                        partner1_with_at = partner1  # 已有 @ 前綴，保持不變
-                    else:
-                        partner1_with_at = f"@{partner1}"
-                    
-                    partner2 = match[0]
-                    if not isinstance(partner2, str):
-                        partner2_with_at = f"@{str(partner2)}"
-                    elif partner2.startswith('@'):
-                        partner2_with_at = partner2  # 已有 @ 前綴，保持不變
-                    else:
-                        partner2_with_at = f"@{partner2}"
-                    
-                    match_dict[match[0]].append(partner1_with_at)
-                    match_dict[match[1]].append(partner2_with_at)
-                elif len(match) == 3:
-                    # 確保每個人的鍵存在
-                    if match[0] not in match_dict:
-                        match_dict[match[0]] = []
-                    if match[1] not in match_dict:
-                        match_dict[match[1]] = []
-                    if match[2] not in match_dict:
-                        match_dict[match[2]] = []
-                    
-                    # 添加配對關係（確保只有一個 @ 前綴）
-                    for i in range(3):
-                        for j in range(3):
-                            if i != j:  # 避免自己配對自己
-                                person = match[i]
-                                partner = match[j]
-                                
-                                # 確保 partner 只有一個 @ 前綴
-                                if not isinstance(partner, str):
-                                    partner_with_at = f"@{str(partner)}"
-                                elif partner.startswith('@'):
-                                    partner_with_at = partner  # 已有 @ 前綴，保持不變
-                                else:
-                                    partner_with_at = f"@{partner}"
-                                
-                                match_dict[person].append(partner_with_at)
-            
-            # 輸出配對結果供檢查
-            self.logger.debug(f"配對字典: {match_dict}")
-            
-            # 在填充 Excel 前記錄 match_dict
-            self.logger.info("配對字典詳情：")
-            for person, partners in match_dict.items():
-                self.logger.info(f"{person}: {partners}")
-            
-            # 創建人員名單 DataFrame
-            # 收集所有參與配對的人員（包括配對者和被配對者）
-            all_people = set()
-            for person, partners in match_dict.items():
-                if isinstance(person, str):
-                    person_clean = person[1:].strip() if person.startswith('@') else person.strip()
-                    all_people.add(person_clean)
-                
-                # 添加所有配對者
-                for partner in partners:
-                    if isinstance(partner, str):
-                        partner_clean = partner[1:].strip() if partner.startswith('@') else partner.strip()
-                        all_people.add(partner_clean)
-            
-            # 使用 all_people 替代原來的方法
-            people_list = sorted(list(all_people))
-            self.logger.info(f"參與配對人員列表 ({len(people_list)} 人): {people_list}")
-            
-            import datetime
-            today = datetime.datetime.now().strftime("%Y-%m-%d")
-            
-            # 找出最大配對者數量
-            max_partners = max([len(partners) for partners in match_dict.values()], default=1)
-            self.logger.info(f"最大配對者數量: {max_partners}")
-            
-            # 更新人員名單工作表
-            try:
-                # 讀取現有的人員名單，保留歷史配對資料
-                existing_people_df = pd.read_excel(self.excel_path, sheet_name='人員名單')
-                self.logger.info(f"現有人員名單欄位: {existing_people_df.columns.tolist()}")
-                self.logger.info(f"現有人員數量: {len(existing_people_df)}")
-                
-                # 獲取當前日期作為新欄位名稱
-                import datetime
-                today = datetime.datetime.now().strftime("%Y-%m-%d")
-                
-                # 創建新的配對者欄位名稱
-                new_columns = []
-                for i in range(max_partners):
-                    if max_partners > 1:
-                        new_columns.append(f"配對者 {today} {i+1}")
-                    else:
-                        new_columns.append(f"配對者 {today}")
-                
-                # 創建包含新配對的 DataFrame
-                new_data = {'姓名': [f"@{person}" for person in people_list]}
-                
-                # 添加新的配對結果
-                for col_name in new_columns:
-                    new_data[col_name] = [''] * len(people_list)  # 初始化為空字串
-                
-                for i, person in enumerate(people_list):
-                    person_with_at = f"@{person}"
-                    for j, col_name in enumerate(new_columns):
-                        if j < len(match_dict.get(person, [])):
-                            new_data[col_name][i] = match_dict[person][j]
-                        elif j < len(match_dict.get(person_with_at, [])):
-                            new_data[col_name][i] = match_dict[person_with_at][j]
-                
-                new_df = pd.DataFrame(new_data)
-                
-                # 合併現有資料和新資料
-                # 先確認哪些人已經存在，哪些人是新的
-                existing_names = existing_people_df['姓名'].tolist()
-                
-                # 重新組織 DataFrame，將新的配對欄位插入在「姓名」欄位之後
-                new_columns_order = ['姓名']
-                new_columns_order.extend(new_columns)  # 新配對欄位
-                
-                # 添加其他原有欄位
-                for col in existing_people_df.columns:
-                    if col != '姓名' and col not in new_columns:
-                        new_columns_order.append(col)
-                
-                # 創建新的 DataFrame
-                merged_df = pd.DataFrame(columns=new_columns_order)
-                
-                # 初始化為空值
-                for col in new_columns_order:
-                    merged_df[col] = ''
-                
-                # 複製現有數據
-                for i, row in existing_people_df.iterrows():
-                    new_row = {}
-                    for col in existing_people_df.columns:
-                        if col in new_columns_order:
-                            new_row[col] = row[col]
-                    
-                    # 添加到新 DataFrame
-                    merged_df = pd.concat([merged_df, pd.DataFrame([new_row])], ignore_index=True)
-                
-                # 更新現有人員的新配對資料
-                for i, row in new_df.iterrows():
-                    name = row['姓名']
-                    # 檢查是否為現有人員
-                    if name in existing_names:
-                        # 更新現有人員的新配對
-                        idx = existing_names.index(name)
-                        for col in new_columns:
-                            merged_df.at[idx, col] = row[col]
-                    else:
-                        # 添加新人員
-                        new_row = pd.Series(index=new_columns_order)
-                        new_row['姓名'] = name
-                        for col in new_columns:
-                            new_row[col] = row[col]
-                        merged_df = pd.concat([merged_df, pd.DataFrame([new_row])], ignore_index=True)
-                
-                # 記錄 merged_df 的最終結果
-                self.logger.debug("\n合併後的 DataFrame (merged_df)：")
-                self.logger.debug(f"\n{merged_df}\n")
-                
-                # 在寫入 Excel 前，保留原始參與配對人員
-                try:
-                    # 先嘗試讀取現有的參與配對人員
-                    existing_participants_df = pd.read_excel(self.excel_path, sheet_name='參與配對人員')
-                except:
-                    # 如果讀取失敗，則使用空的 DataFrame
-                    existing_participants_df = pd.DataFrame(columns=['姓名'])
-                
-                # 直接使用 openpyxl 保存資料，避免 Pandas 修改欄位名稱
-                from copy import copy
-                
-                # 先讀取原始的工作簿，保留所有原始格式和內容
-                workbook = openpyxl.load_workbook(self.excel_path)
-                
-                # 如果人員名單工作表已存在，則獲取它
-                if '人員名單' in workbook.sheetnames:
-                    people_sheet = workbook['人員名單']
-                    
-                    # 找到姓名列的索引
-                    name_col_idx = None
-                    for col_idx, cell in enumerate(people_sheet[1], 1):
-                        if cell.value == '姓名':
-                            name_col_idx = col_idx
-                            break
-                    
-                    if name_col_idx is None:
-                        name_col_idx = 1
-                    
-                    # 獲取所有現有欄位
-                    existing_cols = []
-                    for col_idx, cell in enumerate(people_sheet[1], 1):
-                        if cell.value:
-                            existing_cols.append((col_idx, cell.value))
-                    
-                    # 移動所有在姓名欄之後的列，為新配對欄位騰出空間
-                    # 從最右邊的列開始往右移動
-                    for i in range(len(existing_cols) - 1, 0, -1):
-                        if existing_cols[i][0] > name_col_idx:
-                            target_col_idx = existing_cols[i][0] + len(new_columns)
-                            source_col_idx = existing_cols[i][0]
-                            
-                            self.logger.info(f"移動欄位: 從第{source_col_idx}列移動到第{target_col_idx}列 (欄位名稱: {existing_cols[i][1]})")
-                            
-                            # 移動整列數據
-                            for row_idx in range(1, people_sheet.max_row + 1):
-                                source_cell = people_sheet.cell(row=row_idx, column=source_col_idx)
-                                target_cell = people_sheet.cell(row=row_idx, column=target_col_idx)
-                                
-                                # 複製單元格值和樣式
-                                target_cell.value = source_cell.value
-                                if source_cell.has_style:
-                                    target_cell.font = copy(source_cell.font)
-                                    target_cell.border = copy(source_cell.border)
-                                    target_cell.fill = copy(source_cell.fill)
-                                    target_cell.number_format = copy(source_cell.number_format)
-                                    target_cell.protection = copy(source_cell.protection)
-                                    target_cell.alignment = copy(source_cell.alignment)
-                                
-                                # 清空原來的位置
-                                source_cell.value = None
-                                # 重置樣式
-                                source_cell.font = openpyxl.styles.Font()
-                                source_cell.border = openpyxl.styles.Border()
-                                source_cell.fill = openpyxl.styles.PatternFill()
-                                source_cell.number_format = 'General'
-                                source_cell.alignment = openpyxl.styles.Alignment()
-                    
-                    # 在姓名列右側插入新的配對欄位
-                    for i, col_name in enumerate(new_columns):
-                        col_idx = name_col_idx + 1 + i
-                        people_sheet.cell(row=1, column=col_idx).value = col_name
-                    
-                    # 從 match_dict 中填入配對結果
-                    name_to_row_idx = {}
-                    for row_idx in range(2, people_sheet.max_row + 1):
-                        name = people_sheet.cell(row=row_idx, column=name_col_idx).value
-                        if name:
-                            # 儲存名稱和行索引的映射，便於填入配對結果
-                            name_clean = name[1:].strip() if isinstance(name, str) and name.startswith('@') else name
-                            name_to_row_idx[name_clean] = row_idx
-                            name_to_row_idx[f"@{name_clean}"] = row_idx
-                    
-                    # 在創建 name_to_row_idx 映射後記錄它
-                    self.logger.debug("名稱到行索引映射 (name_to_row_idx)：")
-                    self.logger.debug(f"{name_to_row_idx}")
-                    
-                    # 填入配對結果
-                    self.logger.info(f"=== 第一階段：填入已存在人員的配對結果 ===")
-                    self.logger.info(f"開始填入配對結果，match_dict 有 {len(match_dict)} 個項目")
-                    for person, partners in match_dict.items():
-                        self.logger.debug(f"\n處理人員: {person}, 配對者: {partners}")
-                        # 忽略可能的數字索引或其他非人名鍵
-                        if not isinstance(person, str):
-                            self.logger.debug(f"  跳過非字串鍵: {person}")
-                            continue
-                            
-                        person_clean = person[1:].strip() if person.startswith('@') else person.strip()
-                        self.logger.debug(f"  清理後的人員名稱: {person_clean}")
-                        self.logger.debug(f"  檢查 {person_clean} 是否在 name_to_row_idx 中: {person_clean in name_to_row_idx}")
-                        self.logger.debug(f"  檢查 @{person_clean} 是否在 name_to_row_idx 中: {f'@{person_clean}' in name_to_row_idx}")
-                        
-                        # 找到此人的行
-                        row_found = False
-                        if person_clean in name_to_row_idx:
-                            row_idx = name_to_row_idx[person_clean]
-                            row_found = True
-                            self.logger.debug(f"  >>> 找到人員 {person_clean} 在第 {row_idx} 行")
-                            
-                            # 填入配對者
-                            for i, partner in enumerate(partners):
-                                if i < len(new_columns):  # 確保不會超出新增的列數
-                                    col_idx = name_col_idx + 1 + i
-                                    self.logger.debug(f"  >>> 寫入Excel配對者欄位: {partner} -> 第{row_idx}行第{col_idx}列")
-                                    people_sheet.cell(row=row_idx, column=col_idx).value = partner
-                                else:
-                                    self.logger.warning(f"  >>> 警告: 配對者 {partner} 超出可用欄位數量")
-                        elif f"@{person_clean}" in name_to_row_idx:
-                            row_idx = name_to_row_idx[f"@{person_clean}"]
-                            row_found = True
-                            self.logger.debug(f"  >>> 找到人員 @{person_clean} 在第 {row_idx} 行")
-                            
-                            # 填入配對者
-                            for i, partner in enumerate(partners):
-                                if i < len(new_columns):  # 確保不會超出新增的列數
-                                    col_idx = name_col_idx + 1 + i
-                                    self.logger.debug(f"  >>> 寫入Excel配對者欄位: {partner} -> 第{row_idx}行第{col_idx}列")
-                                    people_sheet.cell(row=row_idx, column=col_idx).value = partner
-                                else:
-                                    self.logger.warning(f"  >>> 警告: 配對者 {partner} 超出可用欄位數量")
-                        
-                        if not row_found:
-                            self.logger.warning(f"  >>> 警告: 在name_to_row_idx中找不到人員 {person_clean} 或 @{person_clean}")
-                            self.logger.debug(f"  >>> 此人員將在第二階段作為新人員處理")
-                    
-                    # 添加新人員（不在現有名單中的人）
-                    # 只收集本次真正參與配對的人員（從matches參數中獲取，而不是從配對者中獲取）
-                    self.logger.info(f"=== 開始收集本次參與配對的人員 ===")
-                    self.logger.debug(f"原始matches參數: {matches}")
-                    
-                    # 從matches中收集所有參與配對的人員
-                    participating_people = set()
-                    for match in matches:
-                        for person in match:
-                            if isinstance(person, str):
-                                person_clean = person[1:].strip() if person.startswith('@') else person.strip()
-                                self.logger.debug(f"從matches添加參與配對人員: {person} -> 清理後: {person_clean}")
-                                participating_people.add(person_clean)
-                    
-                    self.logger.info(f"本次參與配對的人員: {participating_people}")
-                    
-                    # 只處理真正參與配對的人員，不處理配對者中可能出現的歷史人員
-                    all_people = participating_people
+    for root in range(n):
+        if active[root] and mate[root] == -1:
+            augment_from(root)
+    return mate
 
-                    # 然後檢查每個人是否已在名單中，如果不在則添加
-                    self.logger.info("=== 開始檢查並添加新人員到Excel ===")
-                    self.logger.debug(f"需要處理的人員: {all_people}")
-                    self.logger.debug(f"現有name_to_row_idx: {name_to_row_idx}")
-                    
-                    for person_clean in all_people:
-                        person_with_at = f"@{person_clean}"
-                        
-                        # 檢查此人是否在現有名單中
-                        is_new_person = person_clean not in name_to_row_idx and person_with_at not in name_to_row_idx
-                        self.logger.debug(f"\n處理人員: {person_clean}")
-                        self.logger.debug(f"  - person_clean在name_to_row_idx中: {person_clean in name_to_row_idx}")
-                        self.logger.debug(f"  - person_with_at在name_to_row_idx中: {person_with_at in name_to_row_idx}")
-                        self.logger.debug(f"  - 是否為新人員: {is_new_person}")
-                        
-                        if is_new_person:
-                            self.logger.info(f"  >>> 開始添加新人員: {person_clean}")
-                            
-                            # 找到實際的最後一行（有數據的）
-                            actual_last_row = 1  # 從標題行開始
-                            for row in range(1, people_sheet.max_row + 1):
-                                if people_sheet.cell(row=row, column=name_col_idx).value:
-                                    actual_last_row = row
-                            
-                            # 新增此人到實際的最後一行之後
-                            row_idx = actual_last_row + 1
-                            self.logger.debug(f"  >>> 寫入Excel姓名欄位: {person_with_at} -> 第{row_idx}行第{name_col_idx}列")
-                            people_sheet.cell(row=row_idx, column=name_col_idx).value = person_with_at
-                            
-                            # 添加配對者（如果此人在match_dict中有配對者）
-                            self.logger.debug(f"  >>> 檢查配對者: person_clean={person_clean}, person_with_at={person_with_at}")
-                            self.logger.debug(f"  >>> match_dict中的鍵: {list(match_dict.keys())}")
-                            
-                            partners_found = False
-                            if person_clean in match_dict:
-                                partners = match_dict[person_clean]
-                                self.logger.debug(f"  >>> 找到配對者(使用person_clean): {partners}")
-                                partners_found = True
-                                for i, partner in enumerate(partners):
-                                    if i < len(new_columns):
-                                        col_idx = name_col_idx + 1 + i
-                                        self.logger.debug(f"  >>> 寫入Excel配對者欄位: {partner} -> 第{row_idx}行第{col_idx}列")
-                                        people_sheet.cell(row=row_idx, column=col_idx).value = partner
-                            elif person_with_at in match_dict:
-                                partners = match_dict[person_with_at]
-                                self.logger.debug(f"  >>> 找到配對者(使用person_with_at): {partners}")
-                                partners_found = True
-                                for i, partner in enumerate(partners):
-                                    if i < len(new_columns):
-                                        col_idx = name_col_idx + 1 + i
-                                        self.logger.debug(f"  >>> 寫入Excel配對者欄位: {partner} -> 第{row_idx}行第{col_idx}列")
-                                        people_sheet.cell(row=row_idx, column=col_idx).value = partner
-                            
-                            if not partners_found:
-                                self.logger.warning(f"  >>> 警告: 在match_dict中找不到 {person_clean} 或 {person_with_at} 的配對者")
-                            
-                            # 更新映射字典
-                            name_to_row_idx[person_clean] = row_idx
-                            name_to_row_idx[person_with_at] = row_idx
-                            self.logger.debug(f"  >>> 更新映射字典: {person_clean} 和 {person_with_at} -> 第{row_idx}行")
-                        else:
-                            self.logger.debug(f"  >>> 跳過已存在的人員: {person_clean}")
+# 奇數人數時，最多嘗試多少個三人組來驗證是否存在無重複方案
+FEASIBILITY_TRIO_LIMIT = 200
+
+def check_zero_repeat_feasibility(met: List[int], trio_limit: int = FEASIBILITY_TRIO_LIMIT):
+    """
+    以最大匹配快速判斷是否存在無重複配對的方案
+    - 偶數人數：從未配對過的人員圖是否有完美匹配
+    - 奇數人數：是否有一個有效的三人組，且其餘人員有完美匹配
+    返回: (feasible, lower_bound, groups)
+      feasible 為 True / False，嘗試的三人組超過上限仍無法判斷時為 None
+      lower_bound 為無法避免的重複配對數下限
+      groups 為 feasible 時找到的無重複分組（人員索引）
+    """
+    n = len(met)
+    allowed = allowed_masks(met)
+    mate = max_cardinality_matching(allowed)
+    matched = sum(1 for v in range(n) if mate[v] > v)
+    
+    # 每個無重複的組最多貢獻一條匹配邊，因此至少有 n//2 - 匹配數 組重複
+    lower_bound = max(0, n // 2 - matched)
+    
+    def pairs_from(mate_array: List[int], excluded: int = 0) -> List[Tuple[int, ...]]:
+        return [(v, mate_array[v]) for v in range(n) if mate_array[v] > v and not (excluded >> v) & 1]
+    
+    if n % 2 == 0:
+        if matched == n // 2:
+            return True, 0, pairs_from(mate)
+        return False, lower_bound, None
+    
+    if matched < (n - 1) // 2:
+        return False, lower_bound, None
+    
+    # 最大匹配只留下一人：若此人與某一組的兩人都未見過，直接組成三人組
+    leftover = next(v for v in range(n) if mate[v] == -1)
+    for a in iter_bits(allowed[leftover]):
+        b = mate[a]
+        if b != -1 and (allowed[leftover] >> b) & 1:
+            groups = [pair for pair in pairs_from(mate) if a not in pair]
+            groups.append((leftover, a, b))
+            return True, 0, groups
+    
+    # 否則逐一嘗試圖中的三角形，檢查其餘人員是否有完美匹配
+    tried = 0
+    for a in range(n):
+        for b in iter_bits(allowed[a] >> (a + 1) << (a + 1)):
+            for c in iter_bits(allowed[a] & allowed[b] >> (b + 1) << (b + 1)):
+                tried += 1
+                if tried > trio_limit:
+                    return None, lower_bound, None
+                trio_mask = (1 << a) | (1 << b) | (1 << c)
+                rest_mate = max_cardinality_matching(allowed, excluded=trio_mask)
+                if sum(1 for v in range(n) if rest_mate[v] > v) == (n - 3) // 2:
+                    groups = pairs_from(rest_mate, trio_mask)
+                    groups.append((a, b, c))
+                    return True, 0, groups
+    
+    # 沒有任何可行的三人組：至少有一組重複
+    return False, max(lower_bound, 1), None
+
+def residual_matchability(allowed: List[int], degrees: List[int],
+                          groups: List[Tuple[int, ...]]) -> Tuple[int, int, int]:
+    """
+    估計採用 groups 之後，剩餘的從未配對圖在下一輪的可配對程度，返回值越小越好
+    - 剩餘圖由 allowed 移除本輪的邊得到，度數由 degrees 扣除同組人數；
+      下一輪下限需要對剩餘圖重新求一次最大匹配（花演算法，O(V^3)），並非增量計算
+    - 兩兩配對使每個人的度數都恰好減一，度數只區分三人組的位置；
+      主要指標是剩餘圖的最大匹配推得的下一輪重複組數下限
+    返回: (下一輪重複組數下限, -最小剩餘度數, 剩餘度數不超過 1 的人數)
+    """
+    n = len(allowed)
+    residual = list(allowed)
+    residual_degrees = list(degrees)
+    for group in groups:
+        for a, b in combinations(group, 2):
+            if (residual[a] >> b) & 1:
+                residual[a] &= ~(1 << b)
+                residual[b] &= ~(1 << a)
+                residual_degrees[a] -= 1
+                residual_degrees[b] -= 1
+    mate = max_cardinality_matching(residual)
+    matched = sum(1 for v in range(n) if mate[v] > v)
+    next_lower_bound = max(0, n // 2 - matched)
+    return (next_lower_bound, -min(residual_degrees, default=0),
+            sum(1 for degree in residual_degrees if degree <= 1))
+
+def choose_lookahead_groups(met: List[int], groups: List[Tuple[int, ...]], rng: random.Random = None,
+                            candidates: int = LOOKAHEAD_CANDIDATES, deadline: float = None,
+                            metrics: 'MatchingMetrics' = None) -> Tuple[List[Tuple[int, ...]], Tuple[int, int, int]]:
+    """
+    在多個無重複方案中，選擇讓剩餘的從未配對圖最容易在下一輪繼續無重複配對的方案
+    - 候選方案以隨機重新編號後的最大匹配產生（最大匹配的結果取決於人員順序）
+    - 每個候選需要一次可行性檢查與一次剩餘圖的最大匹配，共約 2 × candidates 次花演算法，
+      達到理想評分或超出時間預算時提早結束
+    - groups 為已找到的無重複方案，作為第一個候選
+    返回: (分組, residual_matchability 的評分)
+    """
+    n = len(met)
+    rng = rng if rng is not None else random.Random()
+    allowed = allowed_masks(met)
+    degrees = [bin(mask).count('1') for mask in allowed]
+    
+    # 所有人都只扣一度、且下一輪仍可無重複時已是最佳評分，不必再產生候選
+    ideal = (0, 1 - min(degrees, default=1), sum(1 for degree in degrees if degree <= 2))
+    best_score, best_groups = residual_matchability(allowed, degrees, groups), groups
+    scored = 1
+    for _ in range(candidates - 1):
+        if best_score <= ideal or (deadline is not None and time.perf_counter() >= deadline):
+            break
+        order = list(range(n))
+        rng.shuffle(order)
+        position = [0] * n
+        for new, old in enumerate(order):
+            position[old] = new
+        permuted = [0] * n
+        for new, old in enumerate(order):
+            for other in iter_bits(met[old]):
+                permuted[new] |= 1 << position[other]
+        feasible, _, permuted_groups = check_zero_repeat_feasibility(permuted)
+        if not feasible:
+            continue
+        candidate = [tuple(order[v] for v in group) for group in permuted_groups]
+        score = residual_matchability(allowed, degrees, candidate)
+        scored += 1
+        if score < best_score:
+            best_score, best_groups = score, candidate
+    
+    if metrics is not None:
+        metrics.increment('lookahead_candidates', scored)
+    return best_groups, best_score
+
+def backtrack_min_repeats(met: List[int], order: List[int], best_cost: float = float('inf'),
+                          deadline: float = None, stop_at: int = 0,
+                          weights: List[List[int]] = None,
+                          mrv: bool = True) -> Tuple[float, List[Tuple[int, ...]], int, bool]:
+    """
+    迭代式分支定界回溯，搜尋重複配對數最少的分組（人數為奇數時恰好一個三人組）
+    - order 為人員索引的初始排列，決定搜尋順序
+    - mrv 為 True 時每層先分組剩餘人員中未見過的人最少者（最受限制者優先），及早剪掉無解的分支；
+      否則依 order 由後往前
+    - 只接受代價小於 best_cost 的方案；best_cost=1 即為只找無重複方案
+    - 找到代價不超過 stop_at（例如已知的下限）的方案時立即結束
+    - weights 為加權代價矩陣，未指定時每組重複計 1
+    - 剩餘人員保存在 arr[:size]，以交換方式就地移除，每層的選擇記錄在預先配置的陣列中，
+      回溯時依記錄還原，搜尋過程不建立中間列表，也不受遞迴深度限制
+    返回: (最佳代價, 以人員索引表示的分組, 搜尋節點數, 是否完成搜尋)；找不到時分組為 None
+    """
+    n = len(order)
+    if n < 2:
+        return best_cost, None, 0, True
+    
+    cost_of = weights if weights is not None else met_weights(met)
+    allowed = allowed_masks(met)
+    arr = list(order)
+    levels = n // 2
+    pivots = [0] * levels
+    firsts = [0] * levels
+    partners = [0] * levels
+    thirds = [-1] * levels
+    choices = [0] * levels
+    seconds = [0] * levels
+    edge_costs = [0] * levels
+    
+    best_groups = None
+    nodes = 0
+    size = n
+    depth = 0
+    cost = 0
+    
+    while True:
+        # 進入新節點
+        nodes += 1
+        if nodes & 1023 == 0 and deadline is not None and time.perf_counter() >= deadline:
+            return best_cost, best_groups, nodes, False
+        
+        if size <= 3:
+            # 葉節點：剩下的兩人或三人組成最後一組
+            if size == 3:
+                a, b, c = arr[0], arr[1], arr[2]
+                leaf_cost = cost_of[a][b] + cost_of[a][c] + cost_of[b][c]
+            else:
+                leaf_cost = cost_of[arr[0]][arr[1]]
+            if cost + leaf_cost < best_cost:
+                best_cost = cost + leaf_cost
+                best_groups = [
+                    (firsts[d], partners[d]) if thirds[d] < 0 else (firsts[d], partners[d], thirds[d])
+                    for d in range(depth)
+                ]
+                best_groups.append(tuple(arr[:size]))
+                if best_cost <= stop_at:
+                    return best_cost, best_groups, nodes, True
+        else:
+            # 取出本層要分組的人：MRV 時先把剩餘人員中未見過的人最少者換到最後一位
+            if mrv:
+                remaining = 0
+                for p in range(size):
+                    remaining |= 1 << arr[p]
+                pivot = min(range(size), key=lambda p: bin(allowed[arr[p]] & remaining).count('1'))
+                arr[pivot], arr[size - 1] = arr[size - 1], arr[pivot]
+                pivots[depth] = pivot
+            size -= 1
+            firsts[depth] = arr[size]
+            choices[depth] = -1
+            seconds[depth] = -1
+            depth += 1
+        
+        # 在最深的一層嘗試下一個選擇，選擇用盡時還原並回到上一層
+        # 每層的選擇依序為 (i, -1)：與 arr[i] 配對，或 (i, k)：與 arr[i] 及移除後的 arr[k] 組成三人組
+        while depth > 0:
+            d = depth - 1
+            i = choices[d]
+            k = seconds[d]
+            if i >= 0:
+                cost -= edge_costs[d]
+                if k >= 0:
+                    size += 1
+                    arr[k], arr[size - 1] = arr[size - 1], arr[k]
+                size += 1
+                arr[i], arr[size - 1] = arr[size - 1], arr[i]
+            
+            first = firsts[d]
+            row = cost_of[first]
+            budget = best_cost - cost
+            # 本層人數為奇數且至少 5 人時，三人組可以在此層組成（之後只剩兩人組）
+            trio_allowed = size % 2 == 0 and size >= 4
+            
+            chosen = False
+            while True:
+                if i >= 0 and trio_allowed and (k + 1 if k >= 0 else i) <= size - 2:
+                    # 同一個 i 的下一個三人組：移除 arr[i] 後位置 i 由原本最後一位補上
+                    k = k + 1 if k >= 0 else i
+                    partner = arr[i]
+                    third = arr[size - 1] if k == i else arr[k]
+                    edge = row[partner] + row[third] + cost_of[partner][third]
+                    if edge >= budget:
+                        continue
+                    size -= 1
+                    arr[i], arr[size] = arr[size], arr[i]
+                    size -= 1
+                    arr[k], arr[size] = arr[size], arr[k]
+                    partners[d] = partner
+                    thirds[d] = third
                 else:
-                    # 如果工作表不存在，則創建新的
-                    people_sheet = workbook.create_sheet('人員名單')
-                    
-                    # 初始化欄位名稱
-                    people_sheet.cell(row=1, column=1).value = '姓名'
-                    for i, col_name in enumerate(new_columns):
-                        people_sheet.cell(row=1, column=2 + i).value = col_name
-                    
-                    # 填入所有人員和配對結果
-                    row_idx = 2
-                    for person in people_list:
-                        people_sheet.cell(row=row_idx, column=1).value = f"@{person}"
-                        
-                        if person in match_dict:
-                            for i, partner in enumerate(match_dict[person]):
-                                if i < len(new_columns):
-                                    people_sheet.cell(row=row_idx, column=2 + i).value = partner
-                        
-                        row_idx += 1
-                
-                # 保存參與配對人員工作表
-                if '參與配對人員' in workbook.sheetnames:
-                    participants_sheet = workbook['參與配對人員']
-                    # 參與配對人員工作表保持不變
+                    i += 1
+                    k = -1
+                    while i < size and row[arr[i]] >= budget:
+                        i += 1
+                    if i >= size:
+                        break
+                    edge = row[arr[i]]
+                    size -= 1
+                    arr[i], arr[size] = arr[size], arr[i]
+                    partners[d] = arr[size]
+                    thirds[d] = -1
+                choices[d] = i
+                seconds[d] = k
+                edge_costs[d] = edge
+                cost += edge
+                chosen = True
+                break
+            if chosen:
+                break
+            
+            # 此層的選擇已用盡：放回本層的人並還原 MRV 的交換，回到上一層
+            size += 1
+            depth -= 1
+            if mrv:
+                pivot = pivots[depth]
+                arr[pivot], arr[size - 1] = arr[size - 1], arr[pivot]
+        else:
+            return best_cost, best_groups, nodes, True
+
+def groupings_from_permutation(order: List[int]) -> List[Tuple[int, ...]]:
+    """依排列順序兩兩分組，人數為奇數時最後三人組成三人組"""
+    n = len(order)
+    pair_end = n - 3 if n % 2 == 1 else n
+    groups = [(order[i], order[i + 1]) for i in range(0, pair_end, 2)]
+    if n % 2 == 1 and n >= 3:
+        groups.append(tuple(order[pair_end:]))
+    return groups
+
+def score_groupings(weight_array: 'np.ndarray', permutations: 'np.ndarray') -> 'np.ndarray':
+    """以矩陣運算一次計算多個排列（每列一個）依 groupings_from_permutation 分組的加權代價"""
+    n = permutations.shape[1]
+    pair_end = n - 3 if n % 2 == 1 else n
+    firsts = permutations[:, 0:pair_end:2]
+    seconds = permutations[:, 1:pair_end:2]
+    scores = weight_array[firsts, seconds].sum(axis=1)
+    if n % 2 == 1 and n >= 3:
+        a, b, c = permutations[:, -3], permutations[:, -2], permutations[:, -1]
+        scores += weight_array[a, b] + weight_array[a, c] + weight_array[b, c]
+    return scores
+
+def solve_fairness_bounds(met: List[int], counts: List[List[int]], person_repeats: List[int]):
+    """
+    公平性（最小化最大值）門檻
+    - 先決定本輪之後每位參與者累計重複輪數的上限 T：累計已達 T 的人只能與未見過的人同組，
+      因此 T 只可能是目前最大值或再加一
+    - 在 T 之下以二分搜尋找出最小的見面次數上限 L：見面次數超過 L 的兩人不得同組
+    - 每個門檻都以最大匹配檢查是否存在避開所有禁止配對的分組（無法判斷時視為不可行）
+    返回: (T, L, 禁止配對的位元遮罩, 滿足門檻的分組)
+    """
+    n = len(met)
+    top = max(person_repeats, default=0)
+    
+    def blocked_masks(person_level: int, pair_level: int) -> List[int]:
+        protected = 0
+        for i in range(n):
+            if person_repeats[i] >= person_level:
+                protected |= 1 << i
+        masks = []
+        for i in range(n):
+            mask = 0
+            row = counts[i]
+            for j in iter_bits(met[i]):
+                if (protected >> i) & 1 or (protected >> j) & 1 or row[j] > pair_level:
+                    mask |= 1 << j
+            masks.append(mask)
+        return masks
+    
+    def feasible(person_level: int, pair_level: int):
+        masks = blocked_masks(person_level, pair_level)
+        ok, _, groups = check_zero_repeat_feasibility(masks)
+        return masks, groups if ok else None
+    
+    levels = sorted({counts[i][j] for i in range(n) for j in iter_bits(met[i])} | {0})
+    for person_level in (top, top + 1):
+        masks, groups = feasible(person_level, levels[-1])
+        if groups is None:
+            continue
+        # 可行性隨 L 單調，二分搜尋最小的可行 L
+        low, high = 0, len(levels) - 1
+        while low < high:
+            middle = (low + high) // 2
+            middle_masks, middle_groups = feasible(person_level, levels[middle])
+            if middle_groups is not None:
+                high = middle
+                masks, groups = middle_masks, middle_groups
+            else:
+                low = middle + 1
+        return person_level, levels[low], masks, groups
+    raise Exception("無法完成配對，請管理員手動調整")
+
+def solve_min_repeat_dp(met: List[int], rng: random.Random = None, deadline: float = None,
+                        max_states: int = DP_MAX_STATES, metrics: 'MatchingMetrics' = None,
+                        weights: List[List[int]] = None) -> Tuple[int, List[Tuple[int, ...]]]:
+    """
+    以位元遮罩動態規劃求出重複配對數最少的分組（精確解）
+    - 狀態為尚未分組人員的位元遮罩，每次固定最低位的人員，與其他人配對
+    - 人數為奇數時恰好組成一個三人組：剩餘人數為奇數即代表三人組尚未使用
+    - 子問題得到 0 時提早結束該層搜尋；時間複雜度 O(2^n · n)
+    - weights 為加權代價矩陣（見 PairHistoryIndex.weight_matrix），未指定時每組重複計 1
+    返回: (最少代價, 以人員索引表示的分組列表)
+    """
+    n = len(met)
+    cost_of = weights if weights is not None else met_weights(met)
+    memo = {0: (0, None)}
+    
+    def bits(mask: int):
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+    
+    def best(mask: int) -> int:
+        cached = memo.get(mask)
+        if cached is not None:
+            return cached[0]
+        
+        if deadline is not None and time.perf_counter() >= deadline:
+            raise SearchTimeout()
+        if len(memo) >= max_states:
+            raise SolverStateLimit(f"動態規劃狀態數超過上限 {max_states}")
+        
+        low = mask & -mask
+        i = low.bit_length() - 1
+        rest = mask ^ low
+        remaining = bin(mask).count('1')
+        
+        # 代價低（未見過）的人優先，讓 0 成本的解盡早出現以便提早結束
+        row = cost_of[i]
+        candidates = list(bits(rest))
+        if rng is not None:
+            rng.shuffle(candidates)
+        candidates.sort(key=row.__getitem__)
+        
+        best_cost = float('inf')
+        best_group = None
+        
+        if remaining % 2 == 0:
+            for j in candidates:
+                cost = row[j] + best(rest ^ (1 << j))
+                if cost < best_cost:
+                    best_cost, best_group = cost, (i, j)
+                    if cost == 0:
+                        break
+        elif remaining == 3 or remaining >= 5:
+            # 剩餘人數為奇數：最低位的人員組成三人組（剩餘 3 人時只能如此）
+            for a_idx, j in enumerate(candidates):
+                if best_cost == 0:
+                    break
+                for k in candidates[a_idx + 1:]:
+                    cost = row[j] + row[k] + cost_of[j][k] + best(rest ^ (1 << j) ^ (1 << k))
+                    if cost < best_cost:
+                        best_cost, best_group = cost, (i, j, k)
+                        if cost == 0:
+                            break
+            # 三人組也可以留給後面的人，此時最低位的人員先兩兩配對
+            if best_cost > 0 and remaining >= 5:
+                for j in candidates:
+                    cost = row[j] + best(rest ^ (1 << j))
+                    if cost < best_cost:
+                        best_cost, best_group = cost, (i, j)
+                        if cost == 0:
+                            break
+        
+        memo[mask] = (best_cost, best_group)
+        return best_cost
+    
+    full = (1 << n) - 1
+    total = best(full)
+    if total == float('inf'):
+        raise Exception("無法完成配對，請管理員手動調整")
+    
+    if metrics is not None:
+        metrics.increment('dp_states', len(memo))
+    
+    # 依記錄的選擇重建分組
+    groups = []
+    mask = full
+    while mask:
+        group = memo[mask][1]
+        groups.append(group)
+        for person in group:
+            mask ^= 1 << person
+    return total, groups
+
+def split_components(allowed: List[int]) -> List[List[int]]:
+    """以廣度優先搜尋找出允許配對圖的連通分量，每個分量為人員索引列表"""
+    unvisited = (1 << len(allowed)) - 1
+    components = []
+    while unvisited:
+        start = (unvisited & -unvisited).bit_length() - 1
+        component = 1 << start
+        frontier = component
+        while frontier:
+            reach = 0
+            for v in iter_bits(frontier):
+                reach |= allowed[v]
+            frontier = reach & ~component
+            component |= frontier
+        unvisited &= ~component
+        components.append(list(iter_bits(component)))
+    return components
+
+def estimate_dp_states(components: List[List[int]]) -> int:
+    """依成本模型預估各連通分量動態規劃狀態數的總和（上包絡，見 DP_COST_*；小分量至少每人一個狀態）"""
+    return sum(
+        int(DP_COST_REFERENCE_STATES * DP_COST_GROWTH ** (len(component) - DP_COST_REFERENCE_PEOPLE)) + len(component)
+        for component in components
+    )
+
+def choose_solver(strategy: str, feasible: bool, people: int, largest_component: int,
+                  dp_states: int, time_left: float = None) -> Tuple[str, str]:
+    """
+    依成本模型選擇兩人一組的求解器，返回 (求解器, 選擇原因)
+    - 'blossom'：最大匹配已找到無重複方案，直接採用
+    - 'backtrack'：以 MRV 順序的分支定界回溯搜尋；可行性無法判斷時先用來搜尋無重複方案，或指定 'exhaustive'
+    - 'dp'：預估狀態數不超過 DP_MAX_STATES，且預估耗時在剩餘時間預算的 DP_BUDGET_SHARE 之內
+      （沒有時間預算時不超過 DP_UNBOUNDED_MAX_SECONDS）
+    - 'local'：其餘情況使用局部搜尋
+    - 'heuristic'：隨機排列的啟發式方法，只在指定時使用
+    """
+    if feasible:
+        return 'blossom', "最大匹配已找到無重複的方案"
+    if feasible is None:
+        return 'backtrack', f"可行性檢查無法判斷（{people} 人），以 MRV 回溯完整搜尋無重複方案"
+    if strategy == 'exhaustive':
+        return 'backtrack', "指定窮舉策略"
+    if strategy in ('dp', 'heuristic', 'local'):
+        return strategy, f"指定 {strategy} 策略"
+
+    dp_seconds = dp_states * DP_SECONDS_PER_STATE
+    if dp_states > DP_MAX_STATES:
+        return 'local', f"最大分量 {largest_component} 人，動態規劃預估 {dp_states} 個狀態超過上限 {DP_MAX_STATES}"
+    if time_left is not None and dp_seconds > time_left * DP_BUDGET_SHARE:
+        return 'local', (f"動態規劃預估 {dp_seconds:.2f} 秒，超過剩餘時間預算 {time_left:.2f} 秒的 "
+                         f"{DP_BUDGET_SHARE:.0%}")
+    if time_left is None and dp_seconds > DP_UNBOUNDED_MAX_SECONDS:
+        return 'local', f"動態規劃預估 {dp_seconds:.2f} 秒，超過未指定時間預算時的上限 {DP_UNBOUNDED_MAX_SECONDS} 秒"
+    return 'dp', f"最大分量 {largest_component} 人，動態規劃預估 {dp_states} 個狀態、約 {dp_seconds:.2f} 秒"
+
+def solve_component_job(met: List[int], seed: int, deadline: float, max_states: int,
+                        weights: List[List[int]] = None) -> Tuple[int, List[Tuple[int, ...]], int]:
+    """求解單一連通分量（可在工作進程中執行），返回 (代價, 分組, 動態規劃狀態數)"""
+    metrics = MatchingMetrics(trace_memory=False)
+    cost, groups = solve_min_repeat_dp(met, rng=random.Random(seed), deadline=deadline,
+                                       max_states=max_states, metrics=metrics, weights=weights)
+    return cost, groups, metrics.counters.get('dp_states', 0)
+
+def solve_components_dp(met: List[int], components: List[List[int]], rng: random.Random = None,
+                        deadline: float = None, max_states: int = DP_MAX_STATES,
+                        metrics: 'MatchingMetrics' = None,
+                        weights: List[List[int]] = None) -> Tuple[int, List[Tuple[int, ...]]]:
+    """
+    把允許配對圖拆成連通分量後分別以動態規劃求解，再合併結果
+    - 跨分量的兩人必定曾經配對，因此各分量內部獨立求解
+    - 奇數人數的分量加入一個與所有人都未見過的虛擬人員，與其配對者成為剩餘人員
+    - 總人數為奇數時，比較由各分量或剩餘人員組成三人組的總代價，取最少者
+    - 剩餘人員之間依代價由低到高兩兩配對（必定重複）
+    - 重複組數與整體求解相同；使用加權代價時，留下哪一人只依分量內部的代價決定，
+      加權的次要部分可能略高於整體最佳解
+    返回: (代價, 以人員索引表示的分組列表)
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    
+    rng = rng if rng is not None else random.Random()
+    cost_of = weights if weights is not None else met_weights(met)
+    
+    def sub_problem(component: List[int], dummy: str = None) -> Tuple[List[int], List[List[int]]]:
+        """
+        取出分量內部的位元遮罩與代價矩陣，dummy 指定是否加入虛擬人員
+        - 'free'：與所有人都未見過，與其配對者成為剩餘人員
+        - 'met'：與所有人都見過，避免虛擬人員被放進三人組
+        """
+        position = {person: idx for idx, person in enumerate(component)}
+        dummy_bit = 1 << len(component) if dummy == 'met' else 0
+        dummy_weight = REPEAT_BASE_WEIGHT if dummy == 'met' else 0
+        sub = []
+        sub_weights = []
+        for person in component:
+            mask = dummy_bit
+            for other in iter_bits(met[person]):
+                if other in position:
+                    mask |= 1 << position[other]
+            sub.append(mask)
+            row = [cost_of[person][other] for other in component]
+            if dummy:
+                row.append(dummy_weight)
+            sub_weights.append(row)
+        if dummy:
+            sub.append(dummy_bit - 1 if dummy == 'met' else 0)
+            sub_weights.append([dummy_weight] * len(component) + [0])
+        return sub, sub_weights
+    
+    # 偶數分量直接求解；奇數分量求「留下一人」的版本
+    # 總人數為奇數時另求「含三人組」的版本：奇數分量不加虛擬人員，偶數分量加入虛擬人員後會留下一人
+    odd_total = sum(len(component) for component in components) % 2 == 1
+    jobs = []
+    for index, component in enumerate(components):
+        is_odd = len(component) % 2 == 1
+        jobs.append((index, 'pair', sub_problem(component, dummy='free' if is_odd else None)))
+        if odd_total and len(component) >= (3 if is_odd else 4):
+            jobs.append((index, 'trio', sub_problem(component, dummy=None if is_odd else 'met')))
+    seeds = [rng.getrandbits(32) for _ in jobs]
+    
+    large_jobs = sum(1 for _, _, (sub, _) in jobs if len(sub) >= COMPONENT_PARALLEL_MIN_PEOPLE)
+    results = {}
+    if large_jobs >= 2:
+        workers = min(large_jobs, os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                (index, kind): executor.submit(solve_component_job, sub, seed, deadline, max_states, sub_weights)
+                for (index, kind, (sub, sub_weights)), seed in zip(jobs, seeds)
+            }
+            for key, future in futures.items():
+                results[key] = future.result()
+    else:
+        for (index, kind, (sub, sub_weights)), seed in zip(jobs, seeds):
+            results[(index, kind)] = solve_component_job(sub, seed, deadline, max_states, sub_weights)
+    
+    if metrics is not None:
+        metrics.increment('dp_states', sum(states for _, _, states in results.values()))
+        metrics.increment('components_solved', len(components))
+    
+    def group_cost(group: Tuple[int, ...]) -> int:
+        return sum(cost_of[a][b] for a, b in combinations(group, 2))
+    
+    def pair_leftovers(leftovers: List[int]) -> List[Tuple[int, ...]]:
+        """剩餘人員分屬不同分量，依代價由低到高兩兩配對，人數為奇數時最後三人組成三人組"""
+        remaining = list(leftovers)
+        groups = []
+        while len(remaining) > 3:
+            a, b = min(combinations(remaining, 2), key=lambda pair: cost_of[pair[0]][pair[1]])
+            remaining.remove(a)
+            remaining.remove(b)
+            groups.append((a, b))
+        if remaining:
+            groups.append(tuple(remaining))
+        return groups
+    
+    def assemble(trio_component: int) -> Tuple[int, List[Tuple[int, ...]]]:
+        """以指定分量容納三人組（None 表示不指定），合併各分量的結果"""
+        groups = []
+        leftovers = []
+        for index, component in enumerate(components):
+            kind = 'trio' if index == trio_component else 'pair'
+            _, sub_groups, _ = results[(index, kind)]
+            for group in sub_groups:
+                members = [component[idx] for idx in group if idx < len(component)]
+                if len(members) == 1:
+                    # 與虛擬人員配對者留到最後處理
+                    leftovers.append(members[0])
                 else:
-                    # 如果不存在，則創建新的
-                    participants_sheet = workbook.create_sheet('參與配對人員')
-                    participants_sheet.cell(row=1, column=1).value = '姓名'
-                
-                # 保存工作簿
-                workbook.save(self.excel_path)
-                
-                # 標記重複配對
-                if repeated_pairs:
-                    # 再次打開檔案來設定樣式
-                    workbook = openpyxl.load_workbook(self.excel_path)
-                    people_sheet = workbook['人員名單']
-                    
-                    # 找到姓名列和新配對欄位的索引
-                    name_col_idx = None
-                    new_col_indices = []
-                    
-                    for col_idx, cell in enumerate(people_sheet[1], 1):
-                        if cell.value == '姓名':
-                            name_col_idx = col_idx
-                        elif cell.value in new_columns:
-                            new_col_indices.append(col_idx)
-                    
-                    if name_col_idx is None:
-                        name_col_idx = 1
-                    
-                    # 設定重複配對的樣式
-                    yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-                    red_font = Font(color="FF0000", bold=True)
-                    
-                    self.logger.info(f"將檢查以下新配對欄位中的重複配對: {new_columns}")
-                    self.logger.debug(f"新配對欄位索引: {new_col_indices}")
-                    
-                    # 遍歷每一行
-                    for row_idx in range(2, people_sheet.max_row + 1):
-                        person = people_sheet.cell(row=row_idx, column=name_col_idx).value
-                        if not person:
-                            continue
-                        
-                        # 移除 @ 前綴進行比較
-                        if isinstance(person, str) and person.startswith('@'):
-                            person_clean = person[1:]
-                        else:
-                            person_clean = person
-                        
-                        # 遍歷新配對欄位
-                        for col_idx in new_col_indices:
-                            partner = people_sheet.cell(row=row_idx, column=col_idx).value
-                            if not partner:
-                                continue
-                            
-                            # 移除 @ 前綴進行比較
-                            partner_norm = partner
-                            if isinstance(partner, str):
-                                if partner.startswith('@'):
-                                    partner_norm = partner[1:].strip()
-                                else:
-                                    partner_norm = partner.strip()
-                            else:
-                                partner_norm = str(partner).strip()
-                            
-                            # 獲取不帶 @ 且去除空格的人名
-                            person_norm = person_clean.strip() if isinstance(person_clean, str) else str(person_clean).strip()
-                            partner_norm = partner_norm.strip()
-                            
-                            # 記錄調試信息
-                            self.logger.debug(f"檢查是否重複配對: {person_norm} - {partner_norm}")
-                            self.logger.debug(f"重複配對列表: {repeated_pairs}")
-                            
-                            # 檢查是否為重複配對
-                            for pair in repeated_pairs:
-                                pair_set = set(pair)  # 轉換為集合便於比較
-                                if person_norm in pair_set and partner_norm in pair_set:
-                                    # 這是重複配對，設定黃底紅字
-                                    cell = people_sheet.cell(row=row_idx, column=col_idx)
-                                    cell.fill = yellow_fill
-                                    cell.font = red_font
-                    
-                    # 保存工作簿
-                    workbook.save(self.excel_path)
+                    groups.append(tuple(members))
+        
+        options = []
+        if len(leftovers) != 1:
+            options.append(groups + pair_leftovers(leftovers))
+        # 剩餘人員為奇數時，也考慮讓其中一人加入增加代價最少的兩人組
+        if len(leftovers) % 2 == 1 and any(len(group) == 2 for group in groups):
+            _, person, position = min(
+                (group_cost(group + (person,)) - group_cost(group), person, idx)
+                for person in leftovers
+                for idx, group in enumerate(groups) if len(group) == 2
+            )
+            joined = list(groups)
+            joined[position] = joined[position] + (person,)
+            options.append(joined + pair_leftovers([other for other in leftovers if other != person]))
+        
+        # 虛擬人員的代價不計入，直接以最終分組計算實際的代價
+        return min(((sum(group_cost(group) for group in option), option) for option in options),
+                   key=lambda result: result[0])
+    
+    # 總人數為奇數時，逐一比較每個可容納三人組的分量，選擇總代價最少者
+    candidates = [None] + [index for index, kind in results if kind == 'trio']
+    return min((assemble(index) for index in candidates), key=lambda result: result[0])
 
-            except Exception as e:
-                self.logger.error(f"更新人員名單時出錯: {str(e)}")
-                # 如果讀取或處理現有資料失敗，就創建新的檔案（原有的邏輯）
-                
-                # 收集所有參與配對的人員（包括配對者和被配對者）
-                all_people = set()
-                for person, partners in match_dict.items():
-                    if isinstance(person, str):
-                        person_clean = person[1:].strip() if person.startswith('@') else person.strip()
-                        all_people.add(person_clean)
-                    
-                    # 添加所有配對者
-                    for partner in partners:
-                        if isinstance(partner, str):
-                            partner_clean = partner[1:].strip() if partner.startswith('@') else partner.strip()
-                            all_people.add(partner_clean)
-                
-                # 使用 all_people 替代原來的方法
-                people_list = sorted(list(all_people))
-                
-                # 創建 DataFrame
-                # 人名前加上 @
-                people_data = {'姓名': [f"@{person}" for person in people_list]}
-                
-                # 添加配對者欄位
-                for i in range(max_partners):
-                    if max_partners > 1:
-                        column_name = f"配對者 {today} {i+1}"
-                    else:
-                        column_name = f"配對者 {today}"
-                    
-                    # 將配對者添加到對應欄位
-                    partners_column = []
-                    for person in people_list:
-                        person_with_at = f"@{person}"
-                        found_partners = []
-                        
-                        # 檢查各種版本的名稱
-                        if person in match_dict and i < len(match_dict[person]):
-                            found_partners = match_dict[person][i]
-                        elif person_with_at in match_dict and i < len(match_dict[person_with_at]):
-                            found_partners = match_dict[person_with_at][i]
-                        
-                        partners_column.append(found_partners if found_partners else '')
-                    
-                    people_data[column_name] = partners_column
-                
-                people_df = pd.DataFrame(people_data)
-                
-                # 在寫入 Excel 前，保留原始參與配對人員
-                try:
-                    # 先嘗試讀取現有的參與配對人員
-                    existing_participants_df = pd.read_excel(self.excel_path, sheet_name='參與配對人員')
-                except:
-                    # 如果讀取失敗，則使用空的 DataFrame
-                    existing_participants_df = pd.DataFrame(columns=['姓名'])
+def group_sizes(n: int, k: int) -> List[int]:
+    """
+    把 n 人分組，各組人數盡量接近 k
+    - 比較分成 n // k 組（多出的人分到各組）與 n // k + 1 組（各組少一人）兩種方式，
+      取組別人數與 k 相差最少者，相同時取前者；每組至少兩人
+    - k=2 時即為兩人組加一個三人組
+    """
+    if n <= k:
+        return [n]
+    options = []
+    for count in (n // k, -(-n // k)):
+        sizes = [n // count + (1 if idx < n % count else 0) for idx in range(count)]
+        if min(sizes) >= 2:
+            options.append((max(abs(size - k) for size in sizes), sizes))
+    return min(options, key=lambda option: option[0])[1]
+
+def solve_k_groups(met: List[int], group_size: int, weights: List[List[int]] = None,
+                   units: List[List[int]] = None, rng: random.Random = None, deadline: float = None,
+                   restarts: int = GROUP_SEARCH_RESTARTS,
+                   metrics: 'MatchingMetrics' = None) -> Tuple[int, List[Tuple[int, ...]]]:
+    """
+    把人員分成 group_size 人一組（見 group_sizes），最小化組內配對的加權代價
+    - 每組維護成員位元的遮罩，一個人與組內是否有人見過只需 met[v] & 組遮罩，整組的檢查為 O(k)
+    - 貪婪建構：依見過的人數由多到少，放入代價增加最少且仍有空位的組
+    - 局部搜尋：與組內有人見過的人，嘗試與其他組的每個人交換，代價變化只涉及兩人與兩組成員（O(k)），
+      每次採用改善最多的交換，直到沒有改善為止
+    - units 為必須同組的人員（索引列表），整組放入同一組且不參與交換
+    - 多次隨機重啟，代價為 0 或超出時間預算時停止
+    返回: (加權代價, 以人員索引表示的分組列表)
+    """
+    n = len(met)
+    rng = rng if rng is not None else random.Random()
+    cost_of = weights if weights is not None else met_weights(met)
+    sizes = group_sizes(n, group_size)
+    degrees = [bin(mask).count('1') for mask in met]
+    
+    locked = {v for unit in units or () for v in unit}
+    all_units = [list(unit) for unit in units or ()] + [[v] for v in range(n) if v not in locked]
+    movable = [v for v in range(n) if v not in locked]
+    
+    def time_is_up() -> bool:
+        return deadline is not None and time.perf_counter() >= deadline
+    
+    def member_cost(v: int, members: List[int], skip: int = -1) -> int:
+        return sum(cost_of[v][u] for u in members if u != v and u != skip)
+    
+    def construct() -> List[List[int]]:
+        groups = [[] for _ in sizes]
+        order = sorted(all_units, key=lambda unit: (-len(unit), -sum(degrees[v] for v in unit), rng.random()))
+        for unit in order:
+            open_groups = [g for g in range(len(sizes)) if len(groups[g]) + len(unit) <= sizes[g]]
+            if not open_groups:
+                # 剩餘空位無法容納整組時只能拆開放入
+                for v in unit:
+                    g = min((g for g in range(len(sizes)) if len(groups[g]) < sizes[g]),
+                            key=lambda g: (member_cost(v, groups[g]), rng.random()))
+                    groups[g].append(v)
+                continue
+            g = min(open_groups, key=lambda g: (sum(member_cost(v, groups[g]) for v in unit), rng.random()))
+            groups[g].extend(unit)
+        return groups
+    
+    def improve(groups: List[List[int]]) -> List[List[int]]:
+        where = [0] * n
+        masks = [0] * len(groups)
+        for g, members in enumerate(groups):
+            for v in members:
+                where[v] = g
+                masks[g] |= 1 << v
+        
+        improved = True
+        while improved and not time_is_up():
+            improved = False
+            for u in movable:
+                a = where[u]
+                # 與組內成員都沒見過的人，交換只會改變次要的加權部分，不必嘗試
+                if not met[u] & masks[a]:
+                    continue
+                own = member_cost(u, groups[a])
+                best_delta, best_v = 0, None
+                for v in movable:
+                    b = where[v]
+                    if b == a:
+                        continue
+                    delta = (member_cost(u, groups[b], skip=v) + member_cost(v, groups[a], skip=u)
+                             - own - member_cost(v, groups[b]))
+                    if delta < best_delta:
+                        best_delta, best_v = delta, v
+                if best_v is None:
+                    continue
+                b = where[best_v]
+                groups[a][groups[a].index(u)] = best_v
+                groups[b][groups[b].index(best_v)] = u
+                masks[a] ^= (1 << u) | (1 << best_v)
+                masks[b] ^= (1 << u) | (1 << best_v)
+                where[u], where[best_v] = b, a
+                improved = True
+                if metrics is not None:
+                    metrics.increment('group_swaps')
+        return groups
+    
+    def total_cost(groups: List[List[int]]) -> int:
+        return sum(cost_of[a][b] for members in groups for a, b in combinations(members, 2))
+    
+    best_cost, best_groups = None, None
+    for attempt in range(max(1, restarts)):
+        if attempt > 0 and time_is_up():
+            break
+        groups = improve(construct())
+        cost = total_cost(groups)
+        if metrics is not None:
+            metrics.increment('restarts')
+        if best_cost is None or cost < best_cost:
+            best_cost, best_groups = cost, groups
+            if cost == 0:
+                break
+    return best_cost, [tuple(members) for members in best_groups]
+
+def round_robin_rounds(labels: List[int]) -> List[List[Tuple[int, int]]]:
+    """以圓桌法排出 len(labels) - 1 輪兩兩配對（labels 長度須為偶數），任兩人恰好同組一次"""
+    m = len(labels)
+    fixed, rotating = labels[-1], labels[:-1]
+    rounds = []
+    for r in range(m - 1):
+        pairs = [(fixed, rotating[r])]
+        for k in range(1, m // 2):
+            pairs.append((rotating[(r + k) % (m - 1)], rotating[(r - k) % (m - 1)]))
+        rounds.append(pairs)
+    return rounds
+
+def group_masks(groups: List[Tuple[int, ...]], n: int) -> List[int]:
+    """把分組轉換為「同組過」的位元遮罩"""
+    masks = [0] * n
+    for group in groups:
+        for a, b in combinations(group, 2):
+            masks[a] |= 1 << b
+            masks[b] |= 1 << a
+    return masks
+
+def build_round_schedule(met: List[int], rounds: int, rng: random.Random = None, deadline: float = None,
+                         weights: List[List[int]] = None, metrics: 'MatchingMetrics' = None,
+                         attempts: int = SCHEDULE_RELABEL_ATTEMPTS) -> List[List[Tuple[int, ...]]]:
+    """
+    一次排出多輪配對，輪與輪之間以及與歷史記錄之間盡量不重複
+    - 建構：圓桌法的 m-1 輪（m 為補成偶數的人數）內任兩人至多同組一次；
+      隨機重新編號多次，保留歷史衝突最少的編號，並從中挑出代價最低的 rounds 輪
+    - 人數為奇數時加入虛擬人員，與其配對者加入該輪代價最低的兩人組成為三人組
+    - 修補：仍有衝突的輪，把歷史與其他各輪的配對都視為已見過，以最大匹配重新求出無重複的分組，
+      重複直到沒有任何一輪能再改善
+    - 仍無法消除衝突且人數在動態規劃範圍內時，以加權代價（其他輪的配對計為一組重複）求出該輪的最佳分組
+    返回: 依輪次排列的分組列表（人員索引）
+    """
+    n = len(met)
+    rng = rng if rng is not None else random.Random()
+    cost_of = weights if weights is not None else met_weights(met)
+    m = n + n % 2
+    
+    def time_is_up() -> bool:
+        return deadline is not None and time.perf_counter() >= deadline
+    
+    def pairs_cost(pairs: List[Tuple[int, int]]) -> int:
+        return sum(cost_of[a][b] for a, b in pairs if a < n and b < n)
+    
+    def to_groups(pairs: List[Tuple[int, int]]) -> List[Tuple[int, ...]]:
+        """去掉虛擬人員，與其配對者加入增加代價最少的兩人組"""
+        groups = [pair for pair in pairs if n not in pair]
+        if len(groups) == len(pairs):
+            return groups
+        person = next(a if b == n else b for a, b in pairs if n in (a, b))
+        position = min(range(len(groups)),
+                       key=lambda idx: cost_of[person][groups[idx][0]] + cost_of[person][groups[idx][1]])
+        groups[position] = groups[position] + (person,)
+        return groups
+    
+    # 建構：輪數超過 m-1 時圓桌法的輪次必須循環使用，重複無法避免
+    best_cost, best_rounds = None, None
+    for attempt in range(max(1, attempts)):
+        if attempt > 0 and time_is_up():
+            break
+        labels = list(range(m))
+        rng.shuffle(labels)
+        candidates = sorted(round_robin_rounds(labels), key=pairs_cost)
+        chosen = [candidates[k % len(candidates)] for k in range(rounds)]
+        total = sum(pairs_cost(pairs) for pairs in chosen)
+        if best_cost is None or total < best_cost:
+            best_cost, best_rounds = total, chosen
+            if total == 0:
+                break
+    
+    schedule = [to_groups(pairs) for pairs in best_rounds]
+    round_masks = [group_masks(groups, n) for groups in schedule]
+    
+    def others_for(k: int) -> List[int]:
+        """除第 k 輪以外，各輪已同組過的位元遮罩"""
+        others = [0] * n
+        for j, masks in enumerate(round_masks):
+            if j != k:
+                for i in range(n):
+                    others[i] |= masks[i]
+        return others
+    
+    def has_conflict(groups: List[Tuple[int, ...]], blocked: List[int]) -> bool:
+        return any((blocked[a] >> b) & 1 for group in groups for a, b in combinations(group, 2))
+    
+    def replace(k: int, groups: List[Tuple[int, ...]]):
+        schedule[k] = groups
+        round_masks[k] = group_masks(groups, n)
+        if metrics is not None:
+            metrics.increment('schedule_repairs')
+    
+    # 修補：新的分組避開其他所有輪次，不會產生新的衝突，因此衝突數嚴格遞減，迴圈必定結束
+    changed = True
+    while changed and not time_is_up():
+        changed = False
+        for k in range(rounds):
+            others = others_for(k)
+            blocked = [met[i] | others[i] for i in range(n)]
+            if not has_conflict(schedule[k], blocked):
+                continue
+            feasible, _, groups = check_zero_repeat_feasibility(blocked)
+            if feasible:
+                replace(k, groups)
+                changed = True
+    
+    if n > DP_MAX_PEOPLE:
+        return schedule
+    
+    for k in range(rounds):
+        if time_is_up():
+            break
+        others = others_for(k)
+        blocked = [met[i] | others[i] for i in range(n)]
+        if not has_conflict(schedule[k], blocked):
+            continue
+        round_weights = [[cost_of[i][j] + (REPEAT_BASE_WEIGHT if (others[i] >> j) & 1 else 0) for j in range(n)]
+                         for i in range(n)]
+        try:
+            cost, groups = solve_min_repeat_dp(blocked, rng=rng, deadline=deadline, metrics=metrics,
+                                               weights=round_weights)
+        except (SolverStateLimit, SearchTimeout):
+            continue
+        current = sum(round_weights[a][b] for group in schedule[k] for a, b in combinations(group, 2))
+        if cost < current:
+            replace(k, groups)
+    
+    return schedule
+
+def save_workbook_atomic(workbook, excel_path: str):
+    """
+    原子性地保存 openpyxl 工作簿：寫入同目錄的暫存文件並 fsync，再以 os.replace 取代原文件
+    - 保存中途失敗（磁碟已滿、程序中止等）時原文件不受影響，暫存文件會被刪除
+    - 暫存文件以 ~$ 開頭，批次模式收集工作簿時會略過
+    """
+    import shutil
+    import tempfile
+    
+    excel_path = os.path.abspath(excel_path)
+    directory = os.path.dirname(excel_path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f"~${os.path.basename(excel_path)}.", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            workbook.save(tmp_file)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        if os.path.exists(excel_path):
+            shutil.copymode(excel_path, tmp_path)
+        os.replace(tmp_path, excel_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    
+    # 目錄項目也寫入磁碟，確保斷電後看到的是新文件（Windows 不支援開啟目錄）
+    if hasattr(os, 'O_DIRECTORY'):
+        try:
+            dir_fd = os.open(directory, os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except OSError:
+            pass
+
+def partner_lists(matches: List[Tuple[str, ...]]) -> dict:
+    """每個人（標準名稱）在同一輪的配對者列表，配對者名稱只帶一個 @ 前綴"""
+    partners = {}
+    for match in matches:
+        names = [canonical_name(name) for name in match]
+        for person in names:
+            partners.setdefault(person, []).extend(f"@{other}" for other in names if other != person)
+    return partners
+
+class MatchingSystem:
+    def __init__(self, excel_filename: str, snapshot: WorkbookSnapshot = None,
+                 metrics: MatchingMetrics = None, history_window_days: int = HISTORY_WINDOW_DAYS,
+                 result_cache: ResultCache = None, history_index: PairHistoryIndex = None):
+        """
+        - history_window_days: 只把最近幾天內的配對視為歷史記錄（例如 365 表示一年內不重複），
+          欄位名稱沒有日期的配對者欄位一律視為有效
+        - result_cache: 配對結果快取，None 表示不使用快取
+        - history_index: 由 snapshot 建立的歷史索引（本機服務常駐重用）；快照已失效時忽略
+        """
+        self.logger = logging.getLogger(__name__)
+        self.metrics = metrics if metrics is not None else MatchingMetrics()
+        self.history_window_days = history_window_days
+        self.history_cache = None
+        self.result_cache = result_cache
+        
+        # 處理文件路徑
+        if os.path.isabs(excel_filename):
+            self.excel_path = excel_filename
+        else:
+            # 獲取桌面路徑
+            self.desktop_path = os.path.join(os.path.expanduser('~'), 'Desktop')
+            # 完整的 Excel 檔案路徑
+            self.excel_path = os.path.join(self.desktop_path, excel_filename)
+        
+        self.logger.info(f"初始化配對系統，Excel路徑：{self.excel_path}")
+        
+        # 先完成 pandas 的導入，讀取階段只計算解析工作簿的成本（也避免在記憶體追蹤下導入）
+        import pandas  # noqa: F401
+        
+        with self.metrics.stage('load'):
+            self.open_workbook(snapshot)
+        if history_index is not None and snapshot is not None and self.snapshot is snapshot:
+            self.history_cache = (snapshot, history_index)
+    
+    def open_workbook(self, snapshot: WorkbookSnapshot = None):
+        """讀取工作簿快照，文件不存在時創建新的工作簿"""
+        try:
+            # 檢查文件是否存在
+            if os.path.exists(self.excel_path):
+                file_size = os.path.getsize(self.excel_path)
+                self.logger.info(f"Excel文件存在，大小：{file_size} bytes")
+                # 優先使用呼叫端提供且仍有效的快照，避免重複解析
+                if snapshot is not None and snapshot.excel_path == self.excel_path and snapshot.is_current():
+                    self.logger.info("使用已快取的工作簿快照")
+                    self.snapshot = snapshot
+                else:
+                    self.snapshot = WorkbookSnapshot(self.excel_path)
+            else:
+                self.logger.warning(f"Excel文件不存在，將創建新文件：{self.excel_path}")
+                raise FileNotFoundError("文件不存在")
                 
-                # 在寫入 Excel 時，使用現有的參與配對人員 DataFrame
-                with pd.ExcelWriter(self.excel_path) as writer:
-                    people_df.to_excel(writer, sheet_name='人員名單', index=False)
-                    existing_participants_df.to_excel(writer, sheet_name='參與配對人員', index=False)
+        except FileNotFoundError:
+            # 如果檔案不存在，創建新的 Excel 檔案
+            self.logger.info("創建新的Excel文件")
+            import openpyxl
+            
+            workbook = openpyxl.Workbook()
+            workbook.active.title = '人員名單'
+            workbook.active.cell(row=1, column=1).value = '姓名'
+            workbook.create_sheet('參與配對人員').cell(row=1, column=1).value = '姓名'
+            
+            # 確保目錄存在
+            os.makedirs(os.path.dirname(self.excel_path), exist_ok=True)
+            save_workbook_atomic(workbook, self.excel_path)
+            
+            self.logger.info("新Excel文件創建完成")
+            self.snapshot = WorkbookSnapshot(self.excel_path)
+            
+        except Exception as e:
+            error_msg = f"初始化Excel文件時發生錯誤：{e}"
+            self.logger.error(error_msg)
+            raise Exception(error_msg)
+    
+    def read_sheet(self, sheet_name: str) -> 'pd.DataFrame':
+        """從工作簿快照讀取工作表，文件被修改時自動重新解析"""
+        if self.snapshot is None or not self.snapshot.is_current():
+            self.logger.info("工作簿已變更，重新讀取快照")
+            with self.metrics.stage('load'):
+                self.snapshot = WorkbookSnapshot(self.excel_path)
+        return self.snapshot.read_sheet(sheet_name)
+    
+    def get_all_people(self) -> List[str]:
+        """獲取所有待配對人員名單"""
+        try:
+            self.logger.info("正在讀取人員名單...")
+            
+            if not os.path.exists(self.excel_path):
+                raise FileNotFoundError(f"Excel文件不存在：{self.excel_path}")
+            
+            df = self.read_sheet('人員名單')
+            
+            if '姓名' not in df.columns:
+                raise ValueError("人員名單工作表中找不到'姓名'欄位")
+            
+            people = [name for name in df['姓名'].dropna().tolist() if name and str(name).strip()]
+            self.logger.info(f"成功讀取 {len(people)} 位人員")
+            return people
             
         except FileNotFoundError:
-            # 如果檔案不存在，創建新的檔案
-            import pandas as pd
+            raise
+        except ValueError:
+            raise
+        except Exception as e:
+            error_msg = f"讀取人員名單時發生錯誤: {e}"
+            self.logger.error(error_msg)
+            raise Exception(error_msg)
+        
+    def get_participants(self) -> List[str]:
+        """從「參與配對人員」分頁獲取本次參與配對的人員（標準名稱，已去除重複）"""
+        try:
+            participants_df = self.read_sheet('參與配對人員')
+            people = []
+            name_set = set()
+            for raw in participants_df['姓名'].tolist():
+                name = canonical_name(raw)
+                if not name:
+                    continue
+                # 「@王小明」與「王小明　」等不同寫法視為同一人
+                if name in name_set:
+                    self.logger.warning(f"警告：人員名單中有重複: {name}")
+                    continue
+                name_set.add(name)
+                people.append(name)
             
-            # 創建配對結果字典，方便查詢每個人的配對者
-            match_dict = {}
-            for match in matches:
-                if len(match) == 2:
-                    # 確保每個人的鍵存在
-                    if match[0] not in match_dict:
-                        match_dict[match[0]] = []
-                    if match[1] not in match_dict:
-                        match_dict[match[1]] = []
-                    
-                    # 添加配對關係（確保只有一個 @ 前綴）
-                    partner1 = match[1]
-                    if not isinstance(partner1, str):
-                        partner1_with_at = f"@{str(partner1)}"
-                    elif partner1.startswith('@'):
-                        partner1_with_at = partner1  # 已有 @ 前綴，保持不變
-                    else:
-                        partner1_with_at = f"@{partner1}"
-                    
-                    partner2 = match[0]
-                    if not isinstance(partner2, str):
-                        partner2_with_at = f"@{str(partner2)}"
-                    elif partner2.startswith('@'):
-                        partner2_with_at = partner2  # 已有 @ 前綴，保持不變
-                    else:
-                        partner2_with_at = f"@{partner2}"
-                    
-                    match_dict[match[0]].append(partner1_with_at)
-                    match_dict[match[1]].append(partner2_with_at)
-                elif len(match) == 3:
-                    # 確保每個人的鍵存在
-                    if match[0] not in match_dict:
-                        match_dict[match[0]] = []
-                    if match[1] not in match_dict:
-                        match_dict[match[1]] = []
-                    if match[2] not in match_dict:
-                        match_dict[match[2]] = []
-                    
-                    # 添加配對關係（確保只有一個 @ 前綴）
-                    for i in range(3):
-                        for j in range(3):
-                            if i != j:  # 避免自己配對自己
-                                person = match[i]
-                                partner = match[j]
-                                
-                                # 確保 partner 只有一個 @ 前綴
-                                if not isinstance(partner, str):
-                                    partner_with_at = f"@{str(partner)}"
-                                elif partner.startswith('@'):
-                                    partner_with_at = partner  # 已有 @ 前綴，保持不變
-                                else:
-                                    partner_with_at = f"@{partner}"
-                                
-                                match_dict[person].append(partner_with_at)
-            
-            # 創建人員名單 DataFrame
-            # 收集所有參與配對的人員（包括配對者和被配對者）
-            all_people = set()
-            for person, partners in match_dict.items():
-                if isinstance(person, str):
-                    person_clean = person[1:].strip() if person.startswith('@') else person.strip()
-                    all_people.add(person_clean)
-                
-                # 添加所有配對者
-                for partner in partners:
-                    if isinstance(partner, str):
-                        partner_clean = partner[1:].strip() if partner.startswith('@') else partner.strip()
-                        all_people.add(partner_clean)
+        except Exception as e:
+            # 如果讀取失敗，顯示錯誤訊息
+            raise Exception(f"無法讀取參與配對人員: {str(e)}")
+        
+        if not people:
+            raise Exception("參與配對人員名單為空")
+        
+        return people
+    
+    def get_pair_constraints(self) -> Tuple[List[Tuple[str, str]], List[Tuple[str, ...]]]:
+        """
+        從「配對限制」工作表讀取硬性限制，工作表不存在時沒有任何限制
+        - 每列為「姓名1」、「姓名2」與「限制」（不可同組 / 必須同組）
+        - 必須同組的關係會傳遞合併，每組最多三人
+        返回: (不可同組的配對, 必須同組的人員組)，名稱為標準名稱
+        """
+        if self.snapshot is None or CONSTRAINTS_SHEET not in self.snapshot.sheet_names:
+            return [], []
+        df = self.read_sheet(CONSTRAINTS_SHEET)
+        missing = [col for col in ('姓名1', '姓名2', '限制') if col not in df.columns]
+        if missing:
+            raise ValueError(f"{CONSTRAINTS_SHEET}工作表缺少欄位：{', '.join(missing)}")
+        
+        never_pairs = []
+        parent = {}
+        
+        def find(name: str) -> str:
+            while parent.setdefault(name, name) != name:
+                parent[name] = parent[parent[name]]
+                name = parent[name]
+            return name
+        
+        for row_number, (a, b, kind) in enumerate(zip(df['姓名1'], df['姓名2'], df['限制']), 2):
+            a, b, kind = canonical_name(a), canonical_name(b), canonical_name(kind).lower()
+            if not a or not b or a == b:
+                self.logger.warning(f"{CONSTRAINTS_SHEET}第 {row_number} 列的姓名不完整，已略過")
+            elif kind in CONSTRAINT_NEVER:
+                never_pairs.append((a, b))
+            elif kind in CONSTRAINT_MUST:
+                parent[find(a)] = find(b)
+            else:
+                self.logger.warning(f"{CONSTRAINTS_SHEET}第 {row_number} 列的限制類型「{kind}」無法識別，已略過")
+        
+        members = {}
+        for name in list(parent):
+            members.setdefault(find(name), []).append(name)
+        must_groups = [tuple(sorted(group)) for group in members.values()]
+        for group in must_groups:
+            if len(group) > 3:
+                raise ValueError(f"必須同組的人員超過三人：{', '.join(group)}")
+        for a, b in never_pairs:
+            if a in parent and b in parent and find(a) == find(b):
+                raise ValueError(f"{a} 與 {b} 同時被設定為不可同組與必須同組")
+        
+        self.logger.info("讀取配對限制：不可同組 %d 對，必須同組 %d 組", len(never_pairs), len(must_groups))
+        return never_pairs, must_groups
+    
+    def get_matching_history(self) -> Set[Tuple[str, ...]]:
+        """從人員名單獲取歷史配對記錄（標準名稱）"""
+        return self.get_history_index().pair_set()
+    
+    @timed_stage('history')
+    def get_history_index(self) -> PairHistoryIndex:
+        """返回歷史配對索引；工作簿快照未變更時重用上次建立的索引（例如配對後立即調整）"""
+        snapshot = self.snapshot
+        if self.history_cache is not None and self.history_cache[0] is snapshot and snapshot.is_current():
+            return self.history_cache[1]
+        index = self.build_history_index()
+        # build_history_index 可能因文件變更而重新讀取快照，以讀取後的快照作為快取鍵
+        self.history_cache = (self.snapshot, index)
+        return index
+    
+    def build_history_index(self) -> PairHistoryIndex:
+        """從人員名單建立歷史配對索引，記錄每對人員的見面次數與最近一次見面"""
+        # 配對限制與歷史記錄編入同一個索引，求解器直接以整數編號查詢
+        never_pairs, must_groups = self.get_pair_constraints()
+        empty_index = PairHistoryIndex([], [], never_pairs, must_groups)
+        
+        try:
+            self.logger.info("正在讀取歷史配對記錄...")
             
-            # 使用 all_people 替代原來的方法
-            people_list = sorted(list(all_people))
+            if not os.path.exists(self.excel_path):
+                self.logger.warning("Excel文件不存在，返回空的歷史記錄")
+                return empty_index
             
-            import datetime
-            today = datetime.datetime.now().strftime("%Y-%m-%d")
+            # 讀取人員名單
+            df = self.read_sheet('人員名單')
             
-            # 找出最大配對者數量
-            max_partners = max([len(partners) for partners in match_dict.values()], default=1)
+            # 確保有「姓名」欄位
+            if '姓名' not in df.columns:
+                self.logger.warning("人員名單工作表中找不到'姓名'欄位")
+                return empty_index
             
-            # 創建 DataFrame
-            # 人名前加上 @
-            people_data = {'姓名': [f"@{person}" for person in people_list]}
-            self.logger.debug(f"FileNotFoundError處理: 寫入人員名單A欄位的人員: {[f'@{person}' for person in people_list]}")
-
+            self.logger.info(f"檢查 Excel 檔案中的所有欄位: {df.columns.tolist()}")
             
-            # 添加配對者欄位
-            for i in range(max_partners):
-                if max_partners > 1:
-                    column_name = f"配對者 {today} {i+1}"
-                else:
-                    column_name = f"配對者 {today}"
-                
-                # 將配對者添加到對應欄位
-                partners_column = []
-                for person in people_list:
-                    person_with_at = f"@{person}"
-                    found_partners = []
-                    
-                    # 檢查各種版本的名稱
-                    if person in match_dict and len(match_dict[person]) > i:
-                        found_partners = match_dict[person][i]
-                    elif person_with_at in match_dict and len(match_dict[person_with_at]) > i:
-                        found_partners = match_dict[person_with_at][i]
-                    
-                    partners_column.append(found_partners if found_partners else '')
-                
-                people_data[column_name] = partners_column
+            # 獲取所有配對者欄位（除了「姓名」以外的所有欄位）
+            partner_columns = [col for col in df.columns if col != '姓名' and '配對者' in col]
             
-            people_df = pd.DataFrame(people_data)
+            # 如果沒有配對者欄位，返回空索引
+            if not partner_columns:
+                self.logger.warning("Excel 檔案中未找到任何配對者欄位")
+                return empty_index
             
-            # 創建參與配對人員 DataFrame
-            participants_df = pd.DataFrame(columns=['姓名'])
+            # 打印檢查欄位，用於偵錯
+            self.logger.info(f"找到 {len(partner_columns)} 個配對者欄位: {partner_columns}")
             
-            with pd.ExcelWriter(self.excel_path) as writer:
-                people_df.to_excel(writer, sheet_name='人員名單', index=False)
-                participants_df.to_excel(writer, sheet_name='參與配對人員', index=False)
+            # 名稱在此轉換為標準名稱，之後的歷史查詢只比較整數編號
+            people = [canonical_name(person) for person in df['姓名']]
+            
+            # 只保留時間窗口內的欄位，讓歷史圖的密度不隨工作簿年齡持續增加
+            cutoff = None
+            if self.history_window_days is not None:
+                cutoff = datetime.date.today() - datetime.timedelta(days=self.history_window_days)
+            
+            # 新的配對欄位在左側；每個欄位各為一輪，只有同一次寫入的多人組欄位
+            # （「配對者 日期 1」之後緊接的「配對者 日期 2」……）併入同一輪，日期只是該輪的屬性
+            rounds = []
+            previous_part = None
+            record_count = 0
+            skipped_columns = 0
+            for col in partner_columns:
+                date = parse_partner_header(col)
+                if cutoff is not None and date is not None and date < cutoff:
+                    skipped_columns += 1
+                    previous_part = None
+                    continue
+                base, part = partner_header_part(col)
+                if not (part > 1 and previous_part == (base, part - 1)):
+                    rounds.append((date, []))
+                previous_part = (base, part)
+                pairs = rounds[-1][1]
+                for person_clean, partner in zip(people, df[col]):
+                    partner_clean = canonical_name(partner)
+                    if partner_clean and person_clean and partner_clean != person_clean:
+                        pairs.append((person_clean, partner_clean))
+                        record_count += 1
+            
+            index = PairHistoryIndex([person for person in people if person], rounds, never_pairs, must_groups)
+            self.metrics.values['history_rounds'] = index.round_count
+            if cutoff is not None:
+                self.metrics.values['history_window_days'] = self.history_window_days
+                self.metrics.values['history_columns_skipped'] = skipped_columns
+                self.logger.info("歷史記錄時間窗口 %d 天（%s 之後），略過 %d 個較舊的配對者欄位",
+                                 self.history_window_days, cutoff.isoformat(), skipped_columns)
+            
+            # 只輸出彙總資訊，不逐筆記錄（大型工作簿的逐筆日誌成本遠高於讀取本身）
+            self.logger.info("成功讀取歷史配對記錄：%d 人，%d 輪（%d 筆配對紀錄，%d 個配對者欄位）",
+                             index.size, index.round_count, record_count, len(partner_columns))
+            return index
             
-            # 註意：如果是新建檔案，需要再次打開來設定樣式
-            if repeated_pairs:
-                # 再次打開檔案來設定樣式
-                workbook = openpyxl.load_workbook(self.excel_path)
-                people_sheet = workbook['人員名單']
-                
-                # 找到姓名列的索引
-                name_col_idx = None
-                for col_idx, cell in enumerate(people_sheet[1], 1):
-                    if cell.value == '姓名':
-                        name_col_idx = col_idx
-                        break
-                
-                if name_col_idx is None:
-                    name_col_idx = 1
-                
-                # 設定重複配對的樣式
-                yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-                red_font = Font(color="FF0000", bold=True)
-                
-                # 只遍歷新配對欄位
-                new_col_indices = []
-                for col_idx, cell in enumerate(people_sheet[1], 1):
-                    if cell.value in new_columns:
-                        new_col_indices.append(col_idx)
-                
-                self.logger.info(f"將檢查以下新配對欄位中的重複配對: {new_columns}")
-                self.logger.debug(f"新配對欄位索引: {new_col_indices}")
-                
-                # 遍歷每一行
-                for row_idx in range(2, people_sheet.max_row + 1):
-                    person = people_sheet.cell(row=row_idx, column=name_col_idx).value
-                    if not person:
-                        continue
-                    
-                    # 移除 @ 前綴進行比較
-                    if isinstance(person, str) and person.startswith('@'):
-                        person_clean = person[1:]
-                    else:
-                        person_clean = person
-                    
-                    # 遍歷新配對欄位
-                    for col_idx in new_col_indices:
-                        partner = people_sheet.cell(row=row_idx, column=col_idx).value
-                        if not partner:
-                            continue
-                        
-                        # 移除 @ 前綴進行比較
-                        partner_norm = partner
-                        if isinstance(partner, str):
-                            if partner.startswith('@'):
-                                partner_norm = partner[1:].strip()
-                            else:
-                                partner_norm = partner.strip()
-                        else:
-                            partner_norm = str(partner).strip()
-                        
-                        # 獲取不帶 @ 且去除空格的人名
-                        person_norm = person_clean.strip() if isinstance(person_clean, str) else str(person_clean).strip()
-                        partner_norm = partner_norm.strip()
-                        
-                        # 記錄調試信息
-                        self.logger.debug(f"檢查是否重複配對: {person_norm} - {partner_norm}")
-                        self.logger.debug(f"重複配對列表: {repeated_pairs}")
-                        
-                        # 檢查是否為重複配對
-                        for pair in repeated_pairs:
-                            pair_set = set(pair)  # 轉換為集合便於比較
-                            if person_norm in pair_set and partner_norm in pair_set:
-                                # 這是重複配對，設定黃底紅字
-                                cell = people_sheet.cell(row=row_idx, column=col_idx)
-                                cell.fill = yellow_fill
-                                cell.font = red_font
-                
-                # 保存工作簿
-                workbook.save(self.excel_path)
-
-    def is_valid_pair(self, pair: Tuple[str, ...], history: Set[Tuple[str, ...]]) -> bool:
+        except Exception as e:
+            error_msg = f"讀取配對歷史時出錯: {str(e)}"
+            self.logger.error(f"{error_msg}\n{traceback.format_exc()}")
+            return empty_index
+    
+    @timed_stage('save')
+    def save_matching_result(self, matches: List[Tuple[str, ...]], repeated_pairs: List[Tuple[str, ...]] = None):
+        """保存本次配對結果（以今天的日期作為欄位名稱），並標記重複配對；失敗時拋出例外，工作簿保持原狀"""
+        self.logger.info("=== 開始保存配對結果 ===")
+        self.logger.info("配對組數: %d，重複配對組數: %d", len(matches), len(repeated_pairs or []))
+        if not matches:
+            self.logger.warning("沒有配對結果需要保存")
+            return
+        self.write_partner_rounds([(datetime.date.today(), matches, repeated_pairs or [])])
+    
+    @timed_stage('save')
+    def save_schedule(self, schedule: List[Tuple[datetime.date, List[Tuple[str, ...]], List[Tuple[str, ...]]]]):
+        """以一次讀寫保存 schedule_rounds 排出的所有輪次，並標記重複配對"""
+        if not schedule:
+            self.logger.warning("沒有排程結果需要保存")
+            return
+        self.logger.info("=== 開始保存排程結果：%d 輪 ===", len(schedule))
+        self.write_partner_rounds(schedule)
+    
+    def write_partner_rounds(self, rounds: List[Tuple[datetime.date, List[Tuple[str, ...]], List[Tuple[str, ...]]]]):
         """
-        檢查配對是否有效
-        - 檢查所有可能的2人和3人子組合是否出現在歷史記錄中
+        以一次 openpyxl 讀寫把一輪或多輪配對寫入「人員名單」，並原子性地取代工作簿
+        - 每輪一個「配對者 YYYY-MM-DD」欄位（有多人組時為「配對者 YYYY-MM-DD n」），
+          插入在姓名欄右側，日期最新的一輪在最左側
+        - 名單中沒有的參與人員新增在最後一行之後；重複配對標記為黃底紅字
+        - 先寫入暫存文件再取代原文件，任何步驟失敗時磁碟上的工作簿都保持原狀
         """
-        # 標準化 pair 中的所有名稱（去除 @ 前綴）
-        normalized_pair = []
-        for name in pair:
-            norm_name = name
-            if isinstance(name, str):
-                if name.startswith('@'):
-                    norm_name = name[1:].strip()
-                else:
-                    norm_name = name.strip()
-            else:
-                norm_name = str(name).strip()
-            normalized_pair.append(norm_name)
+        import openpyxl
+        from openpyxl.styles import PatternFill, Font
         
-        self.logger.debug(f"檢查配對是否有效: {normalized_pair}")
+        yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
+        red_font = Font(color="FF0000", bold=True)
         
-        # 將 pair 中的所有可能 2 人組合檢查是否在歷史記錄中
-        for combo in combinations(normalized_pair, 2):
-            sorted_combo = tuple(sorted(combo))
-            self.logger.debug(f"檢查子配對: {sorted_combo}")
-            
-            # 直接檢查是否在歷史記錄中
-            if sorted_combo in history:
-                self.logger.info(f"發現重複配對 (直接匹配): {sorted_combo}")
-                return False
-            
-            # 更嚴格的檢查：遍歷歷史記錄中的每一對
-            for hist_pair in history:
-                if len(hist_pair) != 2:
-                    continue
-                    
-                # 標準化歷史配對中的名稱
-                hist_names = []
-                for p in hist_pair:
-                    p_norm = p.strip() if isinstance(p, str) else str(p).strip()
-                    hist_names.append(p_norm)
-                
-                # 轉換為集合進行比較
-                hist_set = set(hist_names)
-                combo_set = set(sorted_combo)
-                
-                if hist_set == combo_set:
-                    self.logger.info(f"發現重複配對 (集合比較): {sorted_combo} vs {hist_names}")
-                    return False
-            
-        # 如果是 3 人組合，還需要檢查完整的組合
-        if len(normalized_pair) == 3:
-            sorted_pair = tuple(sorted(normalized_pair))
-            if sorted_pair in history:
-                self.logger.info(f"發現重複的三人組: {sorted_pair}")
-                return False
-            
-        return True
-
-    def match_people(self) -> Tuple[List[Tuple[str, ...]], List[Tuple[str, ...]]]:
+        # 每個欄位為 (欄位名稱, 人員 -> 配對者, 該輪重複配對)
+        columns = []
+        participants = []
+        for round_date, matches, repeated_pairs in sorted(rounds, key=lambda entry: entry[0], reverse=True):
+            partners = partner_lists(matches)
+            participants.extend(person for person in partners if person not in participants)
+            width = max((len(names) for names in partners.values()), default=1)
+            repeated = {
+                frozenset(pair) for group in repeated_pairs
+                for pair in combinations([canonical_name(name) for name in group], 2)
+            }
+            for i in range(width):
+                title = f"配對者 {round_date.isoformat()} {i + 1}" if width > 1 else f"配對者 {round_date.isoformat()}"
+                column = {person: names[i] for person, names in partners.items() if i < len(names)}
+                columns.append((title, column, repeated))
+        
+        if os.path.exists(self.excel_path):
+            workbook = openpyxl.load_workbook(self.excel_path)
+        else:
+            workbook = openpyxl.Workbook()
+            workbook.active.title = '人員名單'
+            workbook.active.cell(row=1, column=1).value = '姓名'
+        if '人員名單' in workbook.sheetnames:
+            people_sheet = workbook['人員名單']
+        else:
+            people_sheet = workbook.create_sheet('人員名單')
+            people_sheet.cell(row=1, column=1).value = '姓名'
+        if '參與配對人員' not in workbook.sheetnames:
+            workbook.create_sheet('參與配對人員').cell(row=1, column=1).value = '姓名'
+        
+        name_col_idx = next((idx for idx, cell in enumerate(people_sheet[1], 1) if cell.value == '姓名'), 1)
+        
+        # 一次騰出所有新欄位，原有欄位（連同樣式）整體右移
+        people_sheet.insert_cols(name_col_idx + 1, len(columns))
+        for offset, (title, _, _) in enumerate(columns, 1):
+            people_sheet.cell(row=1, column=name_col_idx + offset).value = title
+        
+        name_to_row_idx = {}
+        last_row = 1
+        for row_idx in range(2, people_sheet.max_row + 1):
+            name = canonical_name(people_sheet.cell(row=row_idx, column=name_col_idx).value)
+            if name:
+                name_to_row_idx[name] = row_idx
+                last_row = row_idx
+        
+        for person in participants:
+            if person not in name_to_row_idx:
+                last_row += 1
+                people_sheet.cell(row=last_row, column=name_col_idx).value = f"@{person}"
+                name_to_row_idx[person] = last_row
+                self.logger.info(f"新增人員: {person}")
+        
+        for offset, (title, column, repeated) in enumerate(columns, 1):
+            for person, partner in column.items():
+                cell = people_sheet.cell(row=name_to_row_idx[person], column=name_col_idx + offset)
+                cell.value = partner
+                if frozenset((person, partner[1:])) in repeated:
+                    cell.fill = yellow_fill
+                    cell.font = red_font
+        
+        save_workbook_atomic(workbook, self.excel_path)
+        self.logger.info("配對結果已保存：%d 個配對者欄位，%d 位人員", len(columns), len(participants))
+    
+    def match_people(self, strategy: str = 'auto', seed: int = None, time_budget: float = None,
+                     return_metrics: bool = False, lookahead: bool = False,
+                     group_size: int = DEFAULT_GROUP_SIZE):
         """
         配對人員並返回配對結果和重複配對列表
-        返回: (matches, repeated_pairs)
+        - strategy: 'auto'（依成本模型自動選擇求解器，見 choose_solver）、'exhaustive'（MRV 回溯窮舉）、
+          'dp'（位元遮罩動態規劃）、'local'（局部搜尋）、'heuristic'（隨機啟發式）或 'fair'（公平模式）
+        - seed: 隨機種子，指定後結果可重現
+        - time_budget: 搜尋時間上限（秒），超時後返回目前找到的最佳方案
+        - return_metrics: 為 True 時額外返回本次執行的 MatchingMetrics
+        - lookahead: 為 True 時在多個無重複方案中，選擇讓下一輪最容易繼續無重複的方案
+        - group_size: 每組人數，預設兩人一組（奇數時一組三人）；大於 2 時多出的人分散到各組
+        返回: (matches, repeated_pairs) 或 (matches, repeated_pairs, metrics)
         """
-        # 從「參與配對人員」分頁獲取本次參與配對的人員
-        try:
-            participants_df = pd.read_excel(self.excel_path, sheet_name='參與配對人員')
-            # 直接獲取人名，不需要移除 @ 前綴
-            people = [name for name in participants_df['姓名'].dropna().tolist() if isinstance(name, str)]
-            
-            # 移除可能的重複人員
-            people = list(dict.fromkeys(people))
+        matches, repeated_pairs = self.solve_matching(strategy, seed, time_budget, lookahead, group_size)
+        
+        # 以一行彙總取代搜尋過程中的逐筆日誌
+        counters = self.metrics.counters
+        self.logger.info("配對完成：%d 組，重複配對 %d 組（下限 %s）；重啟 %d 次，回溯節點 %d，評分方案 %d 個",
+                         len(matches), len(repeated_pairs), self.metrics.values.get('repeat_lower_bound'),
+                         counters.get('restarts', 0), counters.get('backtrack_nodes', 0),
+                         counters.get('candidates_scored', 0))
+        if repeated_pairs:
+            self.logger.warning("重複配對: %s", repeated_pairs)
+        
+        self.metrics.values.update({
+            'strategy': strategy,
+            'seed': seed,
+            'lookahead': lookahead,
+            'group_size': group_size,
+            'participants': sum(len(match) for match in matches),
+            'match_count': len(matches),
+            'repeat_count': len(repeated_pairs),
+        })
+        
+        if return_metrics:
+            return matches, repeated_pairs, self.metrics
+        return matches, repeated_pairs
+    
+    def contract_must_groups(self, people: List[str],
+                             history_index: PairHistoryIndex) -> Tuple[List[Tuple[str, ...]], List[str]]:
+        """
+        把「必須同組」的人員合併為固定分組，不參與搜尋，返回 (固定分組, 其餘人員)
+        - 限制中有人沒有參與本次配對時略過該限制
+        - 其餘人員只剩一人時，加入代價最低的固定兩人組
+        """
+        if not history_index.must_groups:
+            return [], people
+        
+        raw_of = {canonical_name(name): name for name in people}
+        fixed_groups = []
+        grouped = set()
+        for group in history_index.must_groups:
+            if not all(name in raw_of for name in group):
+                self.logger.warning(f"必須同組的人員 {group} 沒有全部參與本次配對，略過此限制")
+                continue
+            fixed_groups.append(tuple(sorted(raw_of[name] for name in group)))
+            grouped.update(raw_of[name] for name in group)
+        rest = [name for name in people if name not in grouped]
+        
+        pair_positions = [idx for idx, group in enumerate(fixed_groups) if len(group) == 2]
+        if len(rest) == 1 and pair_positions:
+            person = rest.pop()
             
-            # 檢查人員名單中是否有重複
-            name_set = set()
-            for name in people:
-                name_normalized = name[1:] if name.startswith('@') else name
-                name_normalized = name_normalized.strip()
-                if name_normalized in name_set:
-                    self.logger.warning(f"警告：人員名單中有重複: {name_normalized}")
-                name_set.add(name_normalized)
+            def join_cost(idx: int) -> int:
+                names = [canonical_name(name) for name in (person,) + fixed_groups[idx]]
+                return sum(history_index.weight_matrix(names)[0])
             
-        except Exception as e:
-            # 如果讀取失敗，顯示錯誤訊息
-            raise Exception(f"無法讀取參與配對人員: {str(e)}")
+            position = min(pair_positions, key=join_cost)
+            fixed_groups[position] = tuple(sorted(fixed_groups[position] + (person,)))
         
-        if not people:
-            raise Exception("參與配對人員名單為空")
+        self.metrics.values['fixed_groups'] = len(fixed_groups)
+        self.logger.info("必須同組：%d 組固定分組，其餘 %d 人參與搜尋", len(fixed_groups), len(rest))
+        return fixed_groups, rest
+    
+    def solve_matching(self, strategy: str, seed: int, time_budget: float, lookahead: bool = False,
+                       group_size: int = DEFAULT_GROUP_SIZE) -> Tuple[List[Tuple[str, ...]], List[Tuple[str, ...]]]:
+        """
+        依策略搜尋配對方案，返回 (matches, repeated_pairs)
+        - 兩人一組時，必須同組的人員在搜尋前先合併為固定分組；多人一組時由分組求解器整組放入同一組
+        """
+        if strategy not in SOLVER_STRATEGIES:
+            raise ValueError(f"未知的配對策略：{strategy}，可用策略：{', '.join(SOLVER_STRATEGIES)}")
+        if group_size < 2:
+            raise ValueError(f"每組人數必須至少為 2：{group_size}")
         
-        # 獲取歷史配對記錄（已經處理了 @ 前綴）
-        history = self.get_matching_history()
-        
-        # 找出一個配對方案中的重複配對
-        def find_repeated_pairs(matches: List[Tuple[str, ...]]) -> List[Tuple[str, ...]]:
-            repeated = []
-            
-            # 記錄歷史配對記錄
-            self.logger.debug(f"檢查重複配對方案，歷史記錄數量: {len(history)}")
-            self.logger.debug(f"歷史配對記錄內容: {history}")
-            
-            # 如果沒有歷史記錄，直接返回空列表
-            if not history:
-                self.logger.info("無歷史配對記錄，跳過重複配對檢測")
-                return repeated
-            
-            # 先將歷史配對標準化，確保更準確的比較
-            standardized_history = set()
-            for hist_pair in history:
-                std_pair = []
-                for name in hist_pair:
-                    if not isinstance(name, str):
-                        std_name = str(name).strip()
-                    elif name.startswith('@'):
-                        std_name = name[1:].strip()
-                    else:
-                        std_name = name.strip()
-                    std_pair.append(std_name)
-                standardized_history.add(tuple(sorted(std_pair)))
+        # 從「參與配對人員」分頁獲取本次參與配對的人員
+        people = self.get_participants()
+        
+        # 獲取歷史配對記錄（標準名稱），配對限制也編入同一個索引
+        history_index = self.get_history_index()
+        
+        # 相同輸入直接返回快取的最佳結果；人員略有增減時以快取結果為起點，只調整受影響的組別
+        cache_entry = None
+        if self.result_cache is not None:
+            import hashlib
+            
+            canonical = {canonical_name(name): name for name in people}
+            participants = sorted(canonical)
+            context = hashlib.sha256(json.dumps(
+                [history_index.digest(), strategy, seed, lookahead, group_size]).encode('utf-8')).hexdigest()
+            key = hashlib.sha256(json.dumps([context, participants], ensure_ascii=False).encode('utf-8')).hexdigest()
+            cache_entry = {'key': key, 'context': context, 'participants': participants}
+            
+            status, entry = self.result_cache.lookup(key, context, participants)
+            self.metrics.values['result_cache'] = status
+            if status == 'hit':
+                self.logger.info("輸入與快取的記錄相同，直接返回快取的配對結果")
+                matches = [tuple(sorted(canonical[name] for name in group)) for group in entry['matches']]
+                return matches, [tuple(pair) for pair in entry['repeated_pairs']]
+            if status == 'warm':
+                previous = [tuple(canonical.get(name, name) for name in group) for group in entry['matches']]
+                added = [canonical[name] for name in participants if name not in set(entry['participants'])]
+                removed = [name for name in entry['participants'] if name not in canonical]
+                self.logger.info("以快取結果暖啟動：新增 %d 人、移除 %d 人", len(added), len(removed))
+                try:
+                    matches, repeated_pairs = self.repair_matching(previous, added=added, removed=removed, seed=seed,
+                                                                   time_budget=time_budget, group_size=group_size)
+                except Exception as e:
+                    # 修補無法滿足配對限制時，完整求解仍可能找到方案
+                    self.logger.info("暖啟動失敗（%s），改為完整求解", e)
+                else:
+                    if not repeated_pairs:
+                        self.remember_result(cache_entry, matches, repeated_pairs)
+                        return matches, repeated_pairs
+                    self.logger.info("暖啟動的結果有 %d 組重複，改為完整求解", len(repeated_pairs))
+        
+        fixed_groups = []
+        if group_size == 2:
+            fixed_groups, people = self.contract_must_groups(people, history_index)
+        
+        matches, repeated_pairs = [], []
+        if people:
+            matches, repeated_pairs = self.solve_people(people, history_index, strategy, seed, time_budget,
+                                                        lookahead, group_size)
+        
+        # 固定分組不經過求解器，另外檢查是否與歷史記錄重複
+        for pair in self.find_history_repeats(fixed_groups, history_index):
+            if pair not in repeated_pairs:
+                repeated_pairs.append(pair)
+        matches = fixed_groups + matches
+        
+        # 不可同組的配對只有在無法避免時才會被選用，此時無法完成配對
+        violations = [
+            pair for match in matches
+            for pair in combinations(sorted(canonical_name(name) for name in match), 2)
+            if history_index.is_forbidden(*pair)
+        ]
+        if violations:
+            raise Exception(f"無法滿足不可同組的限制：{violations}，請管理員手動調整")
+        if cache_entry is not None:
+            self.remember_result(cache_entry, matches, repeated_pairs)
+        return matches, repeated_pairs
+    
+    def remember_result(self, cache_entry: dict, matches: List[Tuple[str, ...]],
+                        repeated_pairs: List[Tuple[str, ...]]):
+        """把配對結果（標準名稱）連同加權代價寫入結果快取"""
+        entry = dict(cache_entry)
+        entry['matches'] = [[canonical_name(name) for name in match]
+                            for match in matches]
+        entry['repeated_pairs'] = [list(pair) for pair in repeated_pairs]
+        entry['repeat_weight'] = self.metrics.values.get('repeat_weight', 0)
+        self.result_cache.put(entry)
+    
+    def solve_people(self, people: List[str], history_index: PairHistoryIndex, strategy: str, seed: int,
+                     time_budget: float, lookahead: bool = False,
+                     group_size: int = DEFAULT_GROUP_SIZE) -> Tuple[List[Tuple[str, ...]], List[Tuple[str, ...]]]:
+        """在合併固定分組後的名單上依策略搜尋配對方案，返回 (matches, repeated_pairs)"""
+        rng = random.Random(seed)
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        
+        def time_is_up() -> bool:
+            return deadline is not None and time.perf_counter() >= deadline
+        
+        # 以最大匹配快速判斷無重複方案是否存在，並求出重複配對數的下限
+        # 先打亂名單順序讓最大匹配的結果隨種子變化；隨機重啟會打亂 people，位元遮罩的索引以 roster 為準
+        roster = list(people)
+        rng.shuffle(roster)
+        normalized_people = [canonical_name(name) for name in roster]
+        # 加權代價：先比較重複組數，再依見面次數與距今輪數，偏好很久以前或只見過一次的人
+        weights = history_index.weight_matrix(normalized_people)
+        met = masks_from_weights(weights)
+        
+        repeat_weights = weights
+        fair_groups = None
+        
+        def to_result(groups: List[Tuple[int, ...]]) -> Tuple[List[Tuple[str, ...]], List[Tuple[str, ...]]]:
+            """把人員索引的分組轉換為名稱，並記錄加權代價（不含公平模式的懲罰）"""
+            # 公平模式下，求解結果若仍違反上限（例如分量分解或隨機分組），改用可行性檢查找到的分組
+            if fair_groups is not None:
+                def penalized(candidate):
+                    return sum(weights[a][b] for group in candidate for a, b in combinations(group, 2))
+                if penalized(fair_groups) < penalized(groups):
+                    groups = fair_groups
+            self.metrics.values['repeat_weight'] = sum(
+                repeat_weights[a][b] for group in groups for a, b in combinations(group, 2))
+            best_matching = [tuple(sorted(roster[i] for i in group)) for group in groups]
+            return best_matching, self.find_history_repeats(best_matching, history_index)
+        
+        self.metrics.values['repeat_weight'] = 0
+        
+        # 多人一組：以貪婪建構加局部搜尋求解，兩人組的專用求解器（最大匹配、動態規劃等）不適用
+        if group_size > 2:
+            if strategy not in ('auto', 'heuristic', 'local'):
+                self.logger.info("%d 人一組時不使用 %s 策略，改用貪婪加局部搜尋", group_size, strategy)
+            position = {name: idx for idx, name in enumerate(normalized_people)}
+            units = []
+            for group in history_index.must_groups:
+                if all(name in position for name in group):
+                    units.append([position[name] for name in group])
+                else:
+                    self.logger.warning(f"必須同組的人員 {group} 沒有全部參與本次配對，略過此限制")
+            with self.metrics.stage('solver.groups'):
+                min_cost, groups = solve_k_groups(met, group_size, weights=weights, units=units, rng=rng,
+                                                  deadline=deadline, metrics=self.metrics)
+            self.logger.info("%d 人一組：共 %d 組，重複配對 %d 組（加權代價 %d）",
+                             group_size, len(groups), min_cost // REPEAT_BASE_WEIGHT, min_cost)
+            return to_result(groups)
+        
+        with self.metrics.stage('solver.feasibility'):
+            feasible, lower_bound, feasible_groups = check_zero_repeat_feasibility(met)
+        self.metrics.values['zero_repeat_feasible'] = feasible
+        self.metrics.values['repeat_lower_bound'] = lower_bound
+        weighted_lower_bound = lower_bound * REPEAT_BASE_WEIGHT
+        
+        # 成本模型的輸入：從未配對圖分成多個連通分量時，搜尋成本取決於最大的分量而非總人數
+        n = len(roster)
+        components = split_components(allowed_masks(met))
+        largest_component = max(len(component) for component in components)
+        never_met_density = 1 - sum(bin(mask).count('1') for mask in met) / max(n * (n - 1), 1)
+        dp_states = estimate_dp_states(components)
+        self.metrics.values['components'] = len(components)
+        self.metrics.values['largest_component'] = largest_component
+        self.metrics.values['never_met_density'] = round(never_met_density, 4)
+        self.metrics.values['dp_estimated_states'] = dp_states
+        
+        def dispatch(feasible: bool) -> str:
+            """依成本模型（或指定的策略）選擇求解器，記錄選擇的求解器與原因"""
+            time_left = max(deadline - time.perf_counter(), 0.0) if deadline is not None else None
+            solver, reason = choose_solver(strategy, feasible, n, largest_component, dp_states, time_left)
+            self.metrics.values['solver'] = solver
+            self.metrics.values['solver_reason'] = reason
+            self.logger.info("選擇求解器 %s：%s（%d 人，%d 個連通分量，最大 %d 人，未見過的密度 %.2f）",
+                             solver, reason, n, len(components), largest_component, never_met_density)
+            return solver
+        
+        solver = dispatch(feasible)
+        
+        # 最大匹配已經找到無重複方案時直接採用，不必再做隨機重啟的回溯搜尋
+        if solver == 'blossom':
+            if lookahead:
+                with self.metrics.stage('solver.lookahead'):
+                    feasible_groups, score = choose_lookahead_groups(met, feasible_groups, rng=rng,
+                                                                     deadline=deadline, metrics=self.metrics)
+                self.metrics.values['lookahead_next_lower_bound'] = score[0]
+                self.metrics.values['lookahead_min_residual_degree'] = -score[1]
+                self.logger.info("前瞻模式：採用的方案讓下一輪至少 %d 組重複，剩餘最小度數 %d",
+                                 score[0], -score[1])
+            self.logger.info("採用最大匹配求得的無重複配對方案")
+            return [tuple(sorted(roster[i] for i in group)) for group in feasible_groups], []
+        
+        # 無法判斷時才以回溯法完整搜尋一次無重複的方案（搜尋是完整的，不需要隨機重啟）
+        if feasible is False:
+            self.logger.info("不存在無重複的配對方案，至少需要 %s 組重複配對，跳過回溯搜尋", lower_bound)
+        else:
+            with self.metrics.stage('solver.no_repeat'):
+                self.metrics.increment('restarts')
+                _, groups, nodes, completed = backtrack_min_repeats(met, list(range(len(roster))),
+                                                                    best_cost=1, deadline=deadline)
+                self.metrics.increment('backtrack_nodes', nodes)
+            if groups is not None:
+                return [tuple(sorted(roster[i] for i in group)) for group in groups], []  # 無重複配對
+            if not completed:
+                self.logger.warning("搜尋無重複方案時超出時間預算，改為尋找次優解")
+            solver = dispatch(False)
+        
+        # 公平模式：先求出每人累計重複與見面次數的最小上限，違反上限的配對加上極大的懲罰，
+        # 之後的求解器在上限之內最小化總代價
+        if strategy == 'fair':
+            with self.metrics.stage('solver.fairness'):
+                person_level, pair_level, blocked, fair_groups = solve_fairness_bounds(
+                    met, history_index.count_matrix(normalized_people),
+                    history_index.person_repeat_counts(normalized_people))
+            weights = [row[:] for row in weights]
+            for i, mask in enumerate(blocked):
+                for j in iter_bits(mask):
+                    weights[i][j] += FAIRNESS_PENALTY
+            self.metrics.values['fair_max_person_repeats'] = person_level
+            self.metrics.values['fair_max_pair_meetings'] = pair_level
+            self.logger.info("公平模式：每人累計重複上限 %d 輪，同組兩人見面次數上限 %d 次", person_level, pair_level)
+        
+        # 動態規劃求出重複配對最少的精確解
+        if solver == 'dp':
+            if largest_component > DP_MAX_PEOPLE:
+                self.logger.warning(f"參與人數 {largest_component} 超過動態規劃建議上限 {DP_MAX_PEOPLE}，可能超出記憶體上限")
             
-            self.logger.debug(f"標準化後的歷史配對: {standardized_history}")
-                
-            for match in matches:
-                # 檢查配對中是否有重複的人
-                if len(set(match)) != len(match):
-                    self.logger.warning(f"警告：配對中有重複的人: {match}")
-                    continue
-                
-                # 標準化配對中的人名（去除 @ 前綴）
-                normalized_match = []
-                for name in match:
-                    name_norm = name
-                    if isinstance(name, str):
-                        if name.startswith('@'):
-                            name_norm = name[1:].strip()
-                        else:
-                            name_norm = name.strip()
+            self.logger.info("使用位元遮罩動態規劃尋找重複配對最少的方案...")
+            try:
+                with self.metrics.stage('solver.dp'):
+                    if len(components) > 1:
+                        self.logger.info("從未配對圖分為 %d 個連通分量（最大 %d 人），分別求解",
+                                         len(components), largest_component)
+                        min_cost, groups = solve_components_dp(met, components, rng=rng, deadline=deadline,
+                                                               metrics=self.metrics, weights=weights)
                     else:
-                        name_norm = str(name).strip()
-                    normalized_match.append(name_norm)
-                
-                self.logger.debug(f"檢查配對方案: {normalized_match}")
-                
-                # 檢查所有可能的2人組合
-                for i in range(len(normalized_match)):
-                    for j in range(i+1, len(normalized_match)):
-                        person1 = normalized_match[i]
-                        person2 = normalized_match[j]
-                        pair_to_check = tuple(sorted([person1, person2]))
-                        
-                        self.logger.debug(f"檢查配對組合: {pair_to_check}")
-                        
-                        # 方法1: 直接檢查標準化後的歷史記錄
-                        if pair_to_check in standardized_history:
-                            self.logger.warning(f"!!!找到重複配對 (標準化比較): {pair_to_check}!!!")
-                            if pair_to_check not in repeated:
-                                repeated.append(pair_to_check)
-                            continue
-                        
-                        # 方法2: 直接檢查原始歷史記錄
-                        if pair_to_check in history:
-                            self.logger.warning(f"!!!找到重複配對 (原始比較): {pair_to_check}!!!")
-                            if pair_to_check not in repeated:
-                                repeated.append(pair_to_check)
-                            continue
-                            
-                        # 方法3: 更全面的檢查，遍歷歷史記錄並進行集合比較
-                        for hist_pair in history:
-                            if len(hist_pair) != 2:
-                                continue
-                                
-                            # 標準化歷史配對
-                            hist_names = []
-                            for p in hist_pair:
-                                p_norm = p.strip() if isinstance(p, str) else str(p).strip()
-                                hist_names.append(p_norm)
-                            
-                            # 轉換為集合進行比較
-                            hist_set = set(hist_names)
-                            pair_set = set(pair_to_check)
-                            
-                            # 檢查兩個集合是否相同
-                            if pair_set == hist_set:
-                                self.logger.warning(f"!!!找到重複配對 (集合比較): {pair_to_check} vs {hist_names}!!!")
-                                if pair_to_check not in repeated:
-                                    repeated.append(pair_to_check)
-                                break
-            
-            self.logger.info(f"最終重複配對列表: {repeated}")
-            return repeated
-        
-        # 計算一個配對方案中的重複配對數量
-        def count_repeated_pairs(matches: List[Tuple[str, ...]]) -> int:
-            return len(find_repeated_pairs(matches))
-        
-        # 使用回溯法找出所有可能的配對方案
-        def find_all_matchings(remaining: List[str], current_matches: List[Tuple[str, ...]]) -> List[List[Tuple[str, ...]]]:
-            if not remaining:  # 基本情況：沒有剩餘的人要配對
-                return [current_matches]
-                
-            all_matchings = []
-            
-            if len(remaining) == 2:  # 只剩兩個人
-                pair = tuple(sorted(remaining))
-                all_matchings.extend(find_all_matchings([], current_matches + [pair]))
-                
-            elif len(remaining) == 3:  # 只剩三個人
-                trio = tuple(sorted(remaining))
-                all_matchings.extend(find_all_matchings([], current_matches + [trio]))
-                
-            else:  # 至少有4個人，可以選擇2人一組
-                # 固定第一個人，嘗試與其他每個人配對
-                first_person = remaining[0]
-                new_remaining = remaining[1:]
-                
-                for i in range(len(new_remaining)):
-                    second_person = new_remaining[i]
-                    pair = tuple(sorted([first_person, second_person]))
-                    
-                    # 準備下一輪遞迴的剩餘人員名單
-                    next_remaining = new_remaining.copy()
-                    next_remaining.pop(i)
-                    
-                    # 遞迴找尋剩餘人員的所有可能配對
-                    pair_matchings = find_all_matchings(next_remaining, current_matches + [pair])
-                    all_matchings.extend(pair_matchings)
-            
-            return all_matchings
-        
-        # 主要配對邏輯
-        # 先嘗試找出沒有重複配對的方案（提早終止條件）
-        def try_no_repeats(remaining: List[str], current_matches: List[Tuple[str, ...]]) -> Tuple[bool, List[Tuple[str, ...]]]:
-            if not remaining:
-                return True, current_matches
-            
-            if len(remaining) == 2:
-                pair = tuple(sorted(remaining))
-                if self.is_valid_pair(pair, history):
-                    return True, current_matches + [pair]
-                return False, current_matches
-                
-            if len(remaining) == 3:
-                trio = tuple(sorted(remaining))
-                if self.is_valid_pair(trio, history):
-                    return True, current_matches + [trio]
-                return False, current_matches
-            
-            # 試著先匹配沒有歷史記錄的配對
-            first_person = remaining[0]
-            new_remaining = remaining[1:]
-            
-            # 隨機打亂以增加找到解的可能性
-            random.shuffle(new_remaining)
-            
-            for i in range(len(new_remaining)):
-                second_person = new_remaining[i]
-                pair = tuple(sorted([first_person, second_person]))
-                
-                if self.is_valid_pair(pair, history):
-                    next_remaining = new_remaining.copy()
-                    next_remaining.pop(i)
-                    
-                    success, matches = try_no_repeats(next_remaining, current_matches + [pair])
-                    if success:
-                        return True, matches
-            
-            return False, current_matches
+                        min_cost, groups = solve_min_repeat_dp(met, rng=rng, deadline=deadline, metrics=self.metrics,
+                                                               weights=weights)
+                self.logger.info("動態規劃完成，最少重複配對數: %d（加權代價 %d）",
+                                 min_cost // REPEAT_BASE_WEIGHT, min_cost)
+                return to_result(groups)
+            except (SolverStateLimit, SearchTimeout) as e:
+                self.logger.warning(f"動態規劃未能完成（{e.__class__.__name__}），改用局部搜尋")
+                solver = 'local'
         
-        # 首先嘗試找到一個無重複的方案（這比窮舉要快得多）
-        for _ in range(100):  # 多試幾次隨機順序
-            random.shuffle(people)
-            success, matches = try_no_repeats(people, [])
-            if success:
-                return matches, []  # 無重複配對
+        # 局部搜尋：貪婪建構後反覆交換兩組的成員，多次隨機重啟
+        if solver == 'local':
+            self.logger.info("使用局部搜尋尋找重複配對最少的方案...")
+            with self.metrics.stage('solver.local'):
+                min_cost, groups = solve_k_groups(met, 2, weights=weights, rng=rng, deadline=deadline,
+                                                  metrics=self.metrics)
+            self.logger.info("局部搜尋完成，重複配對數: %d（下限 %d，加權代價 %d）",
+                             min_cost // REPEAT_BASE_WEIGHT, lower_bound, min_cost)
+            return to_result(groups)
         
-        # 如果人數超過特定閾值，直接使用次優解方案
-        if len(people) > 10:  # 根據實際需求調整閾值
-            self.logger.info("參與人數過多，使用啟發式方法尋找次優解...")
+        if solver == 'heuristic':
+            self.logger.info("使用啟發式方法尋找次優解...")
+            
+            import numpy as np
             
-            best_solution = None
+            # 每批隨機產生多個排列，以矩陣運算一次計算所有排列的加權代價
+            weight_array = np.array(weights, dtype=np.int64)
+            np_rng = np.random.default_rng(rng.getrandbits(64))
+            best_groups = None
             best_score = float('inf')
             fallback_attempts = 1000  # 增加嘗試次數以找到更好的解
-            
-            for _ in range(fallback_attempts):
-                all_people = people.copy()
-                random.shuffle(all_people)
-                matches = []
-                
-                while len(all_people) >= 2:
-                    if len(all_people) == 2:
-                        matches.append(tuple(sorted(all_people)))
-                        all_people = []
-                    elif len(all_people) == 3:
-                        matches.append(tuple(sorted(all_people)))
-                        all_people = []
-                    else:
-                        matches.append(tuple(sorted(all_people[:2])))
-                        all_people = all_people[2:]
-                
-                score = count_repeated_pairs(matches)
-                
-                if score < best_score:
-                    best_score = score
-                    best_solution = matches
+            batch_size = 100
+            attempts = 0
+            
+            with self.metrics.stage('solver.heuristic'):
+                while attempts < fallback_attempts:
+                    # 至少完成一批嘗試，之後才檢查時間預算
+                    if attempts > 0 and time_is_up():
+                        self.logger.warning(f"超出時間預算，已完成 {attempts} 次嘗試")
+                        break
                     
-                    if score == 0:  # 找到無重複解，立即返回
-                        repeated_pairs = find_repeated_pairs(best_solution)
-                        return best_solution, repeated_pairs
+                    permutations = np.argsort(np_rng.random((batch_size, len(roster))), axis=1)
+                    scores = score_groupings(weight_array, permutations)
+                    attempts += batch_size
+                    self.metrics.increment('candidates_scored', batch_size)
+                    
+                    best_row = int(np.argmin(scores))
+                    if scores[best_row] < best_score:
+                        best_score = int(scores[best_row])
+                        best_groups = groupings_from_permutation(permutations[best_row].tolist())
+                        
+                        if best_score <= weighted_lower_bound:  # 已達理論下限，不可能再更好
+                            break
             
-            self.logger.info(f"已找到最佳次優解決方案，重複配對數: {best_score}")
-            repeated_pairs = find_repeated_pairs(best_solution)
-            return best_solution, repeated_pairs
+            self.logger.info("已找到最佳次優解決方案，重複配對數: %d（加權代價 %d）",
+                             best_score // REPEAT_BASE_WEIGHT, best_score)
+            return to_result(best_groups)
         
-        # 對於人數較少的情況，使用窮舉法尋找所有可能的配對方案
+        # 指定窮舉時，以 MRV 順序的分支定界回溯法窮舉所有可能的配對方案
+        if len(people) > EXHAUSTIVE_MAX_PEOPLE:
+            self.logger.warning(f"參與人數 {len(people)} 超過窮舉建議上限 {EXHAUSTIVE_MAX_PEOPLE}，搜尋可能非常耗時")
         self.logger.info("開始窮舉所有可能的配對方案...")
-        all_possible_matchings = find_all_matchings(people, [])
         
-        self.logger.info(f"共找到 {len(all_possible_matchings)} 種可能的配對方案")
+        with self.metrics.stage('solver.exhaustive'):
+            min_cost, groups, nodes, completed = backtrack_min_repeats(
+                met, list(range(len(roster))), deadline=deadline, stop_at=weighted_lower_bound, weights=weights)
+            self.metrics.increment('backtrack_nodes', nodes)
         
-        # 找出重複配對最少的方案
-        best_matching = None
-        min_repeats = float('inf')
+        if not completed:
+            self.logger.warning(f"窮舉超出時間預算，已搜尋 {nodes} 個節點")
+        self.logger.info(f"共搜尋 {nodes} 個節點")
         
-        for matching in all_possible_matchings:
-            repeats = count_repeated_pairs(matching)
-            if repeats < min_repeats:
-                min_repeats = repeats
-                best_matching = matching
-                
-                # 如果找到完全無重複的方案，立即返回
-                if repeats == 0:
-                    self.logger.info("找到了無重複的配對方案！")
-                    return best_matching, []  # 無重複配對
-        
-        if best_matching:
-            self.logger.info(f"已找到最佳配對方案，重複配對數: {min_repeats}")
-            repeated_pairs = find_repeated_pairs(best_matching)
-            return best_matching, repeated_pairs
+        if groups:
+            self.logger.info("已找到最佳配對方案，重複配對數: %d（加權代價 %d）",
+                             min_cost // REPEAT_BASE_WEIGHT, min_cost)
+            return to_result(groups)
         else:
             raise Exception("無法完成配對，請管理員手動調整")
 
+    def schedule_rounds(self, rounds: int, seed: int = None, time_budget: float = None,
+                        start_date: datetime.date = None,
+                        interval_days: int = SCHEDULE_INTERVAL_DAYS) -> List[Tuple[datetime.date, List[Tuple[str, ...]], List[Tuple[str, ...]]]]:
+        """
+        一次排出未來多輪的配對，任兩人在排出的各輪之間以及與歷史記錄之間盡量不重複
+        - 只讀取一次參與人員與歷史索引，搭配 save_schedule 一次寫入所有輪次
+        - 必須同組的人員每輪都是同一個固定分組，只標記與歷史記錄的重複
+        - start_date: 第一輪的日期（預設今天），之後每隔 interval_days 天一輪
+        返回: [(日期, matches, repeated_pairs), ...]，repeated_pairs 為與歷史或較早輪次重複的配對
+        """
+        if rounds < 1:
+            raise ValueError(f"排程輪數必須至少為 1：{rounds}")
+        
+        rng = random.Random(seed)
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        
+        people = self.get_participants()
+        history_index = self.get_history_index()
+        fixed_groups, people = self.contract_must_groups(people, history_index)
+        if len(people) == 1 or not (people or fixed_groups):
+            raise Exception("參與配對人員不足兩人，無法排程")
+        fixed_repeated = self.find_history_repeats(fixed_groups, history_index)
+        
+        roster = list(people)
+        rng.shuffle(roster)
+        normalized_people = [canonical_name(name) for name in roster]
+        weights = history_index.weight_matrix(normalized_people)
+        met = masks_from_weights(weights)
+        
+        max_rounds = len(roster) - 1 + len(roster) % 2
+        if roster and rounds > max_rounds:
+            self.logger.warning(f"排程 {rounds} 輪超過 {len(roster)} 人能互不重複的輪數 {max_rounds}，必定出現重複配對")
+        
+        with self.metrics.stage('solver.schedule'):
+            if roster:
+                schedule = build_round_schedule(met, rounds, rng=rng, deadline=deadline, weights=weights,
+                                                metrics=self.metrics)
+            else:
+                schedule = [[] for _ in range(rounds)]
+        
+        start_date = start_date if start_date is not None else datetime.date.today()
+        results = []
+        seen = list(met)
+        for k, groups in enumerate(schedule):
+            repeated = list(fixed_repeated)
+            for group in groups:
+                for a, b in combinations(group, 2):
+                    if history_index.is_forbidden(normalized_people[a], normalized_people[b]):
+                        raise Exception(f"無法滿足不可同組的限制：{normalized_people[a]} 與 {normalized_people[b]}，"
+                                        f"請管理員手動調整")
+                    if (seen[a] >> b) & 1:
+                        repeated.append(tuple(sorted((normalized_people[a], normalized_people[b]))))
+            for i, mask in enumerate(group_masks(groups, len(roster))):
+                seen[i] |= mask
+            matches = fixed_groups + [tuple(sorted(roster[i] for i in group)) for group in groups]
+            results.append((start_date + datetime.timedelta(days=interval_days * k), matches, repeated))
+        
+        repeat_count = sum(len(repeated) for _, _, repeated in results)
+        self.metrics.values.update({
+            'seed': seed,
+            'participants': len(roster) + sum(len(group) for group in fixed_groups),
+            'schedule_rounds': rounds,
+            'schedule_repeat_count': repeat_count,
+        })
+        self.logger.info("排程完成：%d 輪（%s 起每 %d 天），每輪 %d 組，重複配對共 %d 組；修補 %d 次",
+                         rounds, start_date.isoformat(), interval_days, len(results[0][1]), repeat_count,
+                         self.metrics.counters.get('schedule_repairs', 0))
+        if repeat_count:
+            self.logger.warning("排程中的重複配對: %s",
+                                {date.isoformat(): repeated for date, _, repeated in results if repeated})
+        return results
+
+    def repair_matching(self, matches: List[Tuple[str, ...]], added: List[str] = (), removed: List[str] = (),
+                        seed: int = None, time_budget: float = None,
+                        group_size: int = DEFAULT_GROUP_SIZE) -> Tuple[List[Tuple[str, ...]], List[Tuple[str, ...]]]:
+        """
+        配對完成後有人退出或加入時，只調整受影響的組別，其餘組別保持不變
+        - 移除 removed 中的人員；只剩一人的組解散，此人與 added 一起成為待分配人員
+        - 依與待分配人員未見過的人數挑選鄰近的組，連同待分配人員不超過 REPAIR_NEIGHBORHOOD_PEOPLE 人，
+          在這個小範圍內重新求解（兩人一組用動態規劃，多人一組用局部搜尋）
+        - 兩人一組且待分配人數為奇數時，優先把現有的三人組納入範圍，避免出現第二個三人組
+        - 歷史索引在工作簿未變更時直接重用，不重新解析
+        - 調整後剩餘人數少於 2 人時拋出 ValueError
+        返回: (matches, repeated_pairs)，應在 save_matching_result 之前呼叫
+        """
+        rng = random.Random(seed)
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        history_index = self.get_history_index()
+        
+        with self.metrics.stage('repair'):
+            removed_names = {canonical_name(name) for name in removed}
+            present = {canonical_name(name) for match in matches for name in match}
+            for name in removed_names - present:
+                self.logger.warning(f"要移除的人員 {name} 不在配對結果中")
+            
+            groups = []
+            pool = []
+            for match in matches:
+                members = [name for name in match if canonical_name(name) not in removed_names]
+                if len(members) >= 2:
+                    groups.append(tuple(members))
+                else:
+                    pool.extend(members)
+            added_count = 0
+            for name in added:
+                if canonical_name(name) in present and canonical_name(name) not in removed_names:
+                    self.logger.warning(f"新增的人員 {canonical_name(name)} 已在配對結果中")
+                elif all(canonical_name(name) != canonical_name(other) for other in pool):
+                    pool.append(name)
+                    added_count += 1
+            
+            remaining = len(pool) + sum(len(group) for group in groups)
+            if remaining < 2:
+                raise ValueError(f"調整後只剩 {remaining} 人，至少需要 2 人才能配對")
+            
+            if not pool:
+                self.logger.info("調整配對：移除 %d 人，其餘組別不需要調整", len(removed_names & present))
+                repeated = self.find_history_repeats(groups, history_index)
+                return groups, repeated
+            
+            # 必須同組的固定分組不納入調整範圍
+            locked = {
+                idx for idx, group in enumerate(groups)
+                for must in history_index.must_groups
+                if set(must) <= {canonical_name(name) for name in group}
+            }
+            pool_names = [canonical_name(name) for name in pool]
+            
+            def openness(group: Tuple[str, ...]) -> int:
+                """待分配人員與此組成員之間未見過的配對數，越多越容易重新分組"""
+                return sum(1 for p in pool_names for name in group if not history_index.name_weight(p, canonical_name(name)))
+            
+            candidates = [idx for idx in range(len(groups)) if idx not in locked]
+            rng.shuffle(candidates)
+            candidates.sort(key=lambda idx: -openness(groups[idx]))
+            selected = []
+            if group_size == 2 and len(pool) % 2 == 1:
+                selected = [idx for idx in candidates if len(groups[idx]) == 3][:1]
+            elif group_size > 2:
+                # 多人一組時至少納入足夠的組，讓待分配人員併入現有組別，而不是自成一個小組
+                size = len(pool)
+                for idx in candidates:
+                    if size >= 2 * group_size:
+                        break
+                    if size + len(groups[idx]) <= REPAIR_NEIGHBORHOOD_PEOPLE:
+                        selected.append(idx)
+                        size += len(groups[idx])
+            candidates = [idx for idx in candidates if idx not in selected]
+            
+            def solve(sub_people: List[str]) -> Tuple[int, List[Tuple[int, ...]]]:
+                sub_names = [canonical_name(name) for name in sub_people]
+                weights = [[history_index.name_weight(a, b) for b in sub_names] for a in sub_names]
+                met = masks_from_weights(weights)
+                if len(sub_people) == 1:
+                    return 0, [(0,)]
+                if group_size == 2 and len(sub_people) <= DP_MAX_PEOPLE:
+                    try:
+                        return solve_min_repeat_dp(met, rng=rng, deadline=deadline, metrics=self.metrics,
+                                                   weights=weights)
+                    except (SolverStateLimit, SearchTimeout):
+                        pass
+                return solve_k_groups(met, group_size, weights=weights, rng=rng, deadline=deadline,
+                                      metrics=self.metrics)
+            
+            # 範圍由小到大擴大：先只用待分配人員，出現重複時每次加入加倍數量的鄰近組，盡量少動其他組
+            while True:
+                sub_people = list(pool) + [name for idx in selected for name in groups[idx]]
+                cost, sub_groups = solve(sub_people)
+                if cost < REPEAT_BASE_WEIGHT or not candidates or \
+                        (deadline is not None and time.perf_counter() >= deadline):
+                    break
+                grown = list(selected)
+                size = len(sub_people)
+                for idx in list(candidates):
+                    if len(grown) >= 2 * len(selected) + 1:
+                        break
+                    if size + len(groups[idx]) <= REPAIR_NEIGHBORHOOD_PEOPLE:
+                        grown.append(idx)
+                        size += len(groups[idx])
+                    candidates.remove(idx)
+                if len(grown) == len(selected):
+                    break
+                selected = grown
+            
+            selected_set = set(selected)
+            kept = [group for idx, group in enumerate(groups) if idx not in selected_set]
+            new_groups = [tuple(sorted(sub_people[v] for v in group)) for group in sub_groups]
+            # 只剩一人無法成組時，加入代價最低的組
+            singles = [group for group in new_groups if len(group) == 1]
+            new_groups = [group for group in new_groups if len(group) > 1]
+            extended = set()
+            for (person,) in singles:
+                target = min(range(len(kept)), key=lambda idx: sum(
+                    history_index.name_weight(canonical_name(person), canonical_name(name)) for name in kept[idx]), default=None)
+                if target is None:
+                    new_groups.append((person,))
+                else:
+                    kept[target] = tuple(sorted(kept[target] + (person,)))
+                    extended.add(target)
+            
+            repaired = kept + new_groups
+            repeated = self.find_history_repeats(repaired, history_index)
+            # 檢查所有變動過的組：重新求解的組，以及加入了剩餘一人的保留組
+            changed = new_groups + [kept[idx] for idx in sorted(extended)]
+            violations = [
+                (canonical_name(a), canonical_name(b)) for group in changed for a, b in combinations(group, 2)
+                if history_index.is_forbidden(canonical_name(a), canonical_name(b))
+            ]
+            if violations:
+                raise Exception(f"無法滿足不可同組的限制：{violations}，請管理員手動調整")
+        
+        self.metrics.values['repair_changed_groups'] = len(new_groups)
+        self.metrics.values['repair_kept_groups'] = len(kept)
+        self.logger.info("調整配對：移除 %d 人、新增 %d 人，%d 人重新分為 %d 組，其餘 %d 組不變；重複配對 %d 組",
+                         len(removed_names & present), added_count, len(sub_people), len(new_groups), len(kept), len(repeated))
+        return repaired, repeated
+    
+    def find_history_repeats(self, matches: List[Tuple[str, ...]],
+                             history_index: PairHistoryIndex) -> List[Tuple[str, ...]]:
+        """以歷史索引找出分組中曾經配對過的兩人（標準名稱）"""
+        repeated = []
+        for match in matches:
+            names = sorted(canonical_name(name) for name in match)
+            for a, b in combinations(names, 2):
+                if history_index.meet_count(a, b):
+                    repeated.append((a, b))
+        return repeated
+
 def main():
+    init_gui_environment()
+    
     # 使用特殊方式啟動 TK 應用程式，避免 macOS 顯示終端機窗口
     app = MatchingGUI()
     
@@ -1690,8 +3276,606 @@ def main():
     
     app.run()
 
+def setup_cli_logging(verbose: bool = False, log_file: str = None):
+    """設置命令列模式的日誌：只輸出到標準錯誤流，標準輸出保留給 JSON 結果"""
+    log_format = '%(asctime)s - %(levelname)s - %(message)s'
+    
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setLevel(logging.INFO if verbose else logging.WARNING)
+    console_handler.setFormatter(logging.Formatter(log_format))
+    handlers = [console_handler]
+    
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(logging.Formatter(log_format))
+        handlers.append(file_handler)
+    
+    start_queue_logging(handlers, logging.DEBUG if log_file else console_handler.level)
+
+class WorkbookLockedError(Exception):
+    """工作簿正由其他程序寫入"""
+
+class WorkbookLock:
+    """
+    以獨佔建立的 .lock 文件保護工作簿，確保同一時間只有一個程序寫入
+    - 鎖文件內容為持有者的進程編號，程序異常中止時需手動刪除
+    """
+    def __init__(self, excel_path: str):
+        self.lock_path = f"{excel_path}.lock"
+        self.fd = None
+    
+    def __enter__(self):
+        try:
+            self.fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            raise WorkbookLockedError(f"工作簿正被其他程序使用（{self.lock_path}），若確認無程序執行中請刪除此文件") from None
+        os.write(self.fd, str(os.getpid()).encode())
+        return self
+    
+    def __exit__(self, exc_type, exc_value, tb):
+        os.close(self.fd)
+        try:
+            os.remove(self.lock_path)
+        except OSError:
+            pass
+        return False
+
+def process_workbook(excel_path: str, strategy: str = 'auto', seed: int = None,
+                     time_budget: float = None, save: bool = True, trace_memory: bool = False,
+                     history_window_days: int = HISTORY_WINDOW_DAYS, lookahead: bool = False,
+                     group_size: int = DEFAULT_GROUP_SIZE, use_cache: bool = False) -> dict:
+    """對單一工作簿執行讀取、配對與保存，返回結果摘要；use_cache 為 True 時使用磁碟上的結果快取"""
+    timings = {}
+    total_start = time.perf_counter()
+    
+    excel_path = os.path.abspath(excel_path)
+    if not os.path.exists(excel_path):
+        raise FileNotFoundError(f"Excel文件不存在：{excel_path}")
+    
+    with WorkbookLock(excel_path):
+        stage_start = time.perf_counter()
+        matcher = MatchingSystem(excel_path, metrics=MatchingMetrics(trace_memory=trace_memory),
+                                 history_window_days=history_window_days,
+                                 result_cache=ResultCache() if use_cache else None)
+        timings['load'] = time.perf_counter() - stage_start
+        
+        stage_start = time.perf_counter()
+        matches, repeated_pairs = matcher.match_people(strategy=strategy, seed=seed, time_budget=time_budget,
+                                                       lookahead=lookahead, group_size=group_size)
+        timings['match'] = time.perf_counter() - stage_start
+        
+        if save:
+            stage_start = time.perf_counter()
+            matcher.save_matching_result(matches, repeated_pairs)
+            timings['save'] = time.perf_counter() - stage_start
+    
+    timings['total'] = time.perf_counter() - total_start
+    
+    return matching_summary(excel_path, matcher, matches, repeated_pairs, strategy, seed, group_size,
+                            save, timings)
+
+def matching_summary(excel_path: str, matcher: MatchingSystem, matches: List[Tuple[str, ...]],
+                     repeated_pairs: List[Tuple[str, ...]], strategy: str, seed: int, group_size: int,
+                     saved: bool, timings: dict) -> dict:
+    """單次配對的結果摘要（命令列與本機服務共用的 JSON 格式）"""
+    return {
+        'status': 'ok',
+        'workbook': excel_path,
+        'strategy': strategy,
+        'seed': seed,
+        'group_size': group_size,
+        'participants': sum(len(match) for match in matches),
+        'match_count': len(matches),
+        'matches': [list(match) for match in matches],
+        'repeat_count': len(repeated_pairs),
+        'repeat_lower_bound': matcher.metrics.values.get('repeat_lower_bound'),
+        'repeated_pairs': [list(pair) for pair in repeated_pairs],
+        'saved': saved,
+        'timings': {stage: round(seconds, 4) for stage, seconds in timings.items()},
+        'metrics': matcher.metrics.to_dict(),
+    }
+
+def run_match_command(args) -> dict:
+    """命令列 match：處理單一工作簿，指定日誌文件時在其旁邊寫出指標 JSON"""
+    summary = process_workbook(args.workbook, strategy=args.strategy, seed=args.seed,
+                               time_budget=args.time_budget, save=not args.no_save,
+                               trace_memory=args.trace_memory,
+                               history_window_days=args.history_window_days, lookahead=args.lookahead,
+                               group_size=args.group_size, use_cache=args.cache)
+    if args.log_file:
+        summary['metrics_file'] = write_metrics_next_to_log(summary['metrics'], args.log_file)
+    return summary
+
+def process_schedule(excel_path: str, rounds: int, start_date: datetime.date = None,
+                     interval_days: int = SCHEDULE_INTERVAL_DAYS, seed: int = None,
+                     time_budget: float = None, save: bool = True, trace_memory: bool = False,
+                     history_window_days: int = HISTORY_WINDOW_DAYS) -> dict:
+    """對單一工作簿一次排出多輪配對，並以一次寫入保存所有輪次，返回結果摘要"""
+    timings = {}
+    total_start = time.perf_counter()
+    
+    excel_path = os.path.abspath(excel_path)
+    if not os.path.exists(excel_path):
+        raise FileNotFoundError(f"Excel文件不存在：{excel_path}")
+    
+    with WorkbookLock(excel_path):
+        stage_start = time.perf_counter()
+        matcher = MatchingSystem(excel_path, metrics=MatchingMetrics(trace_memory=trace_memory),
+                                 history_window_days=history_window_days)
+        timings['load'] = time.perf_counter() - stage_start
+        
+        stage_start = time.perf_counter()
+        schedule = matcher.schedule_rounds(rounds, seed=seed, time_budget=time_budget,
+                                           start_date=start_date, interval_days=interval_days)
+        timings['schedule'] = time.perf_counter() - stage_start
+        
+        if save:
+            stage_start = time.perf_counter()
+            matcher.save_schedule(schedule)
+            timings['save'] = time.perf_counter() - stage_start
+    
+    timings['total'] = time.perf_counter() - total_start
+    
+    return {
+        'status': 'ok',
+        'workbook': excel_path,
+        'seed': seed,
+        'participants': matcher.metrics.values.get('participants'),
+        'rounds': [
+            {
+                'date': round_date.isoformat(),
+                'matches': [list(match) for match in matches],
+                'repeated_pairs': [list(pair) for pair in repeated_pairs],
+            }
+            for round_date, matches, repeated_pairs in schedule
+        ],
+        'repeat_count': sum(len(repeated_pairs) for _, _, repeated_pairs in schedule),
+        'saved': save,
+        'timings': {stage: round(seconds, 4) for stage, seconds in timings.items()},
+        'metrics': matcher.metrics.to_dict(),
+    }
+
+def run_schedule_command(args) -> dict:
+    """命令列 schedule：一次排出多輪配對，指定日誌文件時在其旁邊寫出指標 JSON"""
+    start_date = datetime.date.fromisoformat(args.start_date) if args.start_date else None
+    summary = process_schedule(args.workbook, args.rounds, start_date=start_date,
+                               interval_days=args.interval_days, seed=args.seed,
+                               time_budget=args.time_budget, save=not args.no_save,
+                               trace_memory=args.trace_memory,
+                               history_window_days=args.history_window_days)
+    if args.log_file:
+        summary['metrics_file'] = write_metrics_next_to_log(summary['metrics'], args.log_file)
+    return summary
+
+def collect_workbooks(paths: List[str]) -> List[str]:
+    """展開目錄中的 .xlsx 文件，並以實際路徑去除重複，確保每個文件只交給一個工作進程"""
+    workbooks = []
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = sorted(str(p) for p in Path(path).glob('*.xlsx') if not p.name.startswith('~$'))
+        else:
+            candidates = [path]
+        
+        for candidate in candidates:
+            key = os.path.normcase(os.path.realpath(candidate))
+            if key in seen:
+                continue
+            seen.add(key)
+            workbooks.append(os.path.abspath(candidate))
+    return workbooks
+
+def init_batch_worker(verbose: bool = False):
+    """
+    批次工作進程的日誌設定：只輸出到標準錯誤流
+    - fork 出的工作進程繼承了父進程根日誌器上的佇列處理器，但沒有繼承監聽線程，
+      必須以 force=True 換掉繼承的處理器，否則記錄會放入沒有人讀取的佇列
+    """
+    global log_listener
+    log_listener = None  # 繼承的監聽器屬於父進程，不可在工作進程中停止
+    logging.basicConfig(level=logging.INFO if verbose else logging.WARNING,
+                        format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s',
+                        stream=sys.stderr, force=True)
+
+def run_batch_job(excel_path: str, strategy: str, seed: int, time_budget: float, save: bool,
+                  trace_memory: bool = False, history_window_days: int = HISTORY_WINDOW_DAYS,
+                  lookahead: bool = False, group_size: int = DEFAULT_GROUP_SIZE) -> dict:
+    """批次工作進程的入口：任何錯誤都只影響此工作簿"""
+    try:
+        return process_workbook(excel_path, strategy=strategy, seed=seed, time_budget=time_budget,
+                                save=save, trace_memory=trace_memory, history_window_days=history_window_days,
+                                lookahead=lookahead, group_size=group_size)
+    except Exception as e:
+        logging.getLogger('batch').error(f"工作簿 {excel_path} 處理失敗：{e}\n{traceback.format_exc()}")
+        return {
+            'status': 'error',
+            'workbook': excel_path,
+            'error': str(e),
+            'error_type': type(e).__name__,
+        }
+
+def run_batch(paths: List[str], workers: int = None, strategy: str = 'auto', seed: int = None,
+              time_budget: float = None, save: bool = True, verbose: bool = False,
+              trace_memory: bool = False, history_window_days: int = HISTORY_WINDOW_DAYS,
+              lookahead: bool = False, group_size: int = DEFAULT_GROUP_SIZE) -> dict:
+    """以進程池批次處理多個工作簿，返回彙總報告"""
+    from concurrent.futures import ProcessPoolExecutor
+    
+    logger = logging.getLogger('batch')
+    start = time.perf_counter()
+    
+    workbooks = collect_workbooks(paths)
+    if not workbooks:
+        raise ValueError("找不到任何需要處理的 Excel 工作簿")
+    
+    workers = max(1, min(workers or os.cpu_count() or 1, len(workbooks)))
+    logger.info(f"開始批次配對：{len(workbooks)} 個工作簿，{workers} 個工作進程")
+    
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_batch_worker, initargs=(verbose,)) as executor:
+        futures = {
+            executor.submit(run_batch_job, excel_path, strategy, seed, time_budget, save, trace_memory,
+                            history_window_days, lookahead, group_size): excel_path
+            for excel_path in workbooks
+        }
+        for future, excel_path in futures.items():
+            try:
+                results[excel_path] = future.result()
+            except Exception as e:
+                # 工作進程異常終止（例如記憶體不足）時，也只記錄為此工作簿失敗
+                logger.error(f"工作簿 {excel_path} 的工作進程異常終止：{e}")
+                results[excel_path] = {
+                    'status': 'error',
+                    'workbook': excel_path,
+                    'error': str(e),
+                    'error_type': type(e).__name__,
+                }
+    
+    ordered = [results[excel_path] for excel_path in workbooks]
+    failed = [result for result in ordered if result['status'] != 'ok']
+    
+    return {
+        'status': 'ok' if not failed else 'partial' if len(failed) < len(ordered) else 'error',
+        'workbook_count': len(ordered),
+        'succeeded': len(ordered) - len(failed),
+        'failed': len(failed),
+        'total_repeats': sum(result.get('repeat_count', 0) for result in ordered),
+        'workers': workers,
+        'results': ordered,
+        'timings': {'total': round(time.perf_counter() - start, 4)},
+    }
+
+def run_batch_command(args) -> dict:
+    """命令列 batch：處理目錄或多個工作簿，並可寫出彙總報告"""
+    report = run_batch(args.workbooks, workers=args.workers, strategy=args.strategy, seed=args.seed,
+                       time_budget=args.time_budget, save=not args.no_save, verbose=args.verbose,
+                       trace_memory=args.trace_memory, history_window_days=args.history_window_days,
+                       lookahead=args.lookahead, group_size=args.group_size)
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    return report
+
+class ServiceWorkbook:
+    """本機服務中一個已註冊工作簿的常駐狀態"""
+    def __init__(self, excel_path: str):
+        self.excel_path = excel_path
+        self.snapshot = None
+        self.history_index = None
+        self.loads = 0
+        # load_lock 保護快照的重新解析；write_lock 讓寫回此工作簿的請求逐一執行
+        self.load_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+    
+    def describe(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            'workbook': self.excel_path,
+            'loaded': snapshot is not None,
+            'current': snapshot is not None and snapshot.is_current(),
+            'loads': self.loads,
+            'people': self.history_index.size if self.history_index is not None else None,
+            'history_rounds': self.history_index.round_count if self.history_index is not None else None,
+        }
+
+class MatchingService:
+    """
+    本機配對服務：在記憶體中常駐已註冊工作簿的快照與歷史索引，請求不必重新導入模組與解析工作簿
+    - 文件被修改後（修改時間或大小改變），下一個請求會重新解析
+    - 配對在固定大小的執行緒池中執行；預覽只讀取常駐快照，可同時進行
+    - 寫回工作簿的請求依工作簿逐一執行，並持有 WorkbookLock 避免與其他程序同時寫入
+    """
+    def __init__(self, workers: int = SERVICE_WORKERS, history_window_days: int = HISTORY_WINDOW_DAYS):
+        from concurrent.futures import ThreadPoolExecutor
+        
+        self.logger = logging.getLogger('service')
+        self.history_window_days = history_window_days
+        self.workers = max(1, workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='match-worker')
+        self.workbooks = {}
+        self.lock = threading.Lock()
+        self.request_count = 0
+    
+    def register(self, excel_path: str) -> dict:
+        """註冊工作簿並立即解析，返回工作簿狀態"""
+        excel_path = os.path.abspath(excel_path)
+        if not os.path.exists(excel_path):
+            raise FileNotFoundError(f"Excel文件不存在：{excel_path}")
+        with self.lock:
+            entry = self.workbooks.setdefault(excel_path, ServiceWorkbook(excel_path))
+        self.executor.submit(self.matcher_for, entry).result()
+        self.logger.info("已註冊工作簿：%s", excel_path)
+        return entry.describe()
+    
+    def describe(self) -> dict:
+        with self.lock:
+            entries = list(self.workbooks.values())
+        return {
+            'status': 'ok',
+            'workers': self.workers,
+            'requests': self.request_count,
+            'workbooks': [entry.describe() for entry in entries],
+        }
+    
+    def matcher_for(self, entry: ServiceWorkbook) -> MatchingSystem:
+        """返回使用常駐快照與歷史索引的 MatchingSystem；文件已變更時先重新解析"""
+        with entry.load_lock:
+            if entry.snapshot is None or not entry.snapshot.is_current():
+                matcher = MatchingSystem(entry.excel_path, metrics=MatchingMetrics(trace_memory=False),
+                                         history_window_days=self.history_window_days)
+                entry.history_index = matcher.get_history_index()
+                entry.snapshot = matcher.snapshot
+                entry.loads += 1
+                self.logger.info("已重新解析工作簿：%s（第 %d 次）", entry.excel_path, entry.loads)
+                return matcher
+            snapshot, history_index = entry.snapshot, entry.history_index
+        return MatchingSystem(entry.excel_path, snapshot=snapshot, metrics=MatchingMetrics(trace_memory=False),
+                              history_window_days=self.history_window_days, history_index=history_index)
+    
+    def match(self, params: dict, save: bool) -> dict:
+        """處理一個配對請求（save 為 False 時只預覽），在執行緒池中執行並等待結果"""
+        if not isinstance(params.get('workbook'), str):
+            raise ValueError("請求缺少 workbook 欄位")
+        excel_path = os.path.abspath(params['workbook'])
+        with self.lock:
+            entry = self.workbooks.get(excel_path)
+            self.request_count += 1
+        if entry is None:
+            raise KeyError(f"工作簿尚未註冊：{excel_path}")
+        return self.executor.submit(self.run_match, entry, params, save).result()
+    
+    def run_match(self, entry: ServiceWorkbook, params: dict, save: bool) -> dict:
+        strategy = params.get('strategy', 'auto')
+        seed = params.get('seed')
+        time_budget = params.get('time_budget')
+        group_size = int(params.get('group_size', DEFAULT_GROUP_SIZE))
+        timings = {}
+        total_start = time.perf_counter()
+        
+        def solve() -> Tuple[MatchingSystem, List[Tuple[str, ...]], List[Tuple[str, ...]]]:
+            stage_start = time.perf_counter()
+            matcher = self.matcher_for(entry)
+            timings['load'] = time.perf_counter() - stage_start
+            stage_start = time.perf_counter()
+            matches, repeated_pairs = matcher.match_people(strategy=strategy, seed=seed, time_budget=time_budget,
+                                                           lookahead=bool(params.get('lookahead', False)),
+                                                           group_size=group_size)
+            timings['match'] = time.perf_counter() - stage_start
+            return matcher, matches, repeated_pairs
+        
+        if save:
+            # 配對與寫回必須在同一把鎖內，後一個請求才會看到前一個請求寫入的歷史
+            with entry.write_lock, WorkbookLock(entry.excel_path):
+                matcher, matches, repeated_pairs = solve()
+                stage_start = time.perf_counter()
+                matcher.save_matching_result(matches, repeated_pairs)
+                timings['save'] = time.perf_counter() - stage_start
+        else:
+            matcher, matches, repeated_pairs = solve()
+        
+        timings['total'] = time.perf_counter() - total_start
+        self.logger.info("%s %s：%d 組，重複 %d 組，%.1f ms", '配對' if save else '預覽', entry.excel_path,
+                         len(matches), len(repeated_pairs), timings['total'] * 1000)
+        return matching_summary(entry.excel_path, matcher, matches, repeated_pairs, strategy, seed, group_size,
+                                save, timings)
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+def build_service_server(service: MatchingService, host: str = SERVICE_HOST, port: int = SERVICE_PORT):
+    """
+    建立本機 HTTP/JSON 伺服器（每個連線一個執行緒，實際計算交給服務的執行緒池）
+    - GET  /health、GET /workbooks：服務與已註冊工作簿的狀態
+    - POST /workbooks {"workbook": 路徑}：註冊工作簿
+    - POST /preview、POST /match {"workbook": 路徑, "strategy", "seed", "time_budget", "lookahead", "group_size"}：
+      預覽或配對並寫回工作簿，返回與命令列 match 相同的 JSON 摘要
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    class ServiceHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def send_json(self, status: int, payload: dict):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def send_error_json(self, status: int, error: Exception):
+            # KeyError 的 str() 會帶引號，直接取出訊息
+            message = error.args[0] if isinstance(error, KeyError) and error.args else str(error)
+            self.send_json(status, {'status': 'error', 'error': message, 'error_type': type(error).__name__})
+        
+        def do_GET(self):
+            if self.path in ('/health', '/workbooks'):
+                self.send_json(200, service.describe())
+            else:
+                self.send_error_json(404, KeyError(f"未知的路徑：{self.path}"))
+        
+        def do_POST(self):
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                params = json.loads(self.rfile.read(length) or b'{}')
+                if not isinstance(params, dict):
+                    raise ValueError("請求內容必須是 JSON 物件")
+                if self.path == '/workbooks':
+                    if not isinstance(params.get('workbook'), str):
+                        raise ValueError("請求缺少 workbook 欄位")
+                    result = service.register(params['workbook'])
+                elif self.path in ('/match', '/preview'):
+                    result = service.match(params, save=self.path == '/match')
+                else:
+                    raise KeyError(f"未知的路徑：{self.path}")
+            except KeyError as e:
+                self.send_error_json(404, e)
+            except (ValueError, TypeError, FileNotFoundError) as e:
+                self.send_error_json(400, e)
+            except WorkbookLockedError as e:
+                self.send_error_json(409, e)
+            except Exception as e:
+                service.logger.error(f"請求 {self.path} 處理失敗：{e}\n{traceback.format_exc()}")
+                self.send_error_json(500, e)
+            else:
+                self.send_json(200, result)
+        
+        def log_message(self, format, *args):
+            service.logger.debug("%s - %s", self.address_string(), format % args)
+    
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.daemon_threads = True
+    return server
+
+def run_serve_command(args) -> dict:
+    """命令列 serve：啟動本機配對服務，直到收到中斷信號（Ctrl+C）為止"""
+    service = MatchingService(workers=args.workers, history_window_days=args.history_window_days)
+    for path in collect_workbooks(args.workbooks):
+        service.register(path)
+    
+    server = build_service_server(service, args.host, args.port)
+    host, port = server.server_address[:2]
+    logging.getLogger('service').warning("本機配對服務已啟動：http://%s:%d（%d 個工作簿）", host, port,
+                                         len(service.workbooks))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+    return service.describe()
+
+# 命令列子命令與對應的處理函數
+CLI_COMMANDS = {
+    'match': run_match_command,
+    'batch': run_batch_command,
+    'schedule': run_schedule_command,
+    'serve': run_serve_command,
+}
+
+def build_cli_parser() -> 'argparse.ArgumentParser':
+    """建立命令列參數解析器"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog='match.py', description='人員配對系統（命令列模式，不需要圖形界面）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    match_parser = subparsers.add_parser('match', help='讀取工作簿、執行配對並保存結果')
+    match_parser.add_argument('workbook', help='Excel 工作簿路徑')
+    match_parser.add_argument('--seed', type=int, default=None, help='隨機種子，指定後結果可重現')
+    match_parser.add_argument('--time-budget', type=float, default=None, help='配對搜尋的時間上限（秒）')
+    match_parser.add_argument('--strategy', choices=SOLVER_STRATEGIES, default='auto', help='配對策略')
+    match_parser.add_argument('--history-window-days', type=int, default=HISTORY_WINDOW_DAYS,
+                              help='只把最近幾天內的配對視為歷史記錄（預設為全部歷史）')
+    match_parser.add_argument('--lookahead', action='store_true',
+                              help='在多個無重複方案中，選擇讓下一輪最容易繼續無重複的方案')
+    match_parser.add_argument('--group-size', type=int, default=DEFAULT_GROUP_SIZE,
+                              help='每組人數（預設兩人一組，例如午餐可設為 4-6）')
+    match_parser.add_argument('--cache', action='store_true',
+                              help=f'使用磁碟上的配對結果快取（{RESULT_CACHE_PATH}）')
+    match_parser.add_argument('--no-save', action='store_true', help='只計算配對結果，不寫回工作簿')
+    match_parser.add_argument('--trace-memory', action='store_true', help='以 tracemalloc 記錄各階段的峰值記憶體（會明顯拖慢執行）')
+    match_parser.add_argument('--log-file', default=None, help='額外寫入詳細日誌的文件路徑')
+    match_parser.add_argument('-v', '--verbose', action='store_true', help='在標準錯誤流輸出進度日誌')
+    
+    batch_parser = subparsers.add_parser('batch', help='以多進程批次處理多個工作簿')
+    batch_parser.add_argument('workbooks', nargs='+', help='Excel 工作簿或包含工作簿的目錄')
+    batch_parser.add_argument('--workers', type=int, default=None, help='工作進程數量（預設為 CPU 核心數）')
+    batch_parser.add_argument('--seed', type=int, default=None, help='隨機種子，每個工作簿使用相同種子')
+    batch_parser.add_argument('--time-budget', type=float, default=None, help='每個工作簿的配對搜尋時間上限（秒）')
+    batch_parser.add_argument('--strategy', choices=SOLVER_STRATEGIES, default='auto', help='配對策略')
+    batch_parser.add_argument('--history-window-days', type=int, default=HISTORY_WINDOW_DAYS,
+                              help='只把最近幾天內的配對視為歷史記錄（預設為全部歷史）')
+    batch_parser.add_argument('--lookahead', action='store_true',
+                              help='在多個無重複方案中，選擇讓下一輪最容易繼續無重複的方案')
+    batch_parser.add_argument('--group-size', type=int, default=DEFAULT_GROUP_SIZE,
+                              help='每組人數（預設兩人一組，例如午餐可設為 4-6）')
+    batch_parser.add_argument('--no-save', action='store_true', help='只計算配對結果，不寫回工作簿')
+    batch_parser.add_argument('--trace-memory', action='store_true', help='以 tracemalloc 記錄各階段的峰值記憶體（會明顯拖慢執行）')
+    batch_parser.add_argument('--report', default=None, help='彙總報告的 JSON 輸出路徑')
+    batch_parser.add_argument('--log-file', default=None, help='額外寫入詳細日誌的文件路徑')
+    batch_parser.add_argument('-v', '--verbose', action='store_true', help='在標準錯誤流輸出進度日誌')
+    
+    schedule_parser = subparsers.add_parser('schedule', help='一次排出未來多輪的配對，並一次寫回工作簿')
+    schedule_parser.add_argument('workbook', help='Excel 工作簿路徑')
+    schedule_parser.add_argument('--rounds', type=int, required=True, help='要排出的輪數')
+    schedule_parser.add_argument('--start-date', default=None, help='第一輪的日期 YYYY-MM-DD（預設今天）')
+    schedule_parser.add_argument('--interval-days', type=int, default=SCHEDULE_INTERVAL_DAYS, help='每輪間隔的天數')
+    schedule_parser.add_argument('--seed', type=int, default=None, help='隨機種子，指定後結果可重現')
+    schedule_parser.add_argument('--time-budget', type=float, default=None, help='排程搜尋的時間上限（秒）')
+    schedule_parser.add_argument('--history-window-days', type=int, default=HISTORY_WINDOW_DAYS,
+                                 help='只把最近幾天內的配對視為歷史記錄（預設為全部歷史）')
+    schedule_parser.add_argument('--no-save', action='store_true', help='只計算排程結果，不寫回工作簿')
+    schedule_parser.add_argument('--trace-memory', action='store_true', help='以 tracemalloc 記錄各階段的峰值記憶體（會明顯拖慢執行）')
+    schedule_parser.add_argument('--log-file', default=None, help='額外寫入詳細日誌的文件路徑')
+    schedule_parser.add_argument('-v', '--verbose', action='store_true', help='在標準錯誤流輸出進度日誌')
+    
+    serve_parser = subparsers.add_parser('serve', help='啟動本機 HTTP/JSON 配對服務，常駐工作簿快照與歷史索引')
+    serve_parser.add_argument('workbooks', nargs='*', help='啟動時註冊的 Excel 工作簿或包含工作簿的目錄')
+    serve_parser.add_argument('--host', default=SERVICE_HOST, help='監聽位址（預設只接受本機連線）')
+    serve_parser.add_argument('--port', type=int, default=SERVICE_PORT, help='監聽埠號（0 表示自動選擇）')
+    serve_parser.add_argument('--workers', type=int, default=SERVICE_WORKERS, help='執行配對的工作執行緒數量')
+    serve_parser.add_argument('--history-window-days', type=int, default=HISTORY_WINDOW_DAYS,
+                              help='只把最近幾天內的配對視為歷史記錄（預設為全部歷史）')
+    serve_parser.add_argument('--log-file', default=None, help='額外寫入詳細日誌的文件路徑')
+    serve_parser.add_argument('-v', '--verbose', action='store_true', help='在標準錯誤流輸出進度日誌')
+    
+    return parser
+
+def cli_main(argv: List[str] = None) -> int:
+    """命令列入口：結果以 JSON 輸出到標準輸出，失敗時返回非零退出碼"""
+    parser = build_cli_parser()
+    args = parser.parse_args(argv)
+    setup_cli_logging(args.verbose, args.log_file)
+    logger = logging.getLogger('cli')
+    
+    try:
+        summary = CLI_COMMANDS[args.command](args)
+        exit_code = 0 if summary['status'] == 'ok' else 1
+    except Exception as e:
+        logger.error(f"命令 {args.command} 執行失敗：{e}\n{traceback.format_exc()}")
+        summary = {
+            'status': 'error',
+            'command': args.command,
+            'error': str(e),
+            'error_type': type(e).__name__,
+        }
+        exit_code = 1
+    
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return exit_code
+
 # 使用專門的 macOS 應用程式入口點
 if __name__ == "__main__":
+    # 打包後的應用程式啟動子進程時需要此呼叫
+    import multiprocessing
+    multiprocessing.freeze_support()
+    
+    # 帶有子命令時以命令列模式執行，不載入 tkinter
+    if len(sys.argv) > 1 and sys.argv[1] in CLI_COMMANDS:
+        sys.exit(cli_main())
+    
     # 檢測是否在 macOS 上運行的打包應用
     if sys.platform == 'darwin' and getattr(sys, 'frozen', False):
         # 改變工作目錄到應用程式包內